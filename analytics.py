@@ -0,0 +1,347 @@
+"""
+Columnar snapshot of the cars table and the explorer.ipynb analyses on it.
+
+The notebook used to pd.read_sql the whole table and clean the price,
+mileage and year strings on every run, which takes seconds on a big
+table. The snapshot keeps just the columns the analyses need, already typed
+(the *_num columns parsed at ingest, see normalize.py), in
+ANALYTICS_CACHE.parquet (.pkl without pyarrow), and each load only reads
+what changed since the last one, as sync.py does:
+
+- rows whose updated_at is at or after the snapshot's latest, less
+  REFRESH_OVERLAP: rescraped listings, removals, hand edits and
+  migrate_db.py --refresh-numeric rewrites (the models.CHANGE_TRIGGERS
+  trigger bumps updated_at when an UPDATE doesn't)
+- rows with an id above the snapshot's highest: new listings
+- cars_deleted tombstones newer than its last one: deleted rows are dropped
+
+    frame = load_cars(db_url)
+    analyze_time_on_market(frame)
+
+    python analytics.py           # refresh the snapshot, print the analyses
+    python analytics.py --full    # rebuild it from scratch first
+"""
+
+import argparse
+import os
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, inspect, select
+
+from db import get_engine
+from models import CarDeletion, CarListing
+
+DB_URL = os.environ.get("DB_URL", "sqlite:///mavericks.db")
+CACHE_PATH = os.environ.get("ANALYTICS_CACHE", "cache/cars")
+QUICK_DAYS = 7
+STALE_DAYS = 30
+YEARS = (2020, 2025)
+CHUNK = 50_000
+# Reach back this far before the snapshot's updated_at for rows whose transaction committed late
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+try:
+    import pyarrow  # noqa: F401
+    CACHE_FORMAT = "parquet"
+except ImportError:
+    CACHE_FORMAT = "pickle"
+
+# No link: it's the widest column and the analyses don't need it (id joins back to cars)
+_COLUMNS = (CarListing.id, CarListing.listing, CarListing.is_hybrid,
+            CarListing.date_found, CarListing.still_available, CarListing.price_num,
+            CarListing.mileage_num, CarListing.year_num)
+_DTYPES = {"id": "int64", "is_hybrid": "bool", "still_available": "bool",
+           "price_num": "Int32", "mileage_num": "Int32", "year_num": "Int16"}
+# Bump when _COLUMNS, _DTYPES or the watermark attrs change so old snapshots get rebuilt
+SNAPSHOT_VERSION = 2
+
+
+def cache_file(path=CACHE_PATH):
+    return f"{path}.parquet" if CACHE_FORMAT == "parquet" else f"{path}.pkl"
+
+
+def _typed(frame):
+    frame["is_hybrid"] = frame["is_hybrid"].fillna(False)
+    frame["still_available"] = frame["still_available"].fillna(False)
+    frame["date_found"] = pd.to_datetime(frame["date_found"])
+    return frame.astype(_DTYPES)
+
+
+def _read(conn, where):
+    chunks = [_typed(chunk) for chunk in pd.read_sql(
+        select(*_COLUMNS).where(where).order_by(CarListing.id), conn, chunksize=CHUNK)]
+    if not chunks:
+        return _typed(pd.DataFrame({column.key: [] for column in _COLUMNS}))
+    return pd.concat(chunks, ignore_index=True)
+
+
+def _read_snapshot(path):
+    if not os.path.exists(path):
+        return None
+    frame = pd.read_parquet(path) if CACHE_FORMAT == "parquet" else pd.read_pickle(path)
+    return frame if frame.attrs.get("version") == SNAPSHOT_VERSION else None
+
+
+def _write_snapshot(frame, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    if CACHE_FORMAT == "parquet":
+        frame.to_parquet(tmp, index=False)
+    else:
+        frame.to_pickle(tmp)
+    os.replace(tmp, path)
+
+
+def _update_rows(frame, rows):
+    """
+    Overwrite frame's rows with rows' values in place, matching on id.
+    Returns the rows whose id isn't in frame, for the caller to append.
+    """
+    if not len(rows):
+        return rows
+    positions = pd.Index(frame["id"]).get_indexer(rows["id"])
+    found = positions >= 0
+    for i, column in enumerate(frame.columns):
+        frame.iloc[positions[found], i] = rows[column].to_numpy()[found]
+    return rows[~found]
+
+
+def refresh_snapshot(db_url=DB_URL, path=CACHE_PATH, full=False):
+    """
+    Bring the snapshot at path up to date with the database and return it
+    as a DataFrame. Writes the file only when something changed.
+    """
+    path = cache_file(path)
+    with get_engine(db_url).connect() as conn:
+        has_deletions = inspect(conn).has_table(CarDeletion.__tablename__)
+        # Watermarks first: anything written after these reads is picked up next time
+        last_deleted = (conn.scalar(select(func.max(CarDeletion.id))) or 0) if has_deletions else 0
+        updated_at = conn.scalar(select(func.max(CarListing.updated_at)))
+        frame = None if full else _read_snapshot(path)
+        if frame is None or frame.attrs["updated_at"] is None:
+            # No watermark to go by (e.g. a table without updated_at values)
+            frame = _read(conn, CarListing.id > 0)
+        else:
+            max_id, since_deleted = frame.attrs["max_id"], frame.attrs["last_deleted"]
+            since = datetime.fromisoformat(frame.attrs["updated_at"])
+            if updated_at == since and last_deleted == since_deleted and conn.scalar(
+                    select(CarListing.id).where(CarListing.id > max_id).limit(1)) is None:
+                return frame
+            if last_deleted > since_deleted:
+                gone = conn.scalars(select(CarDeletion.car_id).where(CarDeletion.id > since_deleted)).all()
+                frame = frame[~frame["id"].isin(gone)].reset_index(drop=True)
+            # Two range reads on indexed columns rather than one OR that scans
+            changed = _read(conn, CarListing.updated_at >= since - REFRESH_OVERLAP)
+            new = _read(conn, CarListing.id > max_id)
+            # Rows missing from the snapshot (new ones, a deleted id reused) go in once
+            missing = _update_rows(frame, changed)
+            new = pd.concat([missing[~missing["id"].isin(new["id"])], new], ignore_index=True)
+            if len(new):
+                frame = pd.concat([frame, new], ignore_index=True).sort_values("id", ignore_index=True)
+
+    frame.attrs = {"version": SNAPSHOT_VERSION, "last_deleted": last_deleted,
+                   "updated_at": updated_at.isoformat() if updated_at else None,
+                   "max_id": int(frame["id"].max()) if len(frame) else 0}
+    _write_snapshot(frame, path)
+    return frame
+
+
+def with_days_on_market(frame, today=None):
+    """Add days_on_market (days since date_found, as of today) to frame in place."""
+    today = np.datetime64(today or date.today(), "D")
+    frame["days_on_market"] = (today - frame["date_found"].to_numpy("datetime64[D]")).astype("float64")
+    frame.loc[frame["date_found"].isna(), "days_on_market"] = np.nan
+    return frame
+
+
+def load_cars(db_url=DB_URL, path=CACHE_PATH, full=False, today=None):
+    """The refreshed snapshot with days_on_market, ready for the analyze_* functions."""
+    return with_days_on_market(refresh_snapshot(db_url, path, full), today)
+
+
+def _active_days(frame):
+    """days_on_market of the available cars, NaN for the rest."""
+    days = frame["days_on_market"]
+    return days.where(frame["still_available"]) if "still_available" in frame.columns else days
+
+
+def analyze_time_on_market(frame):
+    """How long available cars have been listed."""
+    days = frame["days_on_market"].to_numpy()
+    if "still_available" in frame.columns:
+        days = days[frame["still_available"].to_numpy(bool)]
+    stats = {
+        "median_days": np.nanmedian(days) if len(days) else np.nan,
+        "avg_days": np.nanmean(days) if len(days) else np.nan,
+        "quick_movers": int((days <= QUICK_DAYS).sum()),
+        "stale_inventory": int((days >= STALE_DAYS).sum()),
+        "total_active": len(days),
+    }
+
+    total = stats["total_active"] or 1
+    print("📊 TIME ON MARKET ANALYSIS")
+    print(f"Average days listed: {stats['avg_days']:.1f}")
+    print(f"Median days listed: {stats['median_days']:.0f}")
+    print(f"Quick movers (≤{QUICK_DAYS} days): {stats['quick_movers']} ({stats['quick_movers'] / total * 100:.1f}%)")
+    print(f"Stale inventory (≥{STALE_DAYS} days): {stats['stale_inventory']} "
+          f"({stats['stale_inventory'] / total * 100:.1f}%)")
+    return stats
+
+
+def _type_stats(frame):
+    """Per is_hybrid: listing count, days on market and price summaries."""
+    # Only the columns it needs, so nothing copies the listing titles
+    days = frame["days_on_market"]
+    columns = frame[["is_hybrid", "days_on_market", "price_num"]]
+    return columns.assign(quick=days <= QUICK_DAYS, stale=days >= STALE_DAYS).groupby("is_hybrid").agg(
+        count=("is_hybrid", "size"), avg_days=("days_on_market", "mean"), median_days=("days_on_market", "median"),
+        quick=("quick", "sum"), stale=("stale", "sum"), median_price=("price_num", "median"),
+        min_price=("price_num", "min"), max_price=("price_num", "max"))
+
+
+def analyze_hybrid_vs_regular(frame):
+    """Hybrid and regular listings side by side: share, time on market, price."""
+    stats = _type_stats(frame)
+    hybrid_mask = frame["is_hybrid"].to_numpy(bool)
+    hybrids, regulars = frame[hybrid_mask], frame[~hybrid_mask]
+    total = len(frame) or 1
+
+    print("📊 HYBRID vs REGULAR ENGINE COMPARISON")
+    print("=" * 60)
+    print(f"Total listings: {len(frame)}")
+    print(f"Hybrids: {len(hybrids)} ({len(hybrids) / total * 100:.1f}%)")
+    print(f"Regular engines: {len(regulars)} ({len(regulars) / total * 100:.1f}%)")
+    print()
+    print("⏰ TIME ON MARKET")
+    print(f"{'Category':<15} {'Avg Days':<10} {'Median':<8} {'Quick (<7d)':<12} {'Stale (>30d)':<12}")
+    print("-" * 60)
+    for is_hybrid, label in ((True, "Hybrids"), (False, "Regular")):
+        if is_hybrid in stats.index:
+            row = stats.loc[is_hybrid]
+            print(f"{label:<15} {row.avg_days:<10.1f} {row.median_days:<8.0f} {int(row.quick):<12} {int(row.stale):<12}")
+    print()
+
+    print("💰 PRICE COMPARISON")
+    h = stats.loc[True] if True in stats.index else None
+    r = stats.loc[False] if False in stats.index else None
+    h_priced = h is not None and not pd.isna(h.median_price)
+    r_priced = r is not None and not pd.isna(r.median_price)
+    if h_priced and r_priced:
+        premium = h.median_price - r.median_price
+        print(f"Hybrid median price: ${h.median_price:,.0f}")
+        print(f"Regular median price: ${r.median_price:,.0f}")
+        print(f"Hybrid premium: ${premium:,.0f} ({premium / r.median_price * 100:.1f}%)")
+        print(f"Hybrid range: ${h.min_price:,.0f} - ${h.max_price:,.0f}")
+        print(f"Regular range: ${r.min_price:,.0f} - ${r.max_price:,.0f}")
+    elif h_priced:
+        print(f"Hybrid median price: ${h.median_price:,.0f}")
+        print("No regular engine price data for comparison")
+    elif r_priced:
+        print(f"Regular median price: ${r.median_price:,.0f}")
+        print("No hybrid price data for comparison")
+    else:
+        print("No valid price data found for either category")
+
+    return {
+        "hybrids": hybrids,
+        "regulars": regulars,
+        "hybrid_count": len(hybrids),
+        "regular_count": len(regulars),
+    }
+
+
+def analyze_oldest_listings(frame, limit=20):
+    """Available cars that have been listed the longest."""
+    oldest = frame.loc[_active_days(frame).nlargest(limit).index]
+
+    print(f"🕰️ OLDEST LISTINGS (Top {limit})")
+    print("=" * 90)
+    print(f"{'Days':<5} {'Year':<6} {'Price':<12} {'Hybrid':<8} {'Listing':<60}")
+    print("-" * 90)
+    for days, year, price, is_hybrid, listing in zip(
+            oldest["days_on_market"], oldest["year_num"], oldest["price_num"],
+            oldest["is_hybrid"], oldest["listing"]):
+        year_str = "N/A" if pd.isna(year) else str(year)
+        price_str = "N/A" if pd.isna(price) else f"${price:,}"
+        print(f"{days:<5.0f} {year_str:<6} {price_str:<12} {'✅' if is_hybrid else '❌':<8} {str(listing or '')[:58]}")
+
+    days = oldest["days_on_market"]
+    print("\n📈 NEGOTIATION INSIGHTS:")
+    print(f"• Cars listed ≥30 days: {int((days >= 30).sum())}")
+    print(f"• Cars listed ≥60 days: {int((days >= 60).sum())}")
+    print(f"• Average days for oldest listings: {days.mean():.1f}")
+    return oldest
+
+
+def analyze_by_year(frame, years=YEARS):
+    """Hybrid vs regular per model year: count, median price and miles, days listed, hybrid premium."""
+    positions = np.flatnonzero(frame["year_num"].between(*years).fillna(False).to_numpy(bool))
+    if not len(positions):
+        print(f"No data found with valid years between {years[0]}-{years[1]}")
+        return []
+
+    in_range = frame[["year_num", "is_hybrid", "price_num", "days_on_market", "mileage_num"]].take(positions)
+    groups = in_range.groupby(["year_num", "is_hybrid"])
+    stats = groups.agg(count=("is_hybrid", "size"), median_price=("price_num", "median"),
+                       avg_days=("days_on_market", "mean"), median_miles=("mileage_num", "median"))
+    rows = groups.indices
+
+    print("📊 YEAR-BY-YEAR ANALYSIS")
+    print("=" * 80)
+    print(f"{'Year':<6} {'Type':<8} {'Count':<6} {'Med Price':<12} {'Avg Days':<10} {'Med Miles':<12}")
+    print("-" * 80)
+    year_data = []
+    for year in sorted(stats.index.get_level_values(0).unique()):
+        for is_hybrid in (True, False):
+            if (year, is_hybrid) not in stats.index:
+                continue
+            row = stats.loc[(year, is_hybrid)]
+            kind = "Hybrid" if is_hybrid else "Regular"
+            price_str = "N/A" if pd.isna(row.median_price) else f"${row.median_price:,.0f}"
+            days_str = "N/A" if pd.isna(row.avg_days) else f"{row.avg_days:,.0f}"
+            miles_str = "N/A" if pd.isna(row.median_miles) else f"{row.median_miles:,.0f}"
+            print(f"{int(year):<6} {kind:<8} {int(row['count']):<6} {price_str:<12} {days_str:<10} {miles_str:<12}")
+            year_data.append({
+                "year": int(year),
+                "type": kind,
+                "count": int(row["count"]),
+                "median_price": row.median_price,
+                "avg_days": row.avg_days,
+                "median_miles": row.median_miles,
+                "data": frame.take(positions[rows[(year, is_hybrid)]]),
+            })
+
+    print("\n💰 HYBRID PREMIUM BY YEAR:")
+    print("-" * 40)
+    prices = stats["median_price"].unstack("is_hybrid")
+    for year, row in prices.iterrows():
+        h_med, r_med = row.get(True, np.nan), row.get(False, np.nan)
+        if not pd.isna(h_med) and not pd.isna(r_med):
+            premium = h_med - r_med
+            print(f"{int(year)}: ${premium:,.0f} ({premium / r_med * 100:.1f}% premium)")
+    return year_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db-url", default=DB_URL)
+    parser.add_argument("--full", action="store_true", help="rebuild the snapshot from scratch")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    frame = load_cars(args.db_url, full=args.full)
+    print(f"📦 {len(frame):,} listings from {cache_file()} in {time.perf_counter() - start:.2f}s\n")
+    analyze_time_on_market(frame)
+    print()
+    analyze_hybrid_vs_regular(frame)
+    print()
+    analyze_oldest_listings(frame)
+    print()
+    analyze_by_year(frame)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark the analytics snapshot and analyses against the notebook's way.
+
+Times the notebook's pd.read_sql("SELECT * FROM cars") load, a full
+snapshot build, a load from an up-to-date snapshot, an incremental refresh
+after an upsert batch (half refreshed listings, half new ones), a raw SQL
+price edit and a few deleted rows, and each analyze_* function, then checks the snapshot's numbers against ones
+computed from the read_sql frame with the notebook's string cleaning, and
+the refreshed snapshot against a full rebuild.
+
+    python -m benchmarks.bench_analytics --rows 1m --batch 2000
+"""
+
+import argparse
+import contextlib
+import io
+import statistics
+import tempfile
+import time
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from analytics import (analyze_by_year, analyze_hybrid_vs_regular, analyze_oldest_listings,
+                       analyze_time_on_market, cache_file, load_cars)
+from benchmarks.synth_db import cached_db, make_batch, parse_size
+from db import get_session
+from upsert import bulk_upsert_cars
+
+
+def timed(fn, runs=1):
+    samples, result = [], None
+    for _ in range(runs):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), result
+
+
+def notebook_frame(db_url):
+    engine = create_engine(db_url)
+    df = pd.read_sql("SELECT * FROM cars", engine)
+    engine.dispose()
+    df["date_found"] = pd.to_datetime(df["date_found"])
+    df["days_on_market"] = (pd.Timestamp.now() - df["date_found"]).dt.days
+    return df
+
+
+def check(frame, df):
+    """Snapshot numbers vs the notebook's, from the raw strings. Returns mismatches."""
+    price = pd.to_numeric(df["price"].astype(str).str.replace("[$,]", "", regex=True), errors="coerce")
+    miles = pd.to_numeric(df["mileage"].astype(str).str.replace("[^0-9]", "", regex=True), errors="coerce")
+    year = pd.to_numeric(df["year"].astype(str).str.extract(r"(\d{4})")[0], errors="coerce")
+    active = df[df["still_available"] == True]  # noqa: E712 - as in the notebook
+    with contextlib.redirect_stdout(io.StringIO()):
+        stats = analyze_time_on_market(frame)
+        by_year = analyze_by_year(frame)
+    problems = []
+    for key, expected in (("median_days", active["days_on_market"].median()),
+                          ("avg_days", active["days_on_market"].mean()),
+                          ("quick_movers", (active["days_on_market"] <= 7).sum()),
+                          ("stale_inventory", (active["days_on_market"] >= 30).sum()),
+                          ("total_active", len(active))):
+        if abs(stats[key] - expected) > 1e-6:
+            problems.append(f"{key}: {stats[key]} != {expected}")
+    for row in by_year:
+        subset = (year == row["year"]) & (df["is_hybrid"] == (row["type"] == "Hybrid"))
+        for key, expected in (("count", subset.sum()), ("median_price", price[subset].median()),
+                              ("median_miles", miles[subset].median()),
+                              ("avg_days", df.loc[subset, "days_on_market"].mean())):
+            if abs(row[key] - expected) > 1e-6:
+                problems.append(f"{row['year']} {row['type']} {key}: {row[key]} != {expected}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", default="1m", help="1k, 100k, 1m or a number")
+    parser.add_argument("--batch", type=int, default=2000, help="listings upserted before the incremental refresh")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    rows = parse_size(args.rows)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = cached_db(rows, f"{tmp}/cars.db")
+        path = f"{tmp}/cars"
+        # The seeded rows were all written within seconds; date them as a real table's would be,
+        # or the refresh's REFRESH_OVERLAP reaches back over every one of them
+        with get_session(db_url) as session:
+            session.execute(text("UPDATE cars SET updated_at = date_found"))
+            session.commit()
+
+        seconds, df = timed(lambda: notebook_frame(db_url))
+        print(f"  read_sql (notebook)    {seconds * 1000:9.1f}ms  {len(df):,} rows")
+        seconds, frame = timed(lambda: load_cars(db_url, path, full=True))
+        print(f"  snapshot full build    {seconds * 1000:9.1f}ms  {cache_file(path)}")
+        seconds, frame = timed(lambda: load_cars(db_url, path), args.runs)
+        print(f"  snapshot load          {seconds * 1000:9.1f}ms  (median of {args.runs})")
+
+        problems = check(frame, df)
+        print("  check vs notebook      " + ("ok" if not problems else "; ".join(problems[:5])))
+
+        for name, fn in (("analyze_time_on_market", lambda: analyze_time_on_market(frame)),
+                         ("analyze_hybrid_vs_regular", lambda: analyze_hybrid_vs_regular(frame)),
+                         ("analyze_oldest_listings", lambda: analyze_oldest_listings(frame)),
+                         ("analyze_by_year", lambda: analyze_by_year(frame))):
+            seconds, _ = timed(fn, args.runs)
+            print(f"  {name:<26} {seconds * 1000:9.1f}ms")
+
+        with get_session(db_url) as session, contextlib.redirect_stdout(io.StringIO()):
+            bulk_upsert_cars(session, make_batch(rows, args.batch))
+            # A hand edit: no listing_event, only the trigger's updated_at
+            session.execute(text("UPDATE cars SET price = '$1,234', price_num = 1234 WHERE id % 991 = 0"))
+            session.execute(text("DELETE FROM cars WHERE id % 997 = 0"))
+            session.commit()
+        seconds, frame = timed(lambda: load_cars(db_url, path))
+        print(f"  incremental refresh    {seconds * 1000:9.1f}ms  after a {args.batch:,}-listing batch, "
+              f"now {len(frame):,} rows")
+        problems = check(frame, notebook_frame(db_url))
+        rebuilt = load_cars(db_url, f"{tmp}/rebuilt", full=True)
+        if not frame.equals(rebuilt):
+            problems.append("differs from a full rebuild")
+        print("  check vs notebook      " + ("ok" if not problems else "; ".join(problems[:5])))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark the shared engine registry against an engine per call.
+
+Runs the same sequence of report builds and upsert batches against two copies
+of a seeded database: once the old way (create_engine, and create_all for
+upserts, on every call, default SQLite settings) and once through db.py.
+
+    python -m benchmarks.bench_db --rows 100000 --runs 20
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from benchmarks.synth_db import seed_cars, make_batch
+from db import dispose_engines
+from email_report import PRICE_CAP_DEFAULT, AGED_DAYS_DEFAULT, _hybrid_tables, build_hybrid_tables
+from main import save_to_db
+from models import Base
+from upsert import bulk_upsert_cars
+
+
+def legacy_report(db_url):
+    engine = create_engine(db_url)
+    with Session(engine) as session:
+        return _hybrid_tables(session, PRICE_CAP_DEFAULT, AGED_DAYS_DEFAULT)
+
+
+def legacy_upsert(cars, db_url):
+    engine = create_engine(db_url)
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        return bulk_upsert_cars(session, cars)
+
+
+def shared_report(db_url):
+    return build_hybrid_tables(db_url, PRICE_CAP_DEFAULT, AGED_DAYS_DEFAULT)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn(*args)
+    return time.perf_counter() - start
+
+
+def run(db_url, report, upsert, batches):
+    report_times = [timed(report, db_url) for _ in batches]
+    upsert_times = [timed(upsert, cars, db_url) for cars in batches]
+    return report_times, upsert_times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    batches = [make_batch(args.rows, args.batch, seed=n) for n in range(args.runs)]
+    with tempfile.TemporaryDirectory() as tmp:
+        base = os.path.join(tmp, "base.db")
+        print(f"🌱 Seeding {args.rows:,} synthetic rows...")
+        seed_cars(f"sqlite:///{base}", args.rows)
+
+        results = {}
+        for name, report, upsert in (("engine per call", legacy_report, legacy_upsert),
+                                     ("shared engine", shared_report, save_to_db)):
+            path = os.path.join(tmp, f"{name.replace(' ', '_')}.db")
+            shutil.copy(base, path)
+            results[name] = run(f"sqlite:///{path}", report, upsert, batches)
+            dispose_engines()
+
+    for name, (report_times, upsert_times) in results.items():
+        print(f"{name:<16} report {statistics.median(report_times) * 1000:7.1f}ms  "
+              f"upsert batch {statistics.median(upsert_times) * 1000:7.1f}ms  (median of {args.runs})")
+
+    (old_report, old_upsert), (new_report, new_upsert) = results.values()
+    print(f"⚡ Report {statistics.median(old_report) / statistics.median(new_report):.1f}x, "
+          f"upsert {statistics.median(old_upsert) / statistics.median(new_upsert):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
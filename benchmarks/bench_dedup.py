@@ -0,0 +1,134 @@
+"""
+Benchmark repost detection on a synthetic table with known reposts.
+
+Generates --rows listings of which about --repost-rate are reposts of an
+earlier one (new link, a few more miles, same or lower price, title
+sometimes reworded). Times a full assign_vehicle_ids() run, then an
+incremental one over a day's worth of new listings, and scores both
+against the known answer: precision/recall over the "same truck" pairs.
+
+    python -m benchmarks.bench_dedup --rows 100000 --new 500
+"""
+
+import argparse
+import contextlib
+import io
+import random
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from itertools import combinations
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from dedup import assign_vehicle_ids
+from models import Base, CarListing
+from normalize import numeric_columns
+
+TRIMS = ("XL", "XLT", "Lariat", "Tremor", "First Edition")
+EXTRAS = ("AWD", "FWD", "certificada", "garantía", "como nueva", "un dueño", "financiamiento",
+          "poco millaje", "full label", "cámara", "tow package", "aros", "liquidación")
+
+
+def make_listing(truck, n):
+    year, hybrid, trim, extras, mileage, price, found = truck
+    title = f"Ford Maverick {trim} {'Hybrid ' if hybrid else ''}{year} {' '.join(extras)}"
+    miles = f"{mileage:,}"
+    price_text = f"${price:,}"
+    return {
+        **numeric_columns(price_text, miles, str(year)),
+        "listing": title,
+        "link": f"https://example.test/UDTransDetail.asp?AdNumber={n}",
+        "mileage": miles,
+        "price": price_text,
+        "is_hybrid": hybrid,
+        "year": str(year),
+        "date_found": found,
+        "still_available": True,
+    }
+
+
+def generate(rng, count, repost_rate, trucks, start):
+    """count listings; each is a new truck or (repost_rate) a repost of a known one. Returns rows, truck ids."""
+    rows, truck_of = [], []
+    today = date.today()
+    for n in range(start, start + count):
+        if trucks and rng.random() < repost_rate:
+            t = rng.randrange(len(trucks))
+            year, hybrid, trim, extras, mileage, price, found = trucks[t]
+            if rng.random() < 0.3:
+                extras = extras[:-1] + (rng.choice(EXTRAS),)
+            trucks[t] = (year, hybrid, trim, extras, mileage + rng.randint(0, 80),
+                         price - rng.choice((0, 0, 500, 1000)), min(found + timedelta(days=rng.randint(1, 45)), today))
+        else:
+            t = len(trucks)
+            trucks.append((rng.randint(2022, 2025), rng.random() < 0.4, rng.choice(TRIMS),
+                           tuple(rng.sample(EXTRAS, rng.randint(0, 3))),
+                           rng.randint(1, 60000), rng.randint(22, 42) * 1000,
+                           today - timedelta(days=rng.randint(0, 365))))
+        rows.append(make_listing(trucks[t], n))
+        truck_of.append(t)
+    return rows, truck_of
+
+
+def pair_scores(engine, truck_of_link):
+    """Precision/recall of the stored vehicle ids over same-truck pairs."""
+    with Session(engine) as session:
+        stored = session.execute(select(CarListing.link, CarListing.vehicle_id)).all()
+    by_vehicle, by_truck = defaultdict(list), defaultdict(list)
+    for link, vehicle_id in stored:
+        by_vehicle[vehicle_id].append(link)
+        by_truck[truck_of_link[link]].append(link)
+    predicted = {frozenset(p) for links in by_vehicle.values() for p in combinations(links, 2)}
+    actual = {frozenset(p) for links in by_truck.values() for p in combinations(links, 2)}
+    hits = len(predicted & actual)
+    return (hits / len(predicted) if predicted else 1.0), (hits / len(actual) if actual else 1.0)
+
+
+def timed_assign(engine):
+    with Session(engine) as session, contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        assigned, reposts = assign_vehicle_ids(session)
+        return time.perf_counter() - start, assigned, reposts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--new", type=int, default=500, help="listings added before the incremental run")
+    parser.add_argument("--repost-rate", type=float, default=0.08)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    trucks = []
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/dedup.db")
+        Base.metadata.create_all(engine)
+        truck_of_link = {}
+
+        def add(count, start):
+            rows, truck_of = generate(rng, count, args.repost_rate, trucks, start)
+            truck_of_link.update((row["link"], t) for row, t in zip(rows, truck_of))
+            with engine.begin() as conn:
+                for i in range(0, len(rows), 5000):
+                    conn.execute(insert(CarListing), rows[i:i + 5000])
+
+        add(args.rows, 0)
+        seconds, assigned, reposts = timed_assign(engine)
+        precision, recall = pair_scores(engine, truck_of_link)
+        print(f"  full run      {assigned:>8,} listings  {seconds * 1000:9.1f}ms  "
+              f"{reposts:,} reposts  precision {precision:.3f}  recall {recall:.3f}")
+
+        add(args.new, args.rows)
+        seconds, assigned, reposts = timed_assign(engine)
+        precision, recall = pair_scores(engine, truck_of_link)
+        print(f"  incremental   {assigned:>8,} listings  {seconds * 1000:9.1f}ms  "
+              f"{reposts:,} reposts  precision {precision:.3f}  recall {recall:.3f}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark the listing_events helper queries on a large synthetic history.
+
+Seeds a cars table, then a year of events for it: a 'listed' event per car,
+a few price/mileage changes each, removals for ~30% and some relistings.
+Times price_drops() and time_to_sale() and prints their query plans.
+
+    python -m benchmarks.bench_history --cars 200000 --runs 10    # ~1M events
+"""
+
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import Session
+
+from benchmarks.synth_db import seed_cars
+from history import LISTED, MILEAGE, PRICE, RELISTED, REMOVED, price_drops, record_events, time_to_sale
+from models import CarListing, ListingEvent
+
+
+def seed_events(engine, seed=3):
+    rng = random.Random(seed)
+    now = datetime.now()
+    with Session(engine) as session:
+        cars = session.execute(select(CarListing.id, CarListing.date_found, CarListing.price_num,
+                                   CarListing.mileage_num)).all()
+        batch, total = [], 0
+        for car_id, found, price, mileage in cars:
+            at = datetime.combine(found, datetime.min.time()) + timedelta(hours=rng.randint(6, 20))
+            batch.append({"listing_id": car_id, "observed_at": at, "event": LISTED,
+                          "price_num": price, "mileage_num": mileage})
+            for _ in range(rng.randint(0, 8)):
+                at += timedelta(days=rng.randint(1, 20))
+                if at > now:
+                    break
+                if rng.random() < 0.7 and price:
+                    new = price + rng.choice([-1500, -1000, -500, 500])
+                    batch.append({"listing_id": car_id, "observed_at": at, "event": PRICE,
+                                  "price_num": new, "prev_price_num": price})
+                    price = new
+                else:
+                    new = (mileage or 0) + rng.randint(100, 2000)
+                    batch.append({"listing_id": car_id, "observed_at": at, "event": MILEAGE,
+                                  "mileage_num": new, "prev_mileage_num": mileage})
+                    mileage = new
+            if rng.random() < 0.3 and at < now:
+                at += timedelta(days=rng.randint(1, 30))
+                batch.append({"listing_id": car_id, "observed_at": min(at, now), "event": REMOVED})
+                if rng.random() < 0.1:
+                    batch.append({"listing_id": car_id, "observed_at": min(at + timedelta(days=3), now),
+                                  "event": RELISTED, "price_num": price, "mileage_num": mileage})
+            if len(batch) >= 20000:
+                total += record_events(session, batch)
+                batch = []
+        total += record_events(session, batch)
+        session.commit()
+        return total
+
+
+def timed(fn, runs):
+    samples, result = [], None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--cars", type=int, default=200_000)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = f"sqlite:///{tmp}/history.db"
+        print(f"🌱 Seeding {args.cars:,} cars...")
+        seed_cars(db_url, args.cars)
+        engine = create_engine(db_url)
+        start = time.perf_counter()
+        events = seed_events(engine)
+        print(f"🌱 {events:,} events in {time.perf_counter() - start:.1f}s")
+
+        with Session(engine) as session:
+            session.execute(text("ANALYZE"))
+            for name, fn in (("price_drops(7d)", lambda: price_drops(session, days=7)),
+                             ("price_drops(30d, hybrids)", lambda: price_drops(session, days=30, hybrids_only=True)),
+                             ("time_to_sale(30d)", lambda: time_to_sale(session, days=30))):
+                median, rows = timed(fn, args.runs)
+                print(f"  {name:<26} {median * 1000:8.1f}ms  ({len(rows):,} rows, median of {args.runs})")
+
+            since = datetime.now() - timedelta(days=7)
+            for name, stmt in (
+                ("price_drops", select(ListingEvent.id).join(CarListing, CarListing.id == ListingEvent.listing_id)
+                 .where(ListingEvent.event == PRICE, ListingEvent.observed_at >= since)),
+                ("listed_at lookup", select(ListingEvent.observed_at)
+                 .where(ListingEvent.listing_id == 1, ListingEvent.observed_at <= since)),
+            ):
+                compiled = stmt.compile(engine, compile_kwargs={"literal_binds": True})
+                plan = session.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+                print(f"  plan {name}: " + "; ".join(row[-1] for row in plan))
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
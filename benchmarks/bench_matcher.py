@@ -0,0 +1,84 @@
+"""
+Benchmark the batched ListingMatcher against per-row fuzzywuzzy calls.
+
+Checks that keep/is_hybrid decisions match the original checks for the
+single-model vocabulary, then times both approaches as the number of
+tracked models grows.
+
+    python -m benchmarks.bench_matcher --titles 20000
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from fuzzywuzzy import fuzz
+
+from matcher import ListingMatcher, FUZZ_CUTOFF
+
+MODELS = [
+    "maverick", "ranger", "tacoma", "santa cruz", "frontier", "colorado", "canyon", "ridgeline",
+    "gladiator", "bronco", "escape", "rav4", "cr-v", "tucson", "sportage", "corolla cross",
+    "highlander", "explorer", "sorento", "outlander", "forester", "crosstrek", "cx-5", "pilot",
+    "f-150", "silverado", "sierra", "tundra", "titan", "ram 1500", "kona", "niro",
+    "prius", "camry", "accord", "civic",
+]
+WORDS = ["ford", "toyota", "hyundai", "nissan", "como", "nueva", "full", "labels", "2022", "2023",
+         "2024", "xlt", "lariat", "awd", "fwd", "hybrid", "híbrido", "hybird", "hibrido", "maverik",
+         "mavrick", "dealer", "financiamiento", "disponible", "garantía", "4x4"]
+
+
+def synthetic_titles(n, seed=5):
+    rng = random.Random(seed)
+    titles = []
+    for _ in range(n):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(2, 7))]
+        if rng.random() < 0.6:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(MODELS))
+        titles.append(" ".join(words))
+    return titles
+
+
+def legacy_classify(titles, models):
+    """The original per-row checks, extended to several models."""
+    out = []
+    for title in titles:
+        lower = title.lower()
+        if not any(fuzz.partial_ratio(lower, m) >= FUZZ_CUTOFF for m in models):
+            out.append(None)
+            continue
+        out.append(fuzz.partial_ratio(lower, "hybrid") >= FUZZ_CUTOFF or
+                   fuzz.partial_ratio(lower, "híbrido") >= FUZZ_CUTOFF)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--titles", type=int, default=20_000)
+    args = parser.parse_args()
+    titles = synthetic_titles(args.titles)
+
+    expected = legacy_classify(titles, ["maverick"])
+    got = [t["is_hybrid"] if t else None for t in ListingMatcher().classify(titles)]
+    mismatches = sum(a != b for a, b in zip(expected, got))
+    print(f"🔎 {mismatches} decision mismatches vs fuzzywuzzy over {len(titles):,} titles")
+    if mismatches:
+        sys.exit(f"❌ ListingMatcher disagrees with the original checks on {mismatches} titles")
+
+    for n_models in (1, 12, 36):
+        models = MODELS[:n_models]
+        start = time.perf_counter()
+        legacy_classify(titles, models)
+        legacy_t = time.perf_counter() - start
+
+        matcher = ListingMatcher(models=models)
+        start = time.perf_counter()
+        matcher.classify(titles)
+        batch_t = time.perf_counter() - start
+        print(f"{n_models:>3} models  per-row {len(titles) / legacy_t:>10,.0f} titles/s  "
+              f"batched {len(titles) / batch_t:>10,.0f} titles/s  ({legacy_t / batch_t:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
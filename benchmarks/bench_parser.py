@@ -0,0 +1,94 @@
+"""
+Benchmark result-page parsing backends over the synthetic fixtures (see fixtures/README.md).
+
+Every backend must return exactly what the original get_cars_from_page
+returned; the run fails otherwise.
+
+    python -m benchmarks.bench_parser --repeat 50
+"""
+
+import argparse
+import glob
+import os
+import re
+import time
+
+from bs4 import BeautifulSoup
+from fuzzywuzzy import fuzz
+
+import parsing
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def legacy_get_cars(html):
+    """The original get_cars_from_page body, minus the browser."""
+    scraped_cars = []
+    soup = BeautifulSoup(html, "html.parser")
+    for row in soup.find_all("tr", align="center", valign="middle"):
+        listing_tag = row.select_one("span.Tahoma15blacknound")
+        listing = listing_tag.get_text(strip=True).replace("\xa0", " ") if listing_tag else ""
+        listing_lower = listing.lower()
+        if fuzz.partial_ratio(listing_lower, "maverick") < 70:
+            continue
+        is_hybrid = (fuzz.partial_ratio(listing_lower, "hybrid") >= 70 or
+                     fuzz.partial_ratio(listing_lower, "híbrido") >= 70)
+        link_tag = row.select_one("a[href^='/UDTransDetail']")
+        link = "https://www.clasificadosonline.com" + link_tag["href"] if link_tag else ""
+        mileage_tag = row.select_one("span.Tahoma14DbluenoUnd")
+        mileage = mileage_tag.get_text(strip=True).replace("Millas", "").strip() if mileage_tag else ""
+        price_tag = row.select_one("span.Tahoma14BrownNound")
+        price = price_tag.get_text(strip=True) if price_tag else ""
+        year_match = re.search(r'\b(201[9]|202[0-5])\b', listing)
+        year = year_match.group(1) if year_match else "Unknown"
+        scraped_cars.append({
+            "listing": listing, "link": link, "mileage": mileage,
+            "price": price, "is_hybrid": is_hybrid, "year": year
+        })
+    return scraped_cars
+
+
+def load_pages(pattern="results_page_*.html"):
+    paths = sorted(glob.glob(os.path.join(FIXTURES, pattern)))
+    return [open(p, encoding="utf-8").read() for p in paths]
+
+
+def time_backend(parse, pages, repeat):
+    rows = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages:
+            rows += sum(1 for _ in parse(html))
+    return rows, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    pages = load_pages()
+    expected = [legacy_get_cars(html) for html in pages]
+
+    candidates = {"legacy": legacy_get_cars}
+    for backend in parsing.BACKENDS:
+        candidates[backend] = lambda html, b=backend: parsing.parse_cars(html, backend=b)
+        got = [parsing.parse_cars(html, backend=backend) for html in pages]
+        assert got == expected, f"{backend} output differs from the original parser"
+
+    # Raw row extraction, without the fuzzy matching every backend shares
+    for backend in parsing.BACKENDS:
+        candidates[f"{backend} (rows only)"] = lambda html, b=backend: parsing.iter_rows(html, backend=b)
+
+    print(f"📄 {len(pages)} fixture pages x {args.repeat}")
+    baseline = None
+    for name, parse in candidates.items():
+        rows, elapsed = time_backend(parse, pages, args.repeat)
+        pages_per_s = len(pages) * args.repeat / elapsed
+        baseline = baseline or pages_per_s
+        print(f"{name:<18} {rows / elapsed:>10,.0f} rows/s  {pages_per_s:>8,.1f} pages/s  "
+              f"({pages_per_s / baseline:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark the report templates against the f-string rendering they replaced.
+
+Renders the weekly digest's listing tables (every listing found in the
+last --days days) three ways: the old way (fetch every row, an f-string per
+row, one join; HTML only), weekly_digest() into StringIOs, and
+weekly_digest() straight to files, which is what keeps a large digest in
+bounded memory. Prints the median time and tracemalloc's peak for each, and
+checks that hostile titles and links come out escaped and that the HTML and
+plain-text parts list the same rows.
+
+    python -m benchmarks.bench_render --rows 100k --days 30
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from sqlalchemy import func, select
+
+from benchmarks.synth_db import cached_db, parse_size
+from db import dispose_engines, get_session
+from email_report import listing_columns, weekly_digest
+from models import CarListing
+from report_render import ReportWriter
+
+HOSTILE = {"listing": "Ford Maverick Hybrid <script>alert(1)</script> & \"co\"", "link": "javascript:alert(1)",
+           "price": "$1", "mileage": "1", "year": "2024", "is_hybrid": True, "date_found": date.today()}
+
+
+def legacy_digest(db_url, days):
+    since = date.today() - timedelta(days=days)
+    with get_session(db_url) as session:
+        rows = session.execute(select(*listing_columns()).where(CarListing.date_found >= since)
+                               .order_by(CarListing.is_hybrid.desc(), CarListing.price_num)).all()
+    return "".join(
+        f"<tr><td>{r.listing}</td><td>{r.year}</td><td>{r.price}</td>"
+        f"<td>{r.mileage}</td><td>{(date.today() - r.date_found).days}</td>"
+        f"<td><a href='{r.link}'>link</a></td></tr>"
+        for r in rows
+    )
+
+
+def digest_to_strings(db_url, days):
+    out = ReportWriter()
+    weekly_digest(out, db_url, days)
+    return out.getvalue()
+
+
+def digest_to_files(db_url, days, tmp):
+    with open(os.path.join(tmp, "digest.html"), "w", encoding="utf-8") as html, \
+            open(os.path.join(tmp, "digest.txt"), "w", encoding="utf-8") as text:
+        weekly_digest(ReportWriter(html, text), db_url, days)
+
+
+def measure(fn, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(samples), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", default="100k", help="1k, 100k, 1m or a number")
+    parser.add_argument("--days", type=int, default=30, help="days the digest covers")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    rows = parse_size(args.rows)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = cached_db(rows, os.path.join(tmp, "cars.db"))
+        with get_session(db_url) as session:
+            session.add(CarListing(**HOSTILE))
+            session.commit()
+            listed = session.scalar(select(func.count()).select_from(CarListing)
+                                    .where(CarListing.date_found >= date.today() - timedelta(days=args.days)))
+        print(f"  digest of {listed:,} listings found in the last {args.days} days ({rows:,} in the db)")
+
+        for name, fn in (("f-strings, html only", lambda: legacy_digest(db_url, args.days)),
+                         ("templates -> StringIO", lambda: digest_to_strings(db_url, args.days)),
+                         ("templates -> files", lambda: digest_to_files(db_url, args.days, tmp))):
+            seconds, peak = measure(fn, args.runs)
+            print(f"  {name:<22} {seconds * 1000:9.1f}ms   peak {peak / 2 ** 20:7.1f} MiB")
+
+        html, text = digest_to_strings(db_url, args.days)
+        problems = []
+        if "<script>" in html or "javascript:" in html:
+            problems.append("hostile listing not escaped")
+        if "&lt;script&gt;alert(1)&lt;/script&gt; &amp; &quot;co&quot;" not in html:
+            problems.append("hostile title missing")
+        html_rows = html.count("<tr><td>")
+        text_rows = sum(1 for line in text.splitlines() if line.startswith("  ") and not line.lstrip().startswith(
+            ("Listing", "none")))
+        if html_rows != text_rows:
+            problems.append(f"{html_rows} HTML rows vs {text_rows} text rows")
+        print(f"  {len(html) / 2 ** 20:.1f} MiB HTML, {len(text) / 2 ** 20:.1f} MiB text, {html_rows:,} rows; "
+              + ("; ".join(problems) or "escaped, parts match"))
+        dispose_engines()
+
+
+if __name__ == "__main__":
+    main()
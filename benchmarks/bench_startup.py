@@ -0,0 +1,42 @@
+"""
+Measure cold-start time of each main.py subcommand.
+
+Spawns a fresh interpreter per run with --startup-only, so each sample covers
+interpreter start, imports and the subcommand's lazy dependency loading.
+
+    python -m benchmarks.bench_startup --runs 5
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+COMMANDS = ("scrape", "check-active", "report")
+
+
+def cold_start(command):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "main.py", "--startup-only", command],
+                   check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import main"], check=True)
+    print(f"{'import main':<14} {time.perf_counter() - start:6.2f}s")
+
+    for command in COMMANDS:
+        samples = [cold_start(command) for _ in range(args.runs)]
+        print(f"{command:<14} {statistics.median(samples):6.2f}s median  "
+              f"(min {min(samples):.2f}s, max {max(samples):.2f}s, {args.runs} runs)")
+
+
+if __name__ == "__main__":
+    main()
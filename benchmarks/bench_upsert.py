@@ -0,0 +1,99 @@
+"""
+Benchmark the batched upsert against the old per-row save loop.
+
+Seeds a synthetic cars table, then applies the same scraped batch (a mix of
+known links, new links and manually priced rows) to two copies of it.
+
+    python -m benchmarks.bench_upsert --rows 100000 --batch 2000
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+from datetime import date
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.exc import IntegrityError
+
+from benchmarks.synth_db import seed_cars, make_batch
+from models import CarListing
+from upsert import bulk_upsert_cars
+
+
+def legacy_save(session, scraped_cars):
+    """The original save_to_db loop: one lookup and one commit per car."""
+    saved_count = skipped_count = 0
+    for car in scraped_cars:
+        existing = session.query(CarListing).filter_by(link=car["link"]).first()
+        if existing:
+            existing.listing = car["listing"]
+            existing.mileage = car["mileage"]
+            existing.is_hybrid = car["is_hybrid"]
+            existing.year = car["year"]
+            existing.still_available = True
+            if car["price"] and car["price"].strip() and not existing.manual_price:
+                existing.price = car["price"]
+            session.commit()
+            skipped_count += 1
+        else:
+            session.add(CarListing(
+                listing=car["listing"], link=car["link"], mileage=car["mileage"],
+                price=car["price"], is_hybrid=car["is_hybrid"], year=car["year"],
+                date_found=date.today()))
+            try:
+                session.commit()
+                saved_count += 1
+            except IntegrityError:
+                session.rollback()
+                skipped_count += 1
+    return saved_count, skipped_count
+
+
+def run(save, db_url, cars):
+    engine = create_engine(db_url)
+    Session = sessionmaker(bind=engine)
+    with Session() as session, contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        counts = save(session, cars)
+        elapsed = time.perf_counter() - start
+    with engine.connect() as conn:
+        snapshot = conn.execute(
+            select(CarListing.link, CarListing.price, CarListing.still_available)
+            .order_by(CarListing.link)).all()
+    engine.dispose()
+    return elapsed, counts, snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=2_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = os.path.join(tmp, "base.db")
+        print(f"🌱 Seeding {args.rows:,} synthetic rows...")
+        seed_cars(f"sqlite:///{base}", args.rows)
+        cars = make_batch(args.rows, args.batch)
+
+        results = {}
+        for name, save in (("per-row loop", legacy_save), ("bulk upsert", bulk_upsert_cars)):
+            path = os.path.join(tmp, f"{name.replace(' ', '_')}.db")
+            shutil.copy(base, path)
+            results[name] = run(save, f"sqlite:///{path}", cars)
+            elapsed, counts, _ = results[name]
+            print(f"{name:<14} {elapsed:8.3f}s  saved/updated={counts}")
+
+    (old_t, old_counts, old_rows), (new_t, new_counts, new_rows) = results.values()
+    assert old_counts == new_counts, "saved/updated counts differ"
+    assert old_rows == new_rows, "resulting tables differ"
+    print(f"⚡ Speedup: {old_t / new_t:.1f}x on a {args.batch:,}-car batch")
+
+
+if __name__ == "__main__":
+    main()
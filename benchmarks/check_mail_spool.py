@@ -0,0 +1,122 @@
+"""
+Check mail_spool.py against the local SMTP stand-in (smtp_standin.py).
+
+Spools a backlog of daily reports (one of them twice) and checks that one
+connection delivers each report date once, with the latest HTML; that a
+report date already sent isn't spooled again; that a dropped connection or
+a 451 on DATA defers the message with backoff and it goes out once due; and
+that a message gives up into failed/ after MAIL_MAX_ATTEMPTS. Then times
+spooling against sending to a server that takes --delay seconds per reply.
+
+    python -m benchmarks.check_mail_spool --delay 0.1
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from functools import partial
+
+os.environ.setdefault("MY_EMAIL", "reports@example.test")
+
+import mail_spool
+from benchmarks.smtp_standin import SMTPStandIn
+
+
+def sender(server):
+    return partial(mail_spool.connect, server.host, server.port, security="none", password=None)
+
+
+def pending(spool_dir):
+    return {message["key"]: message for _, message in mail_spool.pending_messages(spool_dir)}
+
+
+def check(problems, condition, description):
+    print(f"  {'ok  ' if condition else 'FAIL'}  {description}")
+    if not condition:
+        problems.append(description)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--delay", type=float, default=0.1, help="seconds the slow server takes per reply")
+    args = parser.parse_args()
+    today = date.today()
+    problems = []
+
+    with tempfile.TemporaryDirectory() as spool, SMTPStandIn() as server:
+        send = partial(mail_spool.send_pending, spool, sender(server))
+
+        for days_ago in (2, 1, 0):
+            day = today - timedelta(days=days_ago)
+            mail_spool.spool_report(f"Daily {day}", f"<p>first {day}</p>", day, spool_dir=spool)
+        mail_spool.spool_report(f"Daily {today}", f"<p>second {today}</p>", today, spool_dir=spool)
+        check(problems, len(pending(spool)) == 3, "spooling a date again replaces its pending report")
+        sent, deferred = send()
+        check(problems, (sent, deferred, server.connections) == (3, 0, 1),
+              f"backlog of 3 sent over one connection ({sent} sent, {server.connections} connections)")
+        subjects = [message["Subject"] for message in server.messages]
+        check(problems, subjects == [f"Daily {today - timedelta(days=n)}" for n in (2, 1, 0)],
+              "oldest report date first")
+        check(problems, "second" in server.messages[-1].get_body().get_content(), "today's latest HTML was sent")
+        check(problems, mail_spool.spool_report("Daily again", "<p>x</p>", today, spool_dir=spool) is None
+              and not pending(spool), "a report date already sent isn't spooled again")
+
+        tomorrow = today + timedelta(days=1)
+        mail_spool.spool_report(f"Daily {tomorrow}", "<p>tomorrow</p>", tomorrow, spool_dir=spool)
+        server.drop_connections = 1
+        now = datetime.now()
+        check(problems, send(now=now) == (0, 1), "a dropped connection defers the message")
+        message = pending(spool)[f"daily-{tomorrow}"]
+        retry_at = datetime.fromisoformat(message["next_attempt_at"])
+        check(problems, message["attempts"] == 1 and retry_at >= now + mail_spool.retry_delay(1),
+              f"retry scheduled after {mail_spool.retry_delay(1)} ({message['last_error']})")
+        connections = server.connections
+        check(problems, send(now=now) == (0, 0) and server.connections == connections,
+              "nothing is sent before the retry is due")
+        check(problems, send(now=retry_at) == (1, 0) and not pending(spool), "sent once the retry is due")
+
+        for day in (today + timedelta(days=2), today + timedelta(days=3)):
+            mail_spool.spool_report(f"Daily {day}", "<p>later</p>", day, spool_dir=spool)
+        server.refuse_data = 1
+        connections = server.connections
+        check(problems, send() == (1, 1) and server.connections == connections + 1,
+              "a 451 on one message defers only that one, on the same connection")
+        message = next(iter(pending(spool).values()))
+        check(problems, message["attempts"] == 1, f"{message['key']} waits for its retry")
+
+        for attempt in range(mail_spool.MAIL_MAX_ATTEMPTS - 1):
+            server.drop_connections = 1
+            send(now=datetime.fromisoformat(pending(spool)[message["key"]]["next_attempt_at"]))
+        failed = os.listdir(os.path.join(spool, "failed"))
+        check(problems, not pending(spool) and failed == [f"{message['key']}.json"],
+              f"gave up after {mail_spool.MAIL_MAX_ATTEMPTS} attempts")
+
+    with tempfile.TemporaryDirectory() as spool, SMTPStandIn(delay=args.delay) as server:
+        start = time.perf_counter()
+        for days_ago in (2, 1, 0):
+            day = today - timedelta(days=days_ago)
+            mail_spool.spool_report(f"Daily {day}", "<p>report</p>" * 2000, day, spool_dir=spool)
+        spooled = (time.perf_counter() - start) / 3
+        start = time.perf_counter()
+        mail_spool.send_pending(spool, sender(server))
+        batched = time.perf_counter() - start
+        # The old way: a new connection per report
+        start = time.perf_counter()
+        for n in range(3):
+            with sender(server)() as connection:
+                connection.send_message(mail_spool.build_message(
+                    {"key": f"daily-{n}", "subject": "Daily", "html": "<p>report</p>" * 2000}))
+        separate = time.perf_counter() - start
+        print(f"  spool_report          {spooled * 1000:8.1f}ms per report (what the scrape now waits for)")
+        print(f"  send 3, one session   {batched * 1000:8.1f}ms  ({args.delay}s per server reply)")
+        print(f"  send 3, 3 sessions    {separate * 1000:8.1f}ms")
+
+    print("❌ mail spool check failed" if problems else "✅ mail spool delivers each report once, retrying failures")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Check that migrate_db.py brings an old database up to date and can resume.
+
+Builds a cars table with only the original columns (listing, link,
+mileage, price, is_hybrid, date_found), starts the migrations in a child
+process with small backfill chunks and SIGKILLs it halfway through a
+backfill, while this process keeps inserting listings the way the scraper
+of the time would. Then it runs the migrations again and verifies that they
+resumed after the last saved chunk, that every column the models define
+exists, that year and the *_num columns match what ingest computes
+(normalize.py), and that every listing got exactly one 'listed' event.
+
+    python -m benchmarks.check_migrations --rows 50000
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, func, inspect, select, text
+
+from models import Base, CarListing, ListingEvent, SchemaVersion
+from normalize import listing_year, numeric_columns
+
+KILL_VERSION = 5  # the integer price/mileage/year backfill
+OLD_SCHEMA = ("CREATE TABLE cars (id INTEGER PRIMARY KEY, listing VARCHAR, link VARCHAR UNIQUE, "
+              "mileage VARCHAR, price VARCHAR, is_hybrid BOOLEAN, date_found DATE)")
+TITLES = ("Ford Maverick XLT {year}", "Ford Maverick Hybrid {year} Lariat", "MAVERICK {year} 4x4 full label",
+          "Ford Maverick Hybrid como nueva", "Ford Maverick 2.0 Ecoboost")
+PRICES = ("${n},000", "A negociar", "", "${n}000")
+
+
+def old_rows(rng, start, count):
+    today = date.today()
+    for n in range(start, start + count):
+        yield {"listing": rng.choice(TITLES).format(year=rng.randint(2018, today.year + 2)),
+               "link": f"https://example.test/UDTransDetail.asp?AdNumber={n}",
+               "mileage": f"{rng.randint(1, 60) * 1000:,}", "price": rng.choice(PRICES).format(n=rng.randint(22, 42)),
+               "is_hybrid": rng.random() < 0.4, "date_found": today - timedelta(days=rng.randint(0, 365))}
+
+
+def insert_old(conn, rows):
+    """Insert like the scraper of the time: year too once the table has that column."""
+    rows = list(rows)
+    columns = ["listing", "link", "mileage", "price", "is_hybrid", "date_found"]
+    if "year" in {c["name"] for c in inspect(conn).get_columns("cars")}:
+        columns.append("year")
+        for row in rows:
+            row["year"] = listing_year(row["listing"])
+    conn.execute(text(f"INSERT INTO cars ({', '.join(columns)}) VALUES ({', '.join(':' + c for c in columns)})"),
+                 rows)
+    conn.commit()
+
+
+def spawn(db_url):
+    env = dict(os.environ, DB_URL=db_url, BACKFILL_CHUNK="500")
+    return subprocess.Popen([sys.executable, "migrate_db.py"], env=env, stdout=subprocess.PIPE, text=True)
+
+
+def progress(conn, version):
+    return conn.execute(select(SchemaVersion.last_id, SchemaVersion.applied_at)
+                        .where(SchemaVersion.version == version)).first()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=50_000)
+    args = parser.parse_args()
+    rng = random.Random(5)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = f"sqlite:///{tmp}/old.db"
+        engine = create_engine(db_url, connect_args={"timeout": 30})
+        with engine.connect() as conn:
+            conn.execute(text(OLD_SCHEMA))
+            insert_old(conn, old_rows(rng, 0, args.rows))
+
+            child = spawn(db_url)
+            written = args.rows
+            while child.poll() is None:
+                # The old scraper keeps saving listings while the migration runs
+                insert_old(conn, old_rows(rng, written, 20))
+                written += 20
+                if inspect(conn).has_table(SchemaVersion.__tablename__):
+                    state = progress(conn, KILL_VERSION)
+                    if state and state.last_id > args.rows // 2 and state.applied_at is None:
+                        break
+                time.sleep(0.02)
+            child.kill()
+            child.wait()
+            killed = progress(conn, KILL_VERSION)
+            assert killed and killed.applied_at is None, "migration finished before it could be killed"
+            print(f"💥 Killed during migration {KILL_VERSION} after id {killed.last_id:,}; "
+                  f"{written - args.rows:,} listings inserted meanwhile")
+            rest = conn.scalar(select(func.count()).select_from(CarListing).where(CarListing.id > killed.last_id))
+
+        child = spawn(db_url)
+        output, _ = child.communicate()
+        assert child.returncode == 0, output
+        assert f"of {rest:,} rows changed" in output, f"didn't resume after id {killed.last_id}"
+        print("⏯️ " + " | ".join(line.strip() for line in output.splitlines()[1:]))
+
+        with engine.connect() as conn:
+            missing = {table.name: sorted({c.name for c in table.columns}
+                                          - {c["name"] for c in inspect(conn).get_columns(table.name)})
+                       for table in Base.metadata.sorted_tables if inspect(conn).has_table(table.name)}
+            assert not any(missing.values()), f"missing columns: {missing}"
+            wrong = 0
+            for row in conn.execute(select(CarListing.id, CarListing.listing, CarListing.price, CarListing.mileage,
+                                           CarListing.year, CarListing.price_num, CarListing.mileage_num,
+                                           CarListing.year_num)):
+                expected = numeric_columns(row.price, row.mileage, row.year)
+                if row.year != listing_year(row.listing) or expected != {
+                        "price_num": row.price_num, "mileage_num": row.mileage_num, "year_num": row.year_num}:
+                    wrong += 1
+            cars = conn.scalar(select(func.count()).select_from(CarListing))
+            listed = conn.execute(select(ListingEvent.listing_id, func.count()).group_by(ListingEvent.listing_id)
+                                  .having(func.count() != 1)).all()
+            events = conn.scalar(select(func.count()).select_from(ListingEvent))
+            pending = conn.scalar(select(func.count()).select_from(SchemaVersion)
+                                  .where(SchemaVersion.applied_at.is_(None)))
+        engine.dispose()
+
+    assert pending == 0, f"{pending} migrations not applied"
+    assert wrong == 0, f"{wrong} rows with year/*_num values ingest wouldn't produce"
+    assert events == cars and not listed, f"{cars} listings, {events} events, {len(listed)} with more than one"
+    print(f"✅ {cars:,} listings migrated, normalized like ingest, one 'listed' event each")
+
+
+if __name__ == "__main__":
+    main()
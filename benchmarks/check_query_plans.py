@@ -0,0 +1,47 @@
+"""
+Check that every report query is answered from an index.
+
+Seeds a synthetic cars table and fails if EXPLAIN QUERY PLAN shows a full
+scan of the cars table for any of the report queries. The single-pass counts
+query has to visit every row, so a scan of a covering index is accepted.
+
+    python -m benchmarks.check_query_plans --rows 20000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+from benchmarks.synth_db import seed_cars
+from email_report import explain_report_queries
+
+
+def full_scans(plans):
+    return {name: lines for name, lines in plans.items()
+            if any(line.startswith("SCAN cars") and "COVERING INDEX" not in line for line in lines)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=20_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = f"sqlite:///{os.path.join(tmp, 'plans.db')}"
+        seed_cars(db_url, args.rows)
+        failed = {}
+        for only_available in (False, True):
+            plans = explain_report_queries(db_url, only_available=only_available)
+            for name, lines in plans.items():
+                print(f"{name:<15} available={only_available!s:<5} {' | '.join(lines)}")
+            failed.update(full_scans(plans))
+
+    if failed:
+        print(f"❌ Full table scans in: {', '.join(sorted(failed))}")
+        sys.exit(1)
+    print("✅ All report queries use an index")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Check that a scrape killed mid-run resumes from its checkpoint.
+
+Serves a few result pages from the fixture stand-in (benchmarks/standin.py),
+starts the streaming pipeline in a child process, SIGKILLs it once a few
+pages are checkpointed, then runs it again and verifies that the second run
+starts at the page after the checkpoint and ends with every listing saved.
+
+    python -m benchmarks.check_resume --pages 8 --kill-after 3
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from sqlalchemy import func, select
+
+from benchmarks.standin import StandIn
+from parsing import parse_cars
+
+PAGE_DELAY = 0.3  # seconds per page, so the kill lands mid-run
+
+
+def run_child(db_url):
+    from jobs import SearchSpec, run_jobs, print_job_report
+    from pipeline import PageWriter
+
+    writer = PageWriter(db_url)
+    print_job_report(run_jobs([SearchSpec("Maverick")], writer=writer))
+
+
+def spawn(db_url, base_url):
+    env = dict(os.environ, CLASIFICADOS_BASE_URL=base_url, FETCH_CONCURRENCY="1", HOST_RPS="0")
+    return subprocess.Popen([sys.executable, "-m", "benchmarks.check_resume", "--child", db_url],
+                            env=env, stdout=subprocess.DEVNULL)
+
+
+def checkpoint(db_url):
+    from db import get_session
+    from models import CarListing, ScrapeCheckpoint
+
+    with get_session(db_url) as session:
+        cp = session.scalars(select(ScrapeCheckpoint)).first()
+        cars = session.scalar(select(func.count()).select_from(CarListing))
+        return (cp.page, cp.finished) if cp else (0, False), cars
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=8)
+    parser.add_argument("--kill-after", type=int, default=3)
+    parser.add_argument("--child", metavar="DB_URL", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return run_child(args.child)
+
+    standin = StandIn(pages=args.pages, delay=PAGE_DELAY).start()
+    base_url = standin.base_url
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = f"sqlite:///{os.path.join(tmp, 'resume.db')}"
+
+        child = spawn(db_url, base_url)
+        while child.poll() is None and checkpoint(db_url)[0][0] < args.kill_after:
+            time.sleep(0.05)
+        child.kill()
+        child.wait()
+        (killed_at, finished), cars_after_kill = checkpoint(db_url)
+        print(f"💥 Killed after page {killed_at}: {cars_after_kill} listings saved, finished={finished}")
+        assert not finished and 0 < killed_at < args.pages, "child wasn't killed mid-run"
+
+        first_run = len(standin.result_pages_requested())
+        child = spawn(db_url, base_url)
+        child.wait()
+        resumed = standin.result_pages_requested()[first_run:]
+        (last_page, finished), cars = checkpoint(db_url)
+        print(f"⏯️ Second run requested pages {resumed}; checkpoint page {last_page}, "
+              f"finished={finished}, {cars} listings")
+
+    expected = len({car["link"] for page in range(1, args.pages + 1)
+                    for car in parse_cars(standin.result_page(page))})
+    standin.stop()
+    assert child.returncode == 0, "resumed run failed"
+    assert resumed[0] == killed_at + 1, f"resumed at page {resumed[0]}, expected {killed_at + 1}"
+    assert finished and last_page == args.pages, "resumed run didn't finish the search"
+    assert cars == expected, f"expected {expected} listings, found {cars}"
+    print("✅ Resumed from the checkpoint without refetching saved pages")
+
+
+if __name__ == "__main__":
+    main()
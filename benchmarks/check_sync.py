@@ -0,0 +1,118 @@
+"""
+Check that sync.py keeps a replica identical to its source.
+
+Clones a seeded database, then a few times over: upserts a scraped batch
+into the source (new listings, price changes, listing events), marks some
+listings removed, edits some prices and deletes some rows with plain SQL
+(as done by hand) and writes a report snapshot, exports a changeset against
+the replica's watermark, applies it, and compares every synced table row
+by row. Each changeset is applied twice to check that's harmless, and its
+size is printed next to the database file's.
+
+    python -m benchmarks.check_sync --rows 100k --rounds 3 --batch 2000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import create_engine, select, text, update
+
+import sync
+from benchmarks.synth_db import cached_db, make_batch, parse_size
+from db import dispose_engines, get_session
+from history import record_events, removed_event
+from models import CarListing, ReportSnapshot
+from upsert import bulk_upsert_cars
+
+
+def change_source(db_url, rows, batch, round_no):
+    rng = random.Random(round_no)
+    with get_session(db_url) as session:
+        bulk_upsert_cars(session, make_batch(rows, batch, seed=round_no + 2))
+        now = datetime.now()
+        gone = rng.sample(range(1, rows + 1), batch // 10)
+        session.execute(update(CarListing), [{"id": car_id, "still_available": False, "last_checked_at": now}
+                                             for car_id in gone])
+        record_events(session, [removed_event(car_id, now) for car_id in gone])
+        session.add(ReportSnapshot(report_date=date.today() + timedelta(days=round_no),
+                                   total_listings=rows, available_listings=rows - batch))
+        session.commit()
+        # Hand edits: updated_at and the tombstones come from the triggers
+        edited, deleted = rng.sample(range(1, rows + 1), 20), rng.sample(range(1, rows + 1), 10)
+        session.execute(text("UPDATE cars SET price = '$19,000', price_num = 19000, manual_price = 1 WHERE id = :id"),
+                        [{"id": car_id} for car_id in edited])
+        session.execute(text("DELETE FROM cars WHERE id = :id"), [{"id": car_id} for car_id in deleted])
+        session.commit()
+
+
+def table_rows(db_url):
+    engine = create_engine(db_url)
+    with engine.connect() as conn:
+        rows = {name: conn.execute(select(table).order_by(table.c.id)).all() for name, table in sync._TABLES.items()}
+    engine.dispose()
+    return rows
+
+
+def compare(source_url, replica_url):
+    source, replica = table_rows(source_url), table_rows(replica_url)
+    problems = []
+    for name in source:
+        if source[name] != replica[name]:
+            differing = sum(a != b for a, b in zip(source[name], replica[name]))
+            problems.append(f"{name}: {len(source[name]):,} vs {len(replica[name]):,} rows, {differing} differ")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", default="100k", help="1k, 100k, 1m or a number")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--batch", type=int, default=2000)
+    args = parser.parse_args()
+    rows = parse_size(args.rows)
+    # Rounds are seconds apart and a freshly seeded table was all written just
+    # now, so the production overlap would resend every row each round
+    sync.SYNC_OVERLAP = timedelta(seconds=1)
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        source_url = cached_db(rows, f"{tmp}/source.db")
+        replica_url = f"sqlite:///{tmp}/replica.db"
+        db_size = os.path.getsize(f"{tmp}/source.db")
+
+        start = time.perf_counter()
+        pages = sync.clone(source_url, replica_url)
+        problems = compare(source_url, replica_url)
+        failed |= bool(problems)
+        print(f"  clone      {pages:,} pages in {(time.perf_counter() - start) * 1000:.0f}ms  "
+              + ("; ".join(problems) or "identical"))
+
+        for round_no in range(1, args.rounds + 1):
+            change_source(source_url, rows, args.batch, round_no)
+            dispose_engines()
+            start = time.perf_counter()
+            changeset = sync.export_changes(source_url, sync.read_watermark(replica_url))
+            path = f"{tmp}/changes_{round_no}.json.gz"
+            size = sync.write_changeset(changeset, path)
+            exported = time.perf_counter() - start
+            start = time.perf_counter()
+            counts = sync.apply_changes(replica_url, sync.read_changeset(path))
+            applied = time.perf_counter() - start
+            sync.apply_changes(replica_url, sync.read_changeset(path))
+            problems = compare(source_url, replica_url)
+            failed |= bool(problems)
+            print(f"  round {round_no}    {sync._summary(counts)}  changeset {size:,} bytes "
+                  f"({size / db_size:.2%} of the db)  export {exported * 1000:.0f}ms  apply {applied * 1000:.0f}ms  "
+                  + ("; ".join(problems) or "identical"))
+
+    print("❌ replica differs" if failed else "✅ replica matches its source")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
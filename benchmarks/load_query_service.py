@@ -0,0 +1,172 @@
+"""
+Load-test query_service.py: latency percentiles under sustained requests.
+
+Starts the service in a child process on a seeded database and runs
+--clients worker processes. Each one sends requests back to back over its
+own keep-alive connection for --seconds. The mix is mostly repeated
+cheapest/aged queries (the LRU cache's case), some with varied filters,
+and per-listing history lookups that go to the database. Halfway through,
+an upsert batch lands in the database, the cheapest listings are deleted,
+and POST /refresh picks both up. After that the new listings have to show
+up and the deleted ones be gone, with the version bumped.
+
+Prints throughput and p50/p90/p99 per endpoint. For comparison it also
+times the report's cheapest-hybrids query run against the database on
+every request.
+
+    python -m benchmarks.load_query_service --rows 100k --clients 8 --seconds 10
+"""
+
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import delete
+
+from benchmarks.synth_db import cached_db, make_batch, parse_size
+from db import get_session
+from email_report import AGED_DAYS_DEFAULT, PRICE_CAP_DEFAULT, report_queries
+from models import CarListing
+from upsert import bulk_upsert_cars
+
+HOT = ("/cheapest?hybrid=1&limit=12", f"/aged?hybrid=1&cap={PRICE_CAP_DEFAULT}&days={AGED_DAYS_DEFAULT}&limit=12",
+       "/cheapest?limit=20", "/cheapest?hybrid=1&year=2024&limit=12")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def request_path(rng, rows):
+    roll = rng.random()
+    if roll < 0.6:
+        return rng.choice(HOT)
+    if roll < 0.8:
+        return (f"/cheapest?hybrid={rng.choice('01')}&year={rng.randint(2022, 2025)}"
+                f"&max_price={rng.randrange(25_000, 45_000, 1000)}&limit=12")
+    return f"/listings/{rng.randint(1, rows)}"
+
+
+def endpoint(path):
+    return "/listings/<id>" if path.startswith("/listings/") else path.split("?")[0]
+
+
+def client(port, rows, seconds, seed):
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    samples = []
+    deadline = time.perf_counter() + seconds
+    while (start := time.perf_counter()) < deadline:
+        path = request_path(rng, rows)
+        conn.request("GET", path)
+        response = conn.getresponse()
+        response.read()
+        samples.append((endpoint(path), time.perf_counter() - start, response.status))
+    conn.close()
+    return samples
+
+
+def call(port, method, path):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    conn.request(method, path)
+    response = conn.getresponse()
+    body = json.loads(response.read())
+    conn.close()
+    return response.status, body
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    return [latencies[min(int(len(latencies) * q), len(latencies) - 1)] * 1000 for q in (0.5, 0.9, 0.99)]
+
+
+def change_database(db_url, rows, batch, port, result):
+    result["deleted"] = [listing["id"] for listing in call(port, "GET", "/cheapest?limit=5")[1]["listings"]]
+    with get_session(db_url) as session, contextlib.redirect_stdout(io.StringIO()):
+        bulk_upsert_cars(session, make_batch(rows, batch, seed=7))
+        session.execute(delete(CarListing).where(CarListing.id.in_(result["deleted"])))
+        session.commit()
+    result["refresh"] = call(port, "POST", "/refresh")[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", default="100k", help="1k, 100k, 1m or a number")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--batch", type=int, default=2000, help="listings upserted halfway through")
+    args = parser.parse_args()
+    rows = parse_size(args.rows)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = cached_db(rows, os.path.join(tmp, "cars.db"))
+        port = free_port()
+        service = subprocess.Popen([sys.executable, "query_service.py", "--db-url", db_url, "--port", str(port),
+                                    "--refresh-seconds", "0"], stdout=subprocess.PIPE, text=True)
+        try:
+            for line in service.stdout:
+                print("  " + line.rstrip())
+                if "Serving" in line:
+                    break
+            before = call(port, "GET", "/stats")[1]
+
+            change = {}
+            timer = threading.Timer(args.seconds / 2, change_database, (db_url, rows, args.batch, port, change))
+            timer.start()
+            start = time.perf_counter()
+            with multiprocessing.Pool(args.clients) as pool:
+                results = pool.starmap(client, [(port, rows, args.seconds, n) for n in range(args.clients)])
+            elapsed = time.perf_counter() - start
+            timer.join()
+            after = call(port, "GET", "/stats")[1]
+            newest = call(port, "GET", "/cheapest?limit=500")[1]
+        finally:
+            service.terminate()
+            service.wait()
+
+        samples = [sample for result in results for sample in result]
+        errors = sum(status >= 500 for _, _, status in samples)
+        print(f"  {len(samples):,} requests from {args.clients} clients in {elapsed:.1f}s = "
+              f"{len(samples) / elapsed:,.0f} req/s, {errors} errors")
+        print(f"  {'endpoint':<16} {'requests':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8}")
+        for name in sorted({name for name, _, _ in samples}) + ["all"]:
+            latencies = [seconds for n, seconds, _ in samples if name in (n, "all")]
+            print(f"  {name:<16} {len(latencies):>9,} " + " ".join(f"{p:8.2f}" for p in percentiles(latencies)))
+        cache = after["cache"]
+        print(f"  cache hit rate {cache['hits'] / max(cache['hits'] + cache['misses'], 1):.1%}; "
+              f"refresh after a {args.batch:,}-listing upsert: {change['refresh']['changed']:,} changed in "
+              f"{change['refresh']['seconds'] * 1000:.0f}ms, index v{before['version']} -> v{after['version']}, "
+              f"{before['available']:,} -> {after['available']:,} available")
+        resurfaced = set(change["deleted"]) & {listing["id"] for listing in newest["listings"]}
+        print(f"  {len(change['deleted'])} cheapest listings deleted, {len(resurfaced)} still served")
+
+        sql = []
+        with get_session(db_url) as session:
+            for _ in range(200):
+                begin = time.perf_counter()
+                session.execute(report_queries(PRICE_CAP_DEFAULT, AGED_DAYS_DEFAULT)["cheapest"]).all()
+                sql.append(time.perf_counter() - begin)
+        print("  cheapest hybrids via SQL each time: p50 {:.2f}ms p90 {:.2f}ms p99 {:.2f}ms".format(
+            *percentiles(sql)))
+
+    failed = errors or after["version"] <= before["version"] or not change["refresh"]["changed"] \
+        or newest["count"] == 0 or resurfaced
+    print("❌ load test failed" if failed else "✅ query service kept up and followed the database")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Local SMTP stand-in for checking mail_spool.py without a real server.
+
+Speaks just enough SMTP for smtplib (EHLO/HELO, MAIL, RCPT, DATA, RSET,
+NOOP, QUIT), keeps every message it accepts and counts connections. Faults
+can be queued: drop_connections closes the next N connections right after
+accepting them, refuse_data answers the next N DATA commands with 451.
+`delay` is added before every reply, like a slow remote server.
+
+    with SMTPStandIn() as server:
+        mail_spool.connect(server.host, server.port, security="none")
+"""
+
+import socketserver
+import threading
+import time
+from email import message_from_bytes, policy
+
+
+class SMTPStandIn:
+    """Accepts mail on 127.0.0.1 from a daemon thread."""
+
+    def __init__(self, delay=0.0, port=0):
+        self.delay = delay
+        self.messages = []  # email.message.EmailMessage, in arrival order
+        self.connections = 0
+        self.drop_connections = 0
+        self.refuse_data = 0
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def host(self):
+        return self._server.server_address[0]
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def _take(self, fault):
+        with self._lock:
+            if getattr(self, fault) > 0:
+                setattr(self, fault, getattr(self, fault) - 1)
+                return True
+            return False
+
+    def _handler(self):
+        standin = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                if standin.delay:
+                    time.sleep(standin.delay)
+                self.wfile.write(f"{line}\r\n".encode())
+
+            def handle(self):
+                with standin._lock:
+                    standin.connections += 1
+                if standin._take("drop_connections"):
+                    return
+                self.reply("220 standin ESMTP")
+                while line := self.rfile.readline():
+                    command = line.decode("ascii", "replace").strip().split(" ", 1)[0].upper()
+                    if command == "EHLO":
+                        self.reply("250-standin\r\n250 8BITMIME")
+                    elif command in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                        self.reply("250 OK")
+                    elif command == "DATA":
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        data = []
+                        while (chunk := self.rfile.readline()) not in (b".\r\n", b""):
+                            data.append(chunk[1:] if chunk.startswith(b"..") else chunk)
+                        if standin._take("refuse_data"):
+                            self.reply("451 Try again later")
+                        else:
+                            standin.messages.append(message_from_bytes(b"".join(data), policy=policy.default))
+                            self.reply("250 Queued")
+                    elif command == "QUIT":
+                        self.reply("221 Bye")
+                        return
+                    else:
+                        self.reply("502 Command not implemented")
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,127 @@
+"""
+Local stand-in for clasificadosonline.com, built from the HTML fixtures.
+
+    /Transportation.asp?Key=...&offset=N   result pages 1..pages, then "no results"
+    /UDTransDetail.asp?AdNumber=N          an active listing, or "Anuncio no
+                                           disponible" for every removed_every-th ad
+
+Result page N reuses one of the synthetic fixture pages with its AdNumbers rewritten
+so every page lists different ads. Point the scraper at it with
+CLASIFICADOS_BASE_URL, or use detail_url() for links stored in the DB.
+
+    python -m benchmarks.standin --port 8765 --pages 20
+"""
+
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from http_fetch import PAGE_PARAM, PAGE_SIZE
+
+FIXTURES = Path(__file__).parent / "fixtures"
+NO_RESULTS = b"<html><body>No hay resultados para su busqueda</body></html>"
+
+
+class StandIn:
+    """Serves fixture pages on 127.0.0.1 from a daemon thread; records every request."""
+
+    def __init__(self, pages=10, removed_every=5, delay=0.0, port=0):
+        self.pages = pages
+        self.removed_every = removed_every
+        self.delay = delay
+        self.requests = []  # (path, query) in arrival order
+        self._results = [p.read_bytes() for p in sorted(FIXTURES.glob("results_page_*.html"))]
+        self._active = (FIXTURES / "detail_active.html").read_bytes()
+        self._removed = (FIXTURES / "detail_removed.html").read_bytes()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def detail_url(self, ad_number):
+        return f"{self.base_url}/UDTransDetail.asp?AdNumber={ad_number}"
+
+    def result_pages_requested(self):
+        return [int(q.get(PAGE_PARAM, ["0"])[0]) // PAGE_SIZE + 1
+                for path, q in self.requests if path.endswith(".asp") and "Key" in q]
+
+    def result_page(self, page):
+        if not 1 <= page <= self.pages:
+            return NO_RESULTS
+        template = self._results[(page - 1) % len(self._results)]
+        return template.replace(b"AdNumber=25", f"AdNumber={page:03d}".encode())
+
+    def detail_page(self, ad_number):
+        return self._removed if ad_number % self.removed_every == 0 else self._active
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive like the real site; headers and body are separate writes,
+            # so Nagle would otherwise stall each response on a delayed ACK
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                query = parse_qs(parts.query)
+                standin.requests.append((parts.path, query))
+                if standin.delay:
+                    time.sleep(standin.delay)
+                if parts.path == "/UDTransDetail.asp":
+                    body = standin.detail_page(int(query.get("AdNumber", ["0"])[0]))
+                else:
+                    page = int(query.get(PAGE_PARAM, ["0"])[0]) // PAGE_SIZE + 1
+                    body = standin.result_page(page)
+                try:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except ConnectionError:
+                    pass  # client went away (e.g. a killed scraper)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--removed-every", type=int, default=5)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to sleep per request")
+    args = parser.parse_args()
+
+    with StandIn(args.pages, args.removed_every, args.delay, args.port) as standin:
+        print(f"🧪 Serving fixtures on {standin.base_url} (CLASIFICADOS_BASE_URL={standin.base_url})")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Offline benchmark suite: each pipeline stage timed on its own, results as JSON.
+
+Nothing touches clasificadosonline.com or Chrome. Result-page parsing runs on
+the synthetic fixtures (benchmarks/fixtures/README.md), liveness checks hit
+the fixture stand-in (benchmarks/standin.py), and the DB stages run on
+synthetic cars tables (benchmarks/synth_db.py) at each requested size.
+
+    python -m benchmarks.suite --sizes 1k,100k            # writes benchmarks/results/<commit>.json
+    python -m benchmarks.suite --sizes 1m --runs 3
+    python -m benchmarks.suite --compare benchmarks/results/abc1234.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.standin import StandIn
+from benchmarks.synth_db import cached_db, make_batch, parse_size, seed_cars
+from db import dispose_engines
+from email_report import AGED_DAYS_DEFAULT, PRICE_CAP_DEFAULT, TodayStats, build_hybrid_tables, summarize_today
+from enrich import DetailCache
+from main import check_listing_is_active, get_cars_from_page, save_to_db
+from ratelimit import shared_limiter
+
+FIXTURES = Path(__file__).parent / "fixtures"
+RESULTS_DIR = Path(__file__).parent / "results"
+# Slower than the baseline by more than this fraction gets flagged by --compare
+REGRESSION_THRESHOLD = 0.10
+
+
+def git_commit():
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                             text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True).stdout.strip())
+        return sha, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def measure(fn, runs, setup=None):
+    """Run fn `runs` times (after setup(), untimed) with its output silenced; returns seconds per run."""
+    samples = []
+    for n in range(runs):
+        args = setup(n) if setup else ()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            fn(*args)
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def result(name, size, samples, **extra):
+    row = {
+        "name": name,
+        "size": size,
+        "runs": len(samples),
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+        "min_ms": round(min(samples) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3),
+        **extra,
+    }
+    print(f"  {name:<24} {size:>9}  {row['median_ms']:10.2f}ms median  "
+          f"({row['min_ms']:.2f}-{row['max_ms']:.2f}ms, {len(samples)} runs)")
+    return row
+
+
+def bench_parse(runs):
+    pages = [p.read_text(encoding="utf-8") for p in sorted(FIXTURES.glob("results_page_*.html"))]
+
+    def parse_all():
+        for html in pages:
+            get_cars_from_page(html, [])
+
+    return result("get_cars_from_page", len(pages), measure(parse_all, runs), unit="fixture pages")
+
+
+def bench_db_stages(rows, runs, batch, tmp):
+    db_url = cached_db(rows, os.path.join(tmp, f"cars_{rows}.db"))
+    today = TodayStats()
+    for p in sorted(FIXTURES.glob("results_page_*.html")):
+        today.add(get_cars_from_page(p.read_text(encoding="utf-8"), []))
+
+    rows_out = [
+        result("build_hybrid_tables", rows, measure(
+            lambda: build_hybrid_tables(db_url, PRICE_CAP_DEFAULT, AGED_DAYS_DEFAULT), runs)),
+        result("summarize_today", rows, measure(
+            lambda: summarize_today(today, 0, 0, 0, db_url), runs)),
+        result("save_to_db", rows, measure(
+            save_to_db, runs, setup=lambda n: (make_batch(rows, batch, seed=100 + n), db_url)),
+            batch=batch),
+    ]
+    dispose_engines()
+    return rows_out
+
+
+def bench_liveness(links, runs, tmp):
+    """check_listing_is_active over HTTP against the stand-in; every 5th listing is removed."""
+    with StandIn() as standin:
+        base = os.path.join(tmp, "liveness_base.db")
+        seed_cars(f"sqlite:///{base}", links, link_base=standin.base_url)
+        path = os.path.join(tmp, "liveness.db")
+
+        def fresh_copy(n):
+            dispose_engines()
+            with open(base, "rb") as src, open(path, "wb") as dst:
+                dst.write(src.read())
+            return f"sqlite:///{path}", None
+
+        # Enrichment is part of the check; its pages go under tmp, never the user's cache
+        cache = DetailCache(os.path.join(tmp, "detail_cache"))
+        samples = measure(lambda url, pool: check_listing_is_active(url, pool, detail_cache=cache), runs,
+                          setup=fresh_copy)
+        requests = len(standin.requests) // runs
+    dispose_engines()
+    return result("check_listing_is_active", links, samples, http_requests=requests)
+
+
+def compare(current, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    before = {(r["name"], r["size"]): r["median_ms"] for r in baseline["results"]}
+    print(f"📊 vs {baseline['commit']} ({baseline['created_at']}):")
+    regressions = 0
+    for r in current["results"]:
+        old = before.get((r["name"], r["size"]))
+        if old is None:
+            continue
+        change = r["median_ms"] / old - 1 if old else 0.0
+        flag = "⚠️ slower" if change > REGRESSION_THRESHOLD else ""
+        regressions += bool(flag)
+        print(f"  {r['name']:<24} {r['size']:>9}  {old:10.2f}ms -> {r['median_ms']:10.2f}ms  "
+              f"{change:+7.1%} {flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1k,100k", help="cars table sizes: 1k, 100k, 1m or numbers")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=500, help="cars per save_to_db call")
+    parser.add_argument("--liveness-links", type=int, default=500)
+    parser.add_argument("--rps", type=float, default=0, help="per-host rate limit for the liveness run (0 = off)")
+    parser.add_argument("--out", help="JSON file to write (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", metavar="BASELINE_JSON", help="flag stages >10%% slower than this run")
+    args = parser.parse_args()
+
+    shared_limiter().rps = args.rps
+    commit, dirty = git_commit()
+    report = {
+        "commit": commit + ("-dirty" if dirty else ""),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "args": vars(args),
+        "results": [],
+    }
+
+    print("🏁 Offline benchmark suite")
+    report["results"].append(bench_parse(args.runs))
+    with tempfile.TemporaryDirectory() as tmp:
+        report["results"].append(bench_liveness(args.liveness_links, args.runs, tmp))
+        for size in args.sizes.split(","):
+            report["results"].extend(bench_db_stages(parse_size(size), args.runs, args.batch, tmp))
+
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{report['commit']}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print(f"💾 Wrote {out}")
+
+    if args.compare and compare(report, args.compare):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Synthetic cars tables for benchmarks.
+
+Rows look like scraped Maverick listings: a 40/60 hybrid split, 2022-2025
+model years, prices and mileages in the site's string format with their
+*_num columns filled, dates spread over the last year, ~70% still available.
+Generated databases are cached by row count and schema, so a 1M-row table is
+only built once per schema change.
+
+    python -m benchmarks.synth_db --rows 1000000 cars_1m.db
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import shutil
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, insert
+
+from models import Base, CarListing
+from normalize import numeric_columns
+
+SITE_URL = "https://www.clasificadosonline.com"
+CACHE_DIR = os.environ.get(
+    "BENCH_CACHE_DIR", os.path.expanduser("~/.cache/clasificados-scraper/bench"))
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+
+def parse_size(text):
+    """'1k', '100k', '1m' or a plain number."""
+    return SIZES.get(text.lower()) or int(text.replace("_", ""))
+
+
+def listing_link(ad_number, link_base=SITE_URL):
+    return f"{link_base}/UDTransDetail.asp?AdNumber={ad_number}"
+
+
+def seed_cars(db_url, rows, seed=1, link_base=SITE_URL):
+    rng = random.Random(seed)
+    engine = create_engine(db_url)
+    Base.metadata.create_all(engine)
+    today = date.today()
+    with engine.begin() as conn:
+        batch = []
+        for i in range(rows):
+            year = rng.choice(["2022", "2023", "2024", "2025"])
+            hybrid = rng.random() < 0.4
+            mileage = f"{rng.randint(1, 60) * 1000:,}"
+            price = f"${rng.randint(22, 42) * 1000:,}"
+            batch.append({
+                **numeric_columns(price, mileage, year),
+                "listing": f"Ford Maverick {'Hybrid ' if hybrid else ''}XLT {year} #{i}",
+                "link": listing_link(i, link_base),
+                "mileage": mileage,
+                "price": price,
+                "is_hybrid": hybrid,
+                "year": year,
+                "date_found": today - timedelta(days=rng.randint(0, 365)),
+                "still_available": rng.random() < 0.7,
+                "manual_price": rng.random() < 0.02,
+            })
+            if len(batch) == 5000:
+                conn.execute(insert(CarListing), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(CarListing), batch)
+    engine.dispose()
+
+
+def make_batch(rows, size, seed=2, link_base=SITE_URL):
+    """A scraped batch against a seeded table: half refreshes of existing links, half new listings."""
+    rng = random.Random(seed)
+    cars = []
+    for n in range(size):
+        i = rng.randrange(rows) if n % 2 else rows + seed * size + n
+        cars.append({
+            "listing": f"Ford Maverick XLT 2024 #{i}",
+            "link": listing_link(i, link_base),
+            "mileage": f"{rng.randint(1, 60) * 1000:,}",
+            "price": rng.choice(["", f"${rng.randint(22, 42) * 1000:,}"]),
+            "is_hybrid": rng.random() < 0.4,
+            "year": "2024",
+        })
+    return cars
+
+
+def schema_fingerprint():
+    columns = sorted(f"{t.name}.{c.name}:{c.type}" for t in Base.metadata.sorted_tables for c in t.columns)
+    return hashlib.sha1("\n".join(columns).encode()).hexdigest()[:10]
+
+
+def cached_db(rows, dest, seed=1, cache_dir=CACHE_DIR):
+    """Copy a seeded database with `rows` rows to dest, generating and caching it first if needed."""
+    os.makedirs(cache_dir, exist_ok=True)
+    cached = os.path.join(cache_dir, f"cars_{rows}_s{seed}_{schema_fingerprint()}.db")
+    if not os.path.exists(cached):
+        start = time.perf_counter()
+        tmp = cached + ".tmp"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        seed_cars(f"sqlite:///{tmp}", rows, seed)
+        os.replace(tmp, cached)
+        print(f"🌱 Generated {rows:,} rows in {time.perf_counter() - start:.1f}s ({cached})")
+    shutil.copy(cached, dest)
+    return f"sqlite:///{dest}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", default="100k", help="1k, 100k, 1m or a number")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("path", help="SQLite file to write")
+    args = parser.parse_args()
+
+    db_url = cached_db(parse_size(args.rows), args.path, args.seed)
+    print(f"✅ {db_url}")
+
+
+if __name__ == "__main__":
+    main()
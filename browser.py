@@ -0,0 +1,274 @@
+"""
+Selenium side of the scraper: stealth Chrome setup, a small pool of reusable
+drivers, and the search-form flow that clicks through result pages.
+
+selenium and undetected_chromedriver are only imported once a driver is
+actually needed, so importing this module (or building a DriverPool) is cheap.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from http_fetch import BASE_URL, RESULTS_MARKER, USER_AGENT
+from metrics import METRICS
+from ratelimit import CLOCK, shared_limiter
+
+HEADLESS = True
+# Where the resolved chromedriver path is remembered between runs
+CHROMEDRIVER_CACHE = os.environ.get(
+    "CHROMEDRIVER_CACHE", os.path.expanduser("~/.cache/clasificados-scraper/chromedriver.json"))
+CHROMEDRIVER_CACHE_DAYS = 7
+NEXT_PAGE_XPATH = '/html/body/table/tbody/tr/td/table[3]/tbody/tr[1]/td[2]/form[2]/div/table[1]/tbody/tr/td[3]/a'
+
+
+# ---- Enhanced Selenium setup for headless stealth ----
+def create_chrome_options():
+    """Create fresh Chrome options for each initialization attempt"""
+    import undetected_chromedriver as uc
+
+    chrome_opts = uc.ChromeOptions()
+
+    # Basic headless configuration
+    if HEADLESS:
+        chrome_opts.add_argument("--headless=new")
+
+    # Essential anti-detection options
+    chrome_opts.add_argument("--no-sandbox")
+    chrome_opts.add_argument("--disable-dev-shm-usage")
+    chrome_opts.add_argument("--disable-blink-features=AutomationControlled")
+    chrome_opts.add_argument("--window-size=1920,1080")
+
+    # User agent
+    chrome_opts.add_argument(f"--user-agent={USER_AGENT}")
+
+    return chrome_opts
+
+
+def resolve_chromedriver_path(use_cache=True):
+    """
+    Path to a chromedriver binary. ChromeDriverManager().install() can hit the
+    network, so its answer is cached on disk for CHROMEDRIVER_CACHE_DAYS.
+    """
+    if use_cache:
+        try:
+            with open(CHROMEDRIVER_CACHE) as f:
+                cached = json.load(f)
+            fresh = time.time() - cached["resolved_at"] < CHROMEDRIVER_CACHE_DAYS * 86400
+            if fresh and os.path.exists(cached["path"]):
+                return cached["path"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    from webdriver_manager.chrome import ChromeDriverManager
+
+    path = ChromeDriverManager().install()
+    try:
+        os.makedirs(os.path.dirname(CHROMEDRIVER_CACHE), exist_ok=True)
+        with open(CHROMEDRIVER_CACHE, "w") as f:
+            json.dump({"path": path, "resolved_at": time.time()}, f)
+    except OSError as e:
+        print(f"Warning: Could not cache ChromeDriver path: {e}")
+    return path
+
+
+def create_driver(max_retries=3):
+    """Initialize Chrome driver with automatic version management"""
+    import undetected_chromedriver as uc
+
+    driver = None
+    for attempt in range(max_retries):
+        try:
+            print(f"🔧 Attempt {attempt + 1}: Initializing Chrome driver...")
+
+            # Cached path on the first try; a failed start re-resolves it
+            chrome_driver_path = resolve_chromedriver_path(use_cache=attempt == 0)
+            print(f"📍 Using ChromeDriver: {chrome_driver_path}")
+
+            # Initialize with webdriver-manager path and fresh options for this attempt
+            driver = uc.Chrome(options=create_chrome_options(), driver_executable_path=chrome_driver_path)
+            print("✅ Chrome driver initialized successfully with webdriver-manager")
+            break
+
+        except Exception as e:
+            print(f"❌ Attempt {attempt + 1} failed: {e}")
+            if attempt < max_retries - 1:
+                print("🔄 Retrying with fresh options...")
+                time.sleep(2)
+            else:
+                raise RuntimeError("💥 All attempts to start Chrome failed") from e
+
+    # Additional stealth measures after driver creation
+    try:
+        driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+        driver.execute_cdp_cmd('Network.setUserAgentOverride', {"userAgent": USER_AGENT})
+        print("✅ Additional stealth measures applied")
+    except Exception as e:
+        print(f"Warning: Could not set additional stealth measures: {e}")
+
+    driver.set_page_load_timeout(45)
+    return driver
+
+
+_SLOT_FREED = object()
+
+
+class DriverPool:
+    """
+    Up to `size` Chrome drivers, started on first use and handed back to the
+    pool after each job so later jobs skip the Chrome startup.
+    """
+
+    def __init__(self, size=1, factory=create_driver):
+        self.size = size
+        self._factory = factory
+        self._idle = queue.Queue()
+        self._all = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def driver(self):
+        driver = self._acquire()
+        try:
+            yield driver
+        finally:
+            self._idle.put(driver)
+
+    def _acquire(self):
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    start_new = len(self._all) < self.size
+                    if start_new:
+                        self._all.append(None)  # reserve the slot while Chrome starts
+                if start_new:
+                    return self._start()
+                driver = self._idle.get()
+            if driver is not _SLOT_FREED:
+                return driver
+
+    def _start(self):
+        try:
+            with METRICS.span("driver_start"):
+                driver = self._factory()
+        except Exception:
+            with self._lock:
+                self._all.remove(None)
+            # Wake a job waiting on the reserved slot so it can try to start Chrome itself
+            self._idle.put(_SLOT_FREED)
+            raise
+        with self._lock:
+            self._all[self._all.index(None)] = driver
+        return driver
+
+    @property
+    def started(self):
+        return sum(d is not None for d in self._all)
+
+    def close(self):
+        for driver in self._all:
+            try:
+                if driver is not None:
+                    driver.quit()
+            except Exception:
+                pass
+        if self._all:
+            print("🔚 Browser closed")
+        self._all = []
+
+
+def _fill_filters(filters, until):
+    """Set each search-form field named in filters; a field the form doesn't have raises."""
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as ec
+    from selenium.webdriver.support.ui import Select
+
+    for name, value in filters.items():
+        try:
+            field = until(ec.presence_of_element_located((By.NAME, name)))
+        except TimeoutException:
+            raise ValueError(f"the search form has no {name!r} field for filter {name}={value!r}") from None
+        if field.tag_name.lower() == "select":
+            Select(field).select_by_value(str(value))
+        else:
+            field.clear()
+            field.send_keys(str(value))
+
+
+def iter_selenium_pages(driver, term, start_page=1, limiter=None, timeout=20, url=None, filters=None):
+    """
+    Drive the search form at url (default Transportation.asp) and yield
+    (page_number, html) for each result page.
+
+    filters are form field name -> value, the same names the HTTP path sends
+    as query parameters; a filter the form has no field for raises ValueError.
+
+    Every navigation waits for the host's rate limit token, then only as long
+    as it takes for the results table to show up. Pages before start_page are
+    clicked through but not yielded. Pagination ends when there's no next
+    link; a page that doesn't load raises TimeoutException.
+    """
+    from selenium.common import ElementNotInteractableException
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as ec
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    limiter = limiter or shared_limiter()
+    wait = WebDriverWait(driver, timeout)
+    results = (By.CLASS_NAME, RESULTS_MARKER)
+
+    def until(condition):
+        with CLOCK.timing("page load"), METRICS.timer("page_load_seconds", via="selenium"):
+            return wait.until(condition)
+
+    print("🌐 Navigating to Clasificados Online...")
+    url = url or f"{BASE_URL}/Transportation.asp"
+    limiter.wait(url)
+    driver.get(url)
+
+    search_field = until(ec.element_to_be_clickable((By.XPATH, '//*[@id="Key"]')))
+    print(f"🔍 Searching for '{term}'...")
+    search_field.send_keys(term)
+    if filters:
+        _fill_filters(filters, until)
+
+    search_button = until(ec.element_to_be_clickable((By.NAME, 'Submit2')))
+    limiter.wait(url)
+    search_button.click()
+    first_row = until(ec.presence_of_element_located(results))
+
+    page_count = 1
+    if start_page <= 1:
+        yield page_count, driver.page_source
+
+    while True:
+        # No visible next link is the last page; don't sit through the timeout waiting for one
+        if not any(link.is_displayed() for link in driver.find_elements(By.XPATH, NEXT_PAGE_XPATH)):
+            print("📄 Reached last page")
+            break
+        try:
+            next_button = until(ec.element_to_be_clickable((By.XPATH, NEXT_PAGE_XPATH)))
+            driver.execute_script("arguments[0].scrollIntoView(true);", next_button)
+
+            limiter.wait(url)
+            next_button.click()
+
+            # The old rows go stale once the next page replaces them
+            until(ec.staleness_of(first_row))
+            first_row = until(ec.presence_of_element_located(results))
+        except ElementNotInteractableException:
+            print("📄 Reached last page")
+            break
+        except TimeoutException as e:
+            # Ending quietly here would pass a truncated search off as a full sweep
+            raise TimeoutException(f"timed out loading page {page_count + 1} of the results") from e
+        page_count += 1
+        if page_count >= start_page:
+            yield page_count, driver.page_source
@@ -0,0 +1,74 @@
+"""
+One SQLAlchemy engine per database URL for the whole process.
+
+    from db import get_session
+    with get_session(db_url) as session:
+        ...
+
+The first get_engine() call for a URL builds the engine and runs
+create_all; later calls reuse the same engine and its connection pool.
+SQLite connections get the pragmas below as they're opened; other backends
+(e.g. a postgresql:// URL) are used as-is.
+"""
+
+import os
+import threading
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from models import Base
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    # Negative means KiB rather than pages: 64 MiB of page cache per connection
+    "cache_size": int(os.environ.get("SQLITE_CACHE_SIZE", "-65536")),
+    "temp_store": "MEMORY",
+}
+
+_lock = threading.Lock()
+_engines = {}
+_sessionmakers = {}
+_schema_ready = set()
+
+
+def _set_sqlite_pragmas(dbapi_conn, _record):
+    cursor = dbapi_conn.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def get_engine(db_url, create_tables=True):
+    """The shared engine for db_url; tables are created on first use unless create_tables is False."""
+    with _lock:
+        engine = _engines.get(db_url)
+        if engine is None:
+            if db_url.startswith("sqlite"):
+                engine = create_engine(db_url)
+                event.listen(engine, "connect", _set_sqlite_pragmas)
+            else:
+                engine = create_engine(db_url, pool_pre_ping=True)
+            _engines[db_url] = engine
+            _sessionmakers[db_url] = sessionmaker(bind=engine)
+        if create_tables and db_url not in _schema_ready:
+            Base.metadata.create_all(engine)
+            _schema_ready.add(db_url)
+    return engine
+
+
+def get_session(db_url):
+    """A new Session bound to the shared engine for db_url."""
+    get_engine(db_url)
+    return _sessionmakers[db_url]()
+
+
+def dispose_engines():
+    """Close every pooled connection (e.g. before copying or deleting the DB file)."""
+    with _lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+        _sessionmakers.clear()
+        _schema_ready.clear()
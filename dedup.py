@@ -0,0 +1,256 @@
+"""
+Repost detection: group listings of the same truck under one vehicle_id.
+
+Dealers repost the same truck under a new link, which resets its days
+listed and hides long-sitting inventory. Comparing every pair of listings
+would be O(n²), so candidates come from blocking instead:
+
+- same VIN (from the detail page, see enrich.py) is always the same truck
+- otherwise only listings with the same model year and hybrid flag and
+  mileage within MILEAGE_TOLERANCE are compared (sorted by mileage, so each
+  listing sees a small window of neighbours), and a later listing is a
+  repost of an earlier one when its mileage is the same or a little higher,
+  its price the same or up to PRICE_TOLERANCE lower and their title tokens
+  overlap by TITLE_SIMILARITY; a known trim, VIN or detail-page year that
+  differs rules it out
+
+A repost takes the vehicle_id of the earlier listing it matches best, so a
+vehicle_id is the cars.id of the truck's first listing and never changes
+as reposts join. Each run only looks at listings without a vehicle_id yet:
+they're compared with each other in memory and with stored listings through
+the (year_num, mileage_num) and vin indexes.
+
+    python dedup.py            # assign vehicle ids to new listings
+    python dedup.py --full     # recompute every vehicle id
+"""
+
+import argparse
+import os
+import re
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, timedelta
+from functools import lru_cache
+
+from sqlalchemy import bindparam, func, select, update
+
+from db import get_session
+from models import CarListing
+
+DB_URL = os.environ.get("DB_URL", "sqlite:///mavericks.db")
+MILEAGE_TOLERANCE = 100  # reposts show the same odometer reading, give or take a test drive
+PRICE_TOLERANCE = 0.10  # reposts often come back a bit cheaper...
+PRICE_SLACK = 500  # ...and hardly ever dearer
+TITLE_SIMILARITY = 0.6
+MAX_WINDOW = 50  # neighbours compared per listing within a block
+UPDATE_CHUNK = 500
+# Words every tracked title has (hybrid is already part of the block), so they say nothing about which truck it is
+TITLE_STOPWORDS = {"ford", "maverick", "hybrid", "hibrido", "de", "del", "en", "con", "y", "la", "el",
+                   "for", "sale", "venta"}
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_YEARISH = re.compile(r"^(19|20)\d\d$")
+
+
+@dataclass
+class Listing:
+    id: int
+    vehicle_id: int | None
+    listing: str
+    is_hybrid: bool
+    year_num: int | None
+    mileage_num: int | None
+    price_num: int | None
+    vin: str | None
+    trim: str | None
+    detail_year: int | None
+    date_found: date | None
+    tokens: frozenset = frozenset()
+
+
+_COLUMNS = (CarListing.id, CarListing.vehicle_id, CarListing.listing, CarListing.is_hybrid,
+            CarListing.year_num, CarListing.mileage_num, CarListing.price_num, CarListing.vin,
+            CarListing.trim, CarListing.detail_year, CarListing.date_found)
+
+
+@lru_cache(maxsize=65536)  # dealers reuse titles a lot
+def title_tokens(title):
+    text = unicodedata.normalize("NFKD", title or "").encode("ascii", "ignore").decode().lower()
+    return frozenset(t for t in _TOKEN.findall(text)
+                     if len(t) > 1 and t not in TITLE_STOPWORDS and not _YEARISH.match(t))
+
+
+def _load(rows):
+    listings = [Listing(*row) for row in rows]
+    for listing in listings:
+        listing.tokens = title_tokens(listing.listing)
+    return listings
+
+
+def _differs(a, b):
+    return a is not None and b is not None and a != b
+
+
+def is_repost(a, earlier):
+    """Whether listing a looks like a repost of the earlier listing."""
+    b = earlier
+    if a.vin and b.vin:
+        return a.vin == b.vin
+    if a.is_hybrid != b.is_hybrid or a.year_num != b.year_num:
+        return False
+    # The odometer only goes up between posts
+    if a.mileage_num is None or b.mileage_num is None or not 0 <= a.mileage_num - b.mileage_num <= MILEAGE_TOLERANCE:
+        return False
+    if _differs(a.detail_year, b.detail_year) or _differs(a.trim and a.trim.lower(), b.trim and b.trim.lower()):
+        return False
+    # Reposts come back at the same price or cheaper
+    if a.price_num and b.price_num and not -PRICE_TOLERANCE * b.price_num <= a.price_num - b.price_num <= PRICE_SLACK:
+        return False
+    union = a.tokens | b.tokens
+    return not union or len(a.tokens & b.tokens) / len(union) >= TITLE_SIMILARITY
+
+
+def _order(listing):
+    return listing.date_found or date.min, listing.id
+
+
+def _match_key(listing, other):
+    """Lower is a better match: same VIN, then closest mileage, most similar title, closest price."""
+    union = listing.tokens | other.tokens
+    similarity = len(listing.tokens & other.tokens) / len(union) if union else 1.0
+    return (not (listing.vin and listing.vin == other.vin),
+            abs((listing.mileage_num or 0) - (other.mileage_num or 0)),
+            -similarity,
+            abs((listing.price_num or 0) - (other.price_num or 0)))
+
+
+def _neighbours(listings):
+    """id -> candidates among listings: same VIN, or mileage neighbours in the same block."""
+    near = defaultdict(list)
+    by_vin = defaultdict(list)
+    for listing in listings:
+        if listing.vin:
+            by_vin[listing.vin].append(listing)
+    for group in by_vin.values():
+        for listing in group:
+            near[listing.id].extend(other for other in group if other is not listing)
+
+    blocks = defaultdict(list)
+    for listing in listings:
+        if listing.mileage_num is not None:
+            blocks[listing.year_num, listing.is_hybrid].append(listing)
+    for block in blocks.values():
+        block.sort(key=lambda listing: listing.mileage_num)
+        for i, a in enumerate(block):
+            for b in block[i + 1:i + 1 + MAX_WINDOW]:
+                if b.mileage_num - a.mileage_num > MILEAGE_TOLERANCE:
+                    break
+                near[a.id].append(b)
+                near[b.id].append(a)
+    return near
+
+
+def _stored_candidates(session, listing):
+    """Listings from earlier runs (they have a vehicle_id) that could be the same truck, closest first."""
+    # "+ 0" keeps SQLite on the vin / (year_num, mileage_num) index instead of the far less selective vehicle_id one
+    assigned = (CarListing.vehicle_id + 0).is_not(None)
+    queries = []
+    if listing.vin:
+        queries.append(select(*_COLUMNS).where(CarListing.vin == listing.vin, assigned)
+                       .order_by(CarListing.date_found, CarListing.id))
+    if listing.mileage_num is not None and listing.year_num is not None:
+        queries.append(select(*_COLUMNS).where(
+            CarListing.year_num == listing.year_num,
+            CarListing.mileage_num.between(listing.mileage_num - MILEAGE_TOLERANCE,
+                                           listing.mileage_num + MILEAGE_TOLERANCE),
+            CarListing.is_hybrid == listing.is_hybrid, assigned)
+            .order_by(func.abs(CarListing.mileage_num - listing.mileage_num), CarListing.id))
+    for query in queries:
+        yield from _load(session.execute(query.limit(MAX_WINDOW)))
+
+
+def assign_vehicle_ids(session, full=False):
+    """
+    Give every listing without a vehicle_id one (full=True: every listing).
+    A repost takes the vehicle_id of the best matching earlier listing;
+    anything else starts a vehicle of its own. Linking each listing to one
+    match only (not every listing it resembles) keeps look-alike trucks
+    from chaining into one big cluster. Commits; returns (listings
+    assigned, of which reposts).
+    """
+    if full:
+        session.execute(update(CarListing).values(vehicle_id=None))
+    new = _load(session.execute(select(*_COLUMNS).where(CarListing.vehicle_id.is_(None))))
+    if not new:
+        return 0, 0
+
+    near = _neighbours(new)
+    any_stored = session.scalar(select(CarListing.id).where(CarListing.vehicle_id.is_not(None)).limit(1))
+    vehicle = {}
+    reposts = 0
+    # Oldest first, so an in-memory match already has its vehicle
+    for listing in sorted(new, key=_order):
+        candidates = near.get(listing.id, [])
+        if any_stored is not None:
+            candidates = [*candidates, *_stored_candidates(session, listing)]
+        matches = [other for other in candidates
+                   if _order(other) < _order(listing) and is_repost(listing, other)]
+        if matches:
+            match = min(matches, key=lambda other: _match_key(listing, other))
+            vehicle[listing.id] = vehicle.get(match.id) or match.vehicle_id
+            reposts += 1
+        else:
+            vehicle[listing.id] = listing.id
+
+    rows = [{"car_id": car_id, "vehicle": vehicle_id} for car_id, vehicle_id in vehicle.items()]
+    # Core executemany: the ORM's bulk-update-by-PK bookkeeping costs more than the UPDATEs here
+    stmt = (update(CarListing.__table__).where(CarListing.__table__.c.id == bindparam("car_id"))
+            .values(vehicle_id=bindparam("vehicle")))
+    for i in range(0, len(rows), UPDATE_CHUNK):
+        session.connection().execute(stmt, rows[i:i + UPDATE_CHUNK])
+    session.commit()
+    return len(rows), reposts
+
+
+def reposted_vehicles(session, aged_days, limit=12):
+    """
+    (vehicle count, listing count, rows) for vehicles listed more than once;
+    rows are available hybrids whose vehicle was first seen aged_days or
+    more ago even though the current listing is newer, oldest first.
+    """
+    vehicles = (
+        select(CarListing.vehicle_id, func.min(CarListing.date_found).label("first_seen"),
+               func.count().label("listings"))
+        .where(CarListing.vehicle_id.is_not(None))
+        .group_by(CarListing.vehicle_id)
+        .having(func.count() > 1)
+        .subquery()
+    )
+    n_vehicles, n_listings = session.execute(
+        select(func.count(), func.coalesce(func.sum(vehicles.c.listings), 0))).one()
+    cutoff = date.today() - timedelta(days=aged_days)
+    rows = session.execute(
+        select(CarListing.listing, CarListing.price, CarListing.mileage, vehicles.c.first_seen,
+               vehicles.c.listings, CarListing.link)
+        .join(vehicles, vehicles.c.vehicle_id == CarListing.vehicle_id)
+        .where(CarListing.still_available.is_(True), CarListing.is_hybrid.is_(True),
+               CarListing.date_found > cutoff, vehicles.c.first_seen <= cutoff)
+        .order_by(vehicles.c.first_seen)
+        .limit(limit)).all()
+    return n_vehicles, n_listings, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db-url", default=DB_URL)
+    parser.add_argument("--full", action="store_true", help="recompute every listing's vehicle_id")
+    args = parser.parse_args()
+
+    with get_session(args.db_url) as session:
+        assigned, reposts = assign_vehicle_ids(session, full=args.full)
+    print(f"🔁 Assigned vehicle ids to {assigned} listings ({reposts} reposts)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,126 +1,291 @@
 import os
-import smtplib
-import ssl
-import re
-import pandas as pd
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from datetime import date
+from datetime import date, datetime, timedelta
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, select, func, text
-from sqlalchemy.orm import Session, sessionmaker
-from models import CarListing
+from sqlalchemy import select, func, text, case, and_
+from db import get_engine, get_session
+from models import CarListing, ReportSnapshot
+from normalize import parse_price
+from recheck import availability_staleness
+from dedup import reposted_vehicles
+from history import price_drops_query
+from report_render import ReportWriter, Template, stream
 
 load_dotenv()
 
-GMAIL_APP_PASSWORD = os.environ.get("GMAIL_APP_PASSWORD")
-MY_EMAIL = os.environ.get("MY_EMAIL")
 DB_URL = os.environ.get("DB_URL", "sqlite:///mavericks.db")
 PRICE_CAP_DEFAULT = 30000
 AGED_DAYS_DEFAULT = 14
 
 def get_total_in_db(db_url: str, only_available: bool = False) -> int:
-    engine = create_engine(db_url)
-    with Session(engine) as session:
+    with get_session(db_url) as session:
         stmt = select(func.count()).select_from(CarListing)
         if only_available:
             stmt = stmt.where(CarListing.still_available.is_(True))
         return session.scalar(stmt) or 0
 
 
-def _to_int_price(p: str | None):
-    if not isinstance(p, str): return pd.NA
-    s = p.lower()
-    # treat “a negociar / call / preguntar” as NA
-    if any(k in s for k in ("negoci", "call", "preguntar", "llamar")):
-        return pd.NA
-    digits = re.sub(r"[^\d]", "", s)
-    return int(digits) if digits else pd.NA
+def listing_columns():
+    """The report tables' columns; listing_rows() turns their rows into LISTING_ROW's."""
+    return (CarListing.listing, CarListing.year, CarListing.price, CarListing.mileage, CarListing.date_found,
+            CarListing.link)
 
 
-def _to_int_miles(m: str | None):
-    if not isinstance(m, str): return pd.NA
-    digits = re.sub(r"[^\d]", "", m)
-    return int(digits) if digits else pd.NA
+def listing_rows(rows, today=None):
+    """LISTING_ROW tuples for rows of listing_columns(), with days_listed counted here so any database will do."""
+    today = today or date.today()
+    for listing, year, price, mileage, found, link in rows:
+        yield listing, year, price, mileage, (today - found).days if found else None, link
 
 
-def _extract_year(text: str | None):
-    if not isinstance(text, str): return pd.NA
-    m = re.search(r"\b(20[12]\d)\b", text)
-    return int(m.group(1)) if m else pd.NA
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
 
 
-def _df_to_rows_html(df: pd.DataFrame, cols: list[str], limit: int = 12) -> str:
-    rows = []
-    for _, r in df[cols].head(limit).iterrows():
-        cells = []
-        for c in cols:
-            val = "" if pd.isna(r[c]) else r[c]
-            if c == "link" and val:
-                val = f"<a href='{val}'>link</a>"
-            cells.append(f"<td>{val}</td>")
-        rows.append(f"<tr>{''.join(cells)}</tr>")
-    return "\n".join(rows)
+def report_queries(price_cap, aged_days, limit=12, only_available=False):
+    """
+    The statements behind the report. They filter on the integer price_num
+    column and on date_found directly ("found on or before the cutoff" ==
+    "listed for >= aged_days") so SQLite can answer them from the
+    (is_hybrid, still_available, price_num) and (is_hybrid, date_found, ...)
+    indexes. All the counts come from one conditional-aggregation pass.
+    """
+    hybrid = CarListing.is_hybrid.is_(True)
+    if only_available:
+        hybrid = and_(hybrid, CarListing.still_available.is_(True))
+    aged_cutoff = date.today() - timedelta(days=aged_days)
+    aged = CarListing.date_found <= aged_cutoff
+    columns = listing_columns()
+
+    return {
+        "cheapest": select(*columns).where(hybrid, CarListing.price_num.is_not(None))
+                    .order_by(CarListing.price_num.asc()).limit(limit),
+        "aged": select(*columns).where(hybrid, aged, CarListing.price_num <= price_cap)
+                .order_by(CarListing.date_found.asc()).limit(limit),
+        "counts": select(
+            func.count().label("total_listings"),
+            _count_if(CarListing.still_available.is_(True)).label("available_listings"),
+            _count_if(hybrid).label("hybrids_total"),
+            _count_if(and_(hybrid, aged)).label("aged_hybrids"),
+            _count_if(and_(hybrid, aged, CarListing.price_num <= price_cap)).label("aged_under_cap"),
+        ).select_from(CarListing),
+    }
+
+
+def explain_report_queries(db_url, price_cap=PRICE_CAP_DEFAULT, aged_days=AGED_DAYS_DEFAULT,
+                           only_available=False) -> dict[str, list[str]]:
+    """EXPLAIN QUERY PLAN detail lines for each report query (SQLite only)."""
+    engine = get_engine(db_url)
+    plans = {}
+    with engine.connect() as conn:
+        for name, stmt in report_queries(price_cap, aged_days, only_available=only_available).items():
+            sql = stmt.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+            plans[name] = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+    return plans
+
+
+_LISTING_HEAD = f"  {'Listing':<44} {'Year':>7} {'Price':>10} {'Mileage':>10} {'Days':>5}  Link\n"
+
+LISTING_TABLE = Template("""
+    <h3>{title}</h3>
+    <table border="1" cellpadding="6" cellspacing="0">
+      <tr><th>Listing</th><th>Year</th><th>Price</th><th>Mileage</th><th>Days</th><th>Link</th></tr>
+      """, "\n{title}\n" + _LISTING_HEAD)
+LISTING_ROW = Template(
+    "<tr><td>{listing}</td><td>{year}</td><td>{price}</td><td>{mileage}</td><td>{days_listed}</td>"
+    "<td><a href='{link!u}'>link</a></td></tr>",
+    "  {listing:<44.44} {year:>7.7} {price:>10.10} {mileage:>10.10} {days_listed:>5}  {link}\n",
+    columns=("listing", "year", "price", "mileage", "days_listed", "link"))
+TABLE_END = Template("""
+    </table>
+    """)
+
+
+def _hybrid_tables(session, price_cap, aged_days, limit=12, only_available=False):
+    queries = report_queries(price_cap, aged_days, limit, only_available)
+    hybrids_rows_html = "".join(map(LISTING_ROW.html, listing_rows(session.execute(queries["cheapest"]))))
+    aged_rows_html = "".join(map(LISTING_ROW.html, listing_rows(session.execute(queries["aged"]))))
+    counts = dict(session.execute(queries["counts"]).one()._mapping)
+    return hybrids_rows_html, aged_rows_html, counts
 
 
 def build_hybrid_tables(db_url, price_cap, aged_days, limit=12, only_available=False):
-    engine = create_engine(db_url)
-    Session = sessionmaker(bind=engine)
-    with Session() as session:
-        from sqlalchemy import func
-        
-        base = select(CarListing).where(CarListing.is_hybrid.is_(True))
-        if only_available:
-            base = base.where(CarListing.still_available.is_(True))
-
-        cheapest = base.order_by(CarListing.price.asc()).limit(limit)
-        
-        # Calculate days using SQL date functions
-        days_sql = func.julianday('now') - func.julianday(CarListing.date_found)
-        aged = base.where(
-            CarListing.price <= price_cap,
-            days_sql >= aged_days
-        ).order_by(days_sql.desc()).limit(limit)
-
-        cheapest_rows = session.scalars(cheapest).all()
-        aged_rows = session.scalars(aged).all()
-
-        # counts aligned to availability
-        counts = {
-            "hybrids_total": session.scalar(
-                select(func.count()).select_from(CarListing).where(
-                    CarListing.is_hybrid.is_(True),
-                    *( [CarListing.still_available.is_(True)] if only_available else [] )
-                )
-            ) or 0,
-            "aged_hybrids": session.scalar(
-                select(func.count()).select_from(CarListing).where(
-                    CarListing.is_hybrid.is_(True),
-                    days_sql >= aged_days,
-                    *( [CarListing.still_available.is_(True)] if only_available else [] )
-                )
-            ) or 0,
-            "aged_under_cap": session.scalar(
-                select(func.count()).select_from(CarListing).where(
-                    CarListing.is_hybrid.is_(True),
-                    days_sql >= aged_days,
-                    CarListing.price <= price_cap,
-                    *( [CarListing.still_available.is_(True)] if only_available else [] )
-                )
-            ) or 0,
-        }
-
-        # render your HTML rows (example)
-        def row_html(c: CarListing) -> str:
-            return (
-                f"<tr><td>{c.listing}</td><td>{c.year}</td><td>{c.price}</td>"
-                f"<td>{c.mileage}</td><td>{c.days_listed}</td>"
-                f"<td><a href='{c.link}'>link</a></td></tr>"
-            )
+    with get_session(db_url) as session:
+        return _hybrid_tables(session, price_cap, aged_days, limit, only_available)
+
+
+SNAPSHOT_COUNTS = ("total_listings", "available_listings", "hybrids_total", "aged_hybrids", "aged_under_cap")
+
+
+def write_report_snapshot(session, counts, report_date=None, **run_stats) -> ReportSnapshot:
+    """Insert or refresh the snapshot row for report_date (today by default)."""
+    report_date = report_date or date.today()
+    snap = session.scalar(select(ReportSnapshot).where(ReportSnapshot.report_date == report_date))
+    if snap is None:
+        snap = ReportSnapshot(report_date=report_date)
+        session.add(snap)
+    for name in SNAPSHOT_COUNTS:
+        setattr(snap, name, counts[name])
+    for name, value in run_stats.items():
+        setattr(snap, name, value)
+    snap.created_at = datetime.now()
+    session.commit()
+    return snap
+
+
+def latest_snapshots(session, before=None, limit=2) -> list[ReportSnapshot]:
+    """Most recent snapshots first, optionally only those dated before `before`."""
+    stmt = select(ReportSnapshot).order_by(ReportSnapshot.report_date.desc()).limit(limit)
+    if before is not None:
+        stmt = stmt.where(ReportSnapshot.report_date < before)
+    return session.scalars(stmt).all()
+
+
+def snapshot_deltas(current: ReportSnapshot, previous: ReportSnapshot | None) -> dict:
+    """Day-over-day change of each count; empty when there's no earlier snapshot."""
+    if previous is None:
+        return {}
+    return {name: (getattr(current, name) or 0) - (getattr(previous, name) or 0) for name in SNAPSHOT_COUNTS}
+
+
+def _delta_values(deltas):
+    """{name}_delta for each count: " (+3)", or "" when it didn't change or there's nothing to compare."""
+    return {f"{name}_delta": f" ({deltas[name]:+d})" if deltas.get(name) else "" for name in SNAPSHOT_COUNTS}
+
+
+class TodayStats:
+    """What the report needs from one run's scraped cars, tallied without keeping them."""
+
+    SAMPLE_SIZE = 10
+
+    def __init__(self):
+        self.rows = 0
+        self.hybrids = 0
+        self.cheapest_hybrid = None
+        self.cheapest_price = None
+        self.sample = []
+
+    @classmethod
+    def from_cars(cls, cars):
+        stats = cls()
+        stats.add(cars)
+        return stats
+
+    def add(self, cars):
+        for car in cars:
+            self.rows += 1
+            if len(self.sample) < self.SAMPLE_SIZE:
+                self.sample.append(car)
+            if not car.get("is_hybrid"):
+                continue
+            self.hybrids += 1
+            price = parse_price(car["price"])
+            if price is not None and (self.cheapest_price is None or price < self.cheapest_price):
+                self.cheapest_hybrid, self.cheapest_price = car, price
+
+
+def _staleness_values(s) -> dict:
+    """How recently the 'still available' listings were actually checked, for STALENESS."""
+    oldest = f"{s['oldest_check_days']} days ago" if s["oldest_check_days"] is not None else "never"
+    return {"checked_1d": s["checked_1d"] / s["available"], "checked_7d": s["checked_7d"] / s["available"],
+            "oldest": oldest, "never": f", {s['never_checked']} never checked" if s["never_checked"] else ""}
+
+
+DAILY_HEADER = Template("""
+    <h2>Maverick Scraper Daily Report – {date}</h2>
+    <p>✅ Saved: <b>{saved}</b> &nbsp; ↪️ Skipped: <b>{skipped}</b> &nbsp; 🚗 Hybrids found today: <b>{hybrids_today}</b></p>
+    """, """Maverick Scraper Daily Report – {date}
+
+Saved: {saved}   Skipped: {skipped}   Hybrids found today: {hybrids_today}
+""")
+CHEAPEST_TODAY = Template(
+    "<p><b>Cheapest Hybrid (today):</b> {listing} – {price} – <a href='{link!u}'>link</a></p>",
+    "Cheapest Hybrid (today): {listing} – {price} – {link}\n")
+CHEAPEST_PRICE_TODAY = Template("<p><b>Cheapest Hybrid (today):</b> ${cheapest_price:,}</p>",
+                                "Cheapest Hybrid (today): ${cheapest_price:,}\n")
+NO_CHEAPEST_TODAY = Template("<p><b>Cheapest Hybrid (today):</b> none</p>", "Cheapest Hybrid (today): none\n")
+TOTALS = Template("""
+    <p>Total in database: <b>{total_listings}</b><small>{total_listings_delta}</small>
+       &nbsp; Still available: <b>{available_listings}</b><small>{available_listings_delta}</small></p>
+    """, "Total in database: {total_listings}{total_listings_delta}   "
+         "Still available: {available_listings}{available_listings_delta}\n")
+STALENESS = Template(
+    "<p>🕒 Availability checked in the last day: <b>{checked_1d:.0%}</b>"
+    " &nbsp; last 7 days: <b>{checked_7d:.0%}</b> &nbsp; oldest check: {oldest}{never}</p>",
+    "Availability checked in the last day: {checked_1d:.0%}   last 7 days: {checked_7d:.0%}   "
+    "oldest check: {oldest}{never}\n")
+SAMPLE_TABLE = Template("""
 
-        hybrids_rows_html = "".join(row_html(c) for c in cheapest_rows)
-        aged_rows_html = "".join(row_html(c) for c in aged_rows)
-        return hybrids_rows_html, aged_rows_html, counts
+    <h3>Today’s sample (first 10)</h3>
+    <table border="1" cellpadding="6" cellspacing="0">
+      <tr><th>Listing</th><th>Price</th><th>Mileage</th><th>Link</th></tr>
+      """, f"\nToday’s sample (first 10)\n  {'Listing':<44} {'Price':>10} {'Mileage':>10}  Link\n")
+SAMPLE_ROW = Template(  # rows are scraped car dicts
+    "<tr><td>{listing}</td><td>{price}</td><td>{mileage}</td><td><a href='{link!u}'>link</a></td></tr>",
+    "  {listing:<44.44} {price:>10.10} {mileage:>10.10}  {link}\n")
+BADGES = Template("""
+    <p>🌱 Hybrids total in DB: <b>{hybrids_total}</b><small>{hybrids_total_delta}</small> &nbsp;
+       ⏳ Aged hybrids (≥{aged_days}d): <b>{aged_hybrids}</b><small>{aged_hybrids_delta}</small> &nbsp;
+       💸 Aged hybrids ≤ ${price_cap:,}: <b>{aged_under_cap}</b><small>{aged_under_cap_delta}</small>
+        Listings removed today: {removed_today} &nbsp;
+       ♻️ Reposts: <b>{repost_listings}</b> listings of {repost_vehicles} vehicles</p>
+    """, """
+Hybrids total in DB: {hybrids_total}{hybrids_total_delta}
+Aged hybrids (≥{aged_days}d): {aged_hybrids}{aged_hybrids_delta}
+Aged hybrids ≤ ${price_cap:,}: {aged_under_cap}{aged_under_cap_delta}
+Listings removed today: {removed_today}
+Reposts: {repost_listings} listings of {repost_vehicles} vehicles
+""")
+REPOST_TABLE = Template("""
+    <h3>♻️ Reposted Hybrids first seen ≥{aged_days} days ago</h3>
+    <table border="1" cellpadding="6" cellspacing="0">
+      <tr><th>Listing</th><th>Price</th><th>Mileage</th><th>Days (first seen)</th><th>Posts</th><th>Link</th></tr>
+      """, "\nReposted Hybrids first seen ≥{aged_days} days ago\n"
+           f"  {'Listing':<44} {'Price':>10} {'Mileage':>10} {'Days':>5} {'Posts':>5}  Link\n")
+REPOST_ROW = Template(
+    "<tr><td>{listing}</td><td>{price}</td><td>{mileage}</td><td>{days}</td><td>{listings}</td>"
+    "<td><a href='{link!u}'>link</a></td></tr>",
+    "  {listing:<44.44} {price:>10.10} {mileage:>10.10} {days:>5} {listings:>5}  {link}\n",
+    columns=("listing", "price", "mileage", "days", "listings", "link"))
+
+
+def _write_daily(out, session, values, queries, today=None, table_limit=12):
+    """
+    The daily report's sections into `out`. values carries the counts and
+    run numbers; today, this run's TodayStats, adds the cheapest-today line
+    and the sample, which a report rendered from a snapshot doesn't have.
+    """
+    price_cap, aged_days = values["price_cap"], values["aged_days"]
+    staleness = availability_staleness(session)
+    repost_vehicles, repost_listings, repost_rows = reposted_vehicles(session, aged_days, limit=table_limit)
+    values = dict(values, repost_vehicles=repost_vehicles, repost_listings=repost_listings)
+
+    out.write(DAILY_HEADER, values)
+    if today is not None:
+        out.write(CHEAPEST_TODAY if today.cheapest_hybrid else NO_CHEAPEST_TODAY, today.cheapest_hybrid)
+    elif values["cheapest_price"] is not None:
+        out.write(CHEAPEST_PRICE_TODAY, values)
+    else:
+        out.write(NO_CHEAPEST_TODAY)
+    out.write(TOTALS, values)
+    if staleness["available"]:
+        out.write(STALENESS, _staleness_values(staleness))
+    if today is not None:
+        out.write(SAMPLE_TABLE)
+        out.rows(SAMPLE_ROW, today.sample)
+        out.write(TABLE_END)
+    out.write(BADGES, values)
+
+    for title, query in (("All Hybrids – Cheapest First", queries["cheapest"]),
+                         (f"⚠️ Aged Hybrids under ${price_cap:,} (≥{aged_days} days)", queries["aged"])):
+        out.write(LISTING_TABLE, {"title": title})
+        out.rows(LISTING_ROW, listing_rows(stream(session, query)))
+        out.write(TABLE_END)
+
+    if repost_rows:
+        out.write(REPOST_TABLE, values)
+        out.rows(REPOST_ROW, ((r.listing, r.price, r.mileage, (date.today() - r.first_seen).days, r.listings, r.link)
+                              for r in repost_rows))
+        out.write(TABLE_END)
 
 
 def summarize_today(
@@ -132,92 +297,127 @@ def summarize_today(
     price_cap: int = PRICE_CAP_DEFAULT,
     aged_days: int = AGED_DAYS_DEFAULT,
     table_limit: int = 12,
-) -> str:
-    """Compose the daily HTML email with DB-wide hybrid sections and today's highlights."""
-    # ---- today's quick stats (from this run only) ----
-    def price_to_int(p: str | None):
-        return int("".join(ch for ch in p if ch and ch.isdigit())) if p else None
-
-    hybrids_today = [c for c in car_list if c.get("is_hybrid")]
-    cheapest_today = min(
-        (c for c in hybrids_today if price_to_int(c["price"]) is not None),
-        key=lambda c: price_to_int(c["price"]),
-        default=None,
-    )
-
-    total_db = get_total_in_db(db_url)
-
-    # sample of today's scraped rows
-    today_rows = "".join(
-        f"<tr><td>{c['listing']}</td><td>{c['price']}</td>"
-        f"<td>{c['mileage']}</td><td><a href='{c['link']}'>link</a></td></tr>"
-        for c in car_list[:10]
-    )
-
-    cheapest_block = (
-        f"<p><b>Cheapest Hybrid (today):</b> {cheapest_today['listing']} – "
-        f"{cheapest_today['price']} – "
-        f"<a href='{cheapest_today['link']}'>link</a></p>"
-        if cheapest_today
-        else "<p><b>Cheapest Hybrid (today):</b> none</p>"
-    )
-
-    # ---- DB-wide hybrid sections (enriched & sorted) ----
-    hybrids_rows_html, aged_rows_html, counts = build_hybrid_tables(
-        db_url=db_url, price_cap=price_cap, aged_days=aged_days, limit=table_limit
-    )
-
-    hybrids_section = f"""
-    <h3>All Hybrids – Cheapest First</h3>
-    <table border="1" cellpadding="6" cellspacing="0">
-      <tr><th>Listing</th><th>Year</th><th>Price</th><th>Mileage</th><th>Days</th><th>Link</th></tr>
-      {hybrids_rows_html}
-    </table>
+    write_snapshot: bool = True,
+) -> tuple[str, str]:
     """
+    Compose the daily email with DB-wide hybrid sections and today's
+    highlights, as its (html, text) parts.
 
-    aged_section = f"""
-    <h3>⚠️ Aged Hybrids under ${price_cap:,} (≥{aged_days} days)</h3>
-    <table border="1" cellpadding="6" cellspacing="0">
-      <tr><th>Listing</th><th>Year</th><th>Price</th><th>Mileage</th><th>Days</th><th>Link</th></tr>
-      {aged_rows_html}
-    </table>
-    """
-
-    header_badges = f"""
-    <p>🌱 Hybrids total in DB: <b>{counts['hybrids_total']}</b> &nbsp;
-       ⏳ Aged hybrids (≥{aged_days}d): <b>{counts['aged_hybrids']}</b> &nbsp;
-       💸 Aged hybrids ≤ ${price_cap:,}: <b>{counts['aged_under_cap']}</b>
-        Listings removed today: {inactive_listings}</p>
+    car_list is either this run's scraped cars or a TodayStats that tallied
+    them as they streamed past.
     """
+    today = car_list if isinstance(car_list, TodayStats) else TodayStats.from_cars(car_list)
+    queries = report_queries(price_cap, aged_days, table_limit)
+    values = {"date": date.today().isoformat(), "saved": saved_count, "skipped": skipped_count,
+              "hybrids_today": today.hybrids, "removed_today": inactive_listings,
+              "price_cap": price_cap, "aged_days": aged_days}
+    out = ReportWriter()
+
+    with get_session(db_url) as session:
+        counts = dict(session.execute(queries["counts"]).one()._mapping)
+        deltas = {}
+        if write_snapshot:
+            snap = write_report_snapshot(
+                session, counts,
+                saved_today=saved_count, updated_today=skipped_count, removed_today=inactive_listings,
+                hybrids_found_today=today.hybrids, cheapest_hybrid_today=today.cheapest_price,
+                price_cap=price_cap, aged_days=aged_days,
+            )
+            previous = latest_snapshots(session, before=snap.report_date, limit=1)
+            deltas = snapshot_deltas(snap, previous[0] if previous else None)
+        values.update(counts, **_delta_values(deltas))
+        _write_daily(out, session, values, queries, today, table_limit)
+    return out.getvalue()
 
-    # ---- final HTML ----
-    return f"""
-    <h2>Maverick Scraper Daily Report – {date.today().isoformat()}</h2>
-    <p>✅ Saved: <b>{saved_count}</b> &nbsp; ↪️ Skipped: <b>{skipped_count}</b> &nbsp; 🚗 Hybrids found today: <b>{len(hybrids_today)}</b></p>
-    {cheapest_block}
-    <p>Total in database: <b>{total_db}</b></p>
 
-    <h3>Today’s sample (first 10)</h3>
+def render_snapshot(db_url: str = DB_URL, report_date=None, table_limit: int = 12) -> tuple[str, str] | None:
+    """
+    The daily report for report_date (today by default) from its
+    report_snapshot row, as (html, text): the counts, deltas and run numbers
+    come from the snapshot instead of a scan of cars. None when that day has
+    no snapshot.
+    """
+    report_date = report_date or date.today()
+    out = ReportWriter()
+    with get_session(db_url) as session:
+        snap = session.scalar(select(ReportSnapshot).where(ReportSnapshot.report_date == report_date))
+        if snap is None:
+            return None
+        previous = latest_snapshots(session, before=report_date, limit=1)
+        deltas = snapshot_deltas(snap, previous[0] if previous else None)
+        price_cap = snap.price_cap or PRICE_CAP_DEFAULT
+        aged_days = snap.aged_days or AGED_DAYS_DEFAULT
+        values = {name: getattr(snap, name) for name in SNAPSHOT_COUNTS}
+        values.update(_delta_values(deltas), date=report_date.isoformat(), saved=snap.saved_today,
+                      skipped=snap.updated_today, hybrids_today=snap.hybrids_found_today,
+                      removed_today=snap.removed_today, cheapest_price=snap.cheapest_hybrid_today,
+                      price_cap=price_cap, aged_days=aged_days)
+        _write_daily(out, session, values, report_queries(price_cap, aged_days, table_limit),
+                     table_limit=table_limit)
+    return out.getvalue()
+
+
+WEEKLY_HEADER = Template("""
+    <h2>Maverick Weekly Digest – {date}</h2>
+    <p>🆕 Listings found in the last {days} days: <b>{new_listings}</b>
+       ({new_hybrids} hybrids, {still_available} still up) &nbsp; 📉 Price drops: <b>{price_drops}</b></p>
+    """, """Maverick Weekly Digest – {date}
+
+Listings found in the last {days} days: {new_listings} ({new_hybrids} hybrids, {still_available} still up)
+Price drops: {price_drops}
+""")
+DROP_TABLE = Template("""
+    <h3>{title}</h3>
     <table border="1" cellpadding="6" cellspacing="0">
-      <tr><th>Listing</th><th>Price</th><th>Mileage</th><th>Link</th></tr>
-      {today_rows}
-    </table>
+      <tr><th>Listing</th><th>Was</th><th>Now</th><th>Drop</th><th>Seen</th><th>Link</th></tr>
+      """, "\n{title}\n" f"  {'Listing':<44} {'Was':>9} {'Now':>9} {'Drop':>8} {'Seen':>10}  Link\n")
+DROP_ROW = Template(
+    "<tr><td>{listing}</td><td>${was:,}</td><td>${now:,}</td><td>${drop:,}</td><td>{seen}</td>"
+    "<td><a href='{link!u}'>link</a></td></tr>",
+    "  {listing:<44.44} {was:>9,} {now:>9,} {drop:>8,} {seen:>10}  {link}\n",
+    columns=("listing", "was", "now", "drop", "seen", "link"))
+EMPTY_ROW = Template("<tr><td colspan='6'>none</td></tr>", "  none\n")
 
-    {header_badges}
-    {hybrids_section}
-    {aged_section}
-    """
 
-    
-def send_email_report(subject: str, html_body: str):
-    msg = MIMEMultipart("alternative")
-    msg["Subject"] = subject
-    msg["From"] = MY_EMAIL
-    msg["To"] = MY_EMAIL
-    msg.attach(MIMEText(html_body, "html"))
-
-    ctx = ssl.create_default_context()
-    with smtplib.SMTP_SSL("smtp.gmail.com", 465, context=ctx) as server:
-        server.login(MY_EMAIL, GMAIL_APP_PASSWORD)
-        server.send_message(msg)
-    print("📧 Email sent!")
+def weekly_digest(out: ReportWriter, db_url: str = DB_URL, days: int = 7) -> int:
+    """
+    Every listing found in the last `days` days, hybrids first, cheapest
+    first, then every price drop seen in that time, streamed into `out`
+    straight from the cursors. Returns how many rows it wrote.
+    """
+    since = date.today() - timedelta(days=days)
+    found = CarListing.date_found >= since
+    hybrid = CarListing.is_hybrid.is_(True)
+    drops = price_drops_query(days)
+    by_price = (CarListing.price_num.is_(None), CarListing.price_num.asc())
+
+    with get_session(db_url) as session:
+        new_listings, new_hybrids, still_available = session.execute(
+            select(func.count(), _count_if(hybrid), _count_if(CarListing.still_available.is_(True)))
+            .where(found)).one()
+        out.write(WEEKLY_HEADER, {"date": date.today().isoformat(), "days": days, "new_listings": new_listings,
+                                  "new_hybrids": new_hybrids, "still_available": still_available,
+                                  "price_drops": session.scalar(select(func.count()).select_from(drops.subquery()))})
+        written = 0
+        for title, condition in ((f"🆕 Hybrids found since {since}", hybrid),
+                                 (f"🆕 Other listings found since {since}", CarListing.is_hybrid.is_not(True))):
+            out.write(LISTING_TABLE, {"title": title})
+            rows = stream(session, select(*listing_columns()).where(found, condition).order_by(*by_price))
+            written += out.rows(LISTING_ROW, listing_rows(rows), empty=EMPTY_ROW)
+            out.write(TABLE_END)
+
+        out.write(DROP_TABLE, {"title": f"📉 Price drops since {since}"})
+        written += out.rows(DROP_ROW, ((r.listing, r.prev_price_num, r.price_num, r.prev_price_num - r.price_num,
+                                        r.observed_at.date().isoformat(), r.link) for r in stream(session, drops)),
+                            empty=EMPTY_ROW)
+        out.write(TABLE_END)
+    return written
+
+
+def send_email_report(subject: str, html_body: str, text_body: str | None = None, report_date=None,
+                      kind="report"):
+    """Spool the report and send what's due now; on failure it stays spooled for mail_spool.py."""
+    from mail_spool import send_pending, spool_report
+
+    spool_report(subject, html_body, report_date, kind=kind, text=text_body, resend=True)
+    send_pending()
@@ -0,0 +1,259 @@
+"""
+Detail-page enrichment: trim, VIN, seller type and exact year.
+
+The liveness check already downloads every available listing's
+/UDTransDetail page once a day, so enrichment rides on that fetch instead of
+making its own requests: check_links() hands each active page to a
+DetailEnricher from its worker threads. The enricher stores the page gzipped
+in a content-addressed cache (<root>/<sha256[:2]>/<sha256>.html.gz) and only
+parses it when its hash differs from the listing's detail_hash.
+
+Each database gets its own cache root (detail_cache_dir), so pruning the
+pages one database no longer references never touches another's. After
+DETAIL_LABELS or parse_detail changes, `python enrich.py --reparse`
+re-parses every listing from its cached page without fetching anything.
+
+    enricher = DetailEnricher(DetailCache(detail_cache_dir(db_url)), stored_hashes)
+    resolve_liveness(links, on_page=enricher)
+    enricher.write(session)
+"""
+
+import argparse
+import gzip
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+
+from sqlalchemy import select, update
+from sqlalchemy.engine import make_url
+
+from db import get_session
+from metrics import METRICS
+from models import CarListing
+from normalize import parse_year
+
+# Relative paths are resolved next to the SQLite file the cache belongs to
+DETAIL_CACHE_DIR = os.environ.get("DETAIL_CACHE_DIR", "cache/detail")
+DB_URL = os.environ.get("DB_URL", "sqlite:///mavericks.db")
+UPDATE_CHUNK = 500
+
+# Accent-free, lowercased label text -> cars column
+DETAIL_LABELS = {
+    "ano": "detail_year",
+    "version": "trim",
+    "vin": "vin",
+    "vendedor": "seller_type",
+}
+DETAIL_COLUMNS = ("trim", "vin", "seller_type", "detail_year")
+_PRIVATE_SELLERS = ("privad", "particular", "dueno")
+# 17 characters, no I/O/Q
+_VIN = re.compile(r"\b[A-HJ-NPR-Z0-9]{17}\b")
+
+
+def detail_cache_dir(db_url):
+    """
+    The cache root that belongs to db_url: <DETAIL_CACHE_DIR>/<db file stem>
+    beside a SQLite file, or keyed by a hash of the URL for other databases.
+    """
+    url = make_url(db_url)
+    if url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:"):
+        folder, name = os.path.split(os.path.abspath(url.database))
+        return os.path.join(folder, DETAIL_CACHE_DIR, os.path.splitext(name)[0])
+    return os.path.join(DETAIL_CACHE_DIR, hashlib.sha256(db_url.encode()).hexdigest()[:16])
+
+
+class DetailCache:
+    """Gzipped pages on disk, keyed by the SHA-256 of their raw bytes."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], f"{digest}.html.gz")
+
+    def put(self, body: bytes) -> str:
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Workers can race on the same page; write-then-rename keeps the blob whole
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(gzip.compress(body, compresslevel=6))
+            os.replace(tmp, path)
+        return digest
+
+    def get(self, digest) -> bytes | None:
+        try:
+            with open(self.path(digest), "rb") as f:
+                return gzip.decompress(f.read())
+        except FileNotFoundError:
+            return None
+
+    def prune(self, keep):
+        """Delete cached pages whose hash isn't in keep; returns how many went."""
+        removed = 0
+        if not os.path.isdir(self.root):
+            return removed
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.split(".", 1)[0] not in keep:
+                    os.remove(entry.path)
+                    removed += 1
+        return removed
+
+
+def _label_key(text):
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    return text.strip().rstrip(":").strip().lower()
+
+
+def _label_pairs_lxml(html):
+    doc = lxml.html.document_fromstring(html)
+    for label in _LABEL_XPATH(doc):
+        value = _VALUE_XPATH(label)
+        if value:
+            yield label.text_content(), value[0].text_content()
+
+
+def _label_pairs_bs4(html):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    for label in soup.select("td.label"):
+        value = label.find_next_sibling("td")
+        if value is not None:
+            yield label.get_text(), value.get_text()
+
+
+try:
+    import lxml.etree
+    import lxml.html
+
+    _LABEL_XPATH = lxml.etree.XPath("//td[contains(concat(' ', normalize-space(@class), ' '), ' label ')]")
+    _VALUE_XPATH = lxml.etree.XPath("following-sibling::td[1]")
+    _label_pairs = _label_pairs_lxml
+except ImportError:
+    _label_pairs = _label_pairs_bs4
+
+
+def _seller_type(text):
+    lowered = _label_key(text)
+    if "dealer" in lowered:
+        return "dealer"
+    if any(hint in lowered for hint in _PRIVATE_SELLERS):
+        return "private"
+    return lowered or None
+
+
+def parse_detail(html) -> dict:
+    """The DETAIL_COLUMNS values found on a detail page; missing ones are None."""
+    found = dict.fromkeys(DETAIL_COLUMNS)
+    for label, value in _label_pairs(html):
+        column = DETAIL_LABELS.get(_label_key(label))
+        value = " ".join(value.split())
+        if column is None or not value:
+            continue
+        if column == "detail_year":
+            found[column] = parse_year(value)
+        elif column == "vin":
+            match = _VIN.search(value.upper())
+            found[column] = match.group(0) if match else None
+        elif column == "seller_type":
+            found[column] = _seller_type(value)
+        else:
+            found[column] = value
+    return found
+
+
+def load_detail_hashes(session):
+    """link -> detail_hash for the listings the liveness check will fetch."""
+    return dict(session.execute(
+        select(CarListing.link, CarListing.detail_hash).where(CarListing.still_available.is_(True))).all())
+
+
+class DetailEnricher:
+    """
+    on_page callback for check_links(): caches each active page and parses
+    the ones whose content changed. Called from the liveness worker threads.
+    """
+
+    def __init__(self, cache, stored_hashes):
+        self.cache = cache
+        self.stored_hashes = stored_hashes
+        self.changed = {}  # link -> column values to write
+        self.seen = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, link, body):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        digest = self.cache.put(body)
+        if self.stored_hashes.get(link) == digest:
+            METRICS.inc("detail_pages", status="unchanged")
+            with self._lock:
+                self.seen += 1
+            return
+        values = parse_detail(body)
+        values["detail_hash"] = digest
+        METRICS.inc("detail_pages", status="changed")
+        with self._lock:
+            self.seen += 1
+            self.changed[link] = values
+
+    def write(self, session):
+        """Update the changed listings (caller commits); returns how many were written."""
+        if not self.changed:
+            return 0
+        ids = {}
+        links = list(self.changed)
+        for i in range(0, len(links), UPDATE_CHUNK):
+            ids.update(session.execute(
+                select(CarListing.link, CarListing.id).where(CarListing.link.in_(links[i:i + UPDATE_CHUNK]))).all())
+        rows = [dict(values, id=ids[link]) for link, values in self.changed.items() if link in ids]
+        if rows:
+            session.execute(update(CarListing), rows)
+        return len(rows)
+
+
+def reparse_cached(session, cache):
+    """
+    Re-parse every enriched listing from its cached page (caller commits);
+    returns (reparsed, missing) where missing pages wait for the next fetch.
+    """
+    rows = session.execute(
+        select(CarListing.id, CarListing.detail_hash).where(CarListing.detail_hash.is_not(None))).all()
+    updates, missing = [], 0
+    for car_id, digest in rows:
+        body = cache.get(digest)
+        if body is None:
+            missing += 1
+            continue
+        updates.append(dict(parse_detail(body), id=car_id))
+    for i in range(0, len(updates), UPDATE_CHUNK):
+        session.execute(update(CarListing), updates[i:i + UPDATE_CHUNK])
+    return len(updates), missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detail-page enrichment from the page cache")
+    parser.add_argument("--db-url", default=DB_URL)
+    parser.add_argument("--reparse", action="store_true",
+                        help="re-parse every enriched listing from its cached detail page")
+    args = parser.parse_args()
+    if not args.reparse:
+        parser.error("nothing to do; pass --reparse")
+
+    cache = DetailCache(detail_cache_dir(args.db_url))
+    with get_session(args.db_url) as session:
+        reparsed, missing = reparse_cached(session, cache)
+        session.commit()
+    print(f"🔎 Re-parsed {reparsed} listings from {cache.root}; {missing} pages not cached")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Price and availability history for listings.
+
+cars only holds each listing's current state; listing_events keeps every
+change to it. Rows are delta encoded: nothing is written for a listing that
+was seen again unchanged, only when it's listed, changes price or mileage,
+is found removed or comes back (relisted). The upsert and the liveness check
+append events in the same transaction as the change itself.
+
+    with get_session(db_url) as session:
+        drops = price_drops(session, days=7)
+        sales = time_to_sale(session, days=30)
+"""
+
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, insert, select
+
+from models import CarListing, ListingEvent
+
+LISTED = "listed"
+PRICE = "price"
+MILEAGE = "mileage"
+REMOVED = "removed"
+RELISTED = "relisted"
+EVENT_FIELDS = ("listing_id", "observed_at", "event", "price_num", "prev_price_num",
+                "mileage_num", "prev_mileage_num")
+
+
+def change_events(listing_id, before, after, observed_at):
+    """
+    Events for one existing listing going from `before` to `after`, both
+    dicts with price_num, mileage_num and still_available. A new value of
+    None (e.g. "A negociar") isn't a change worth recording.
+    """
+    events = []
+    if not before["still_available"] and after.get("still_available"):
+        events.append({"listing_id": listing_id, "observed_at": observed_at, "event": RELISTED,
+                       "price_num": after.get("price_num", before["price_num"]),
+                       "mileage_num": after.get("mileage_num", before["mileage_num"])})
+    for event, column in ((PRICE, "price_num"), (MILEAGE, "mileage_num")):
+        new, old = after.get(column), before[column]
+        if new is not None and new != old:
+            events.append({"listing_id": listing_id, "observed_at": observed_at, "event": event,
+                           column: new, f"prev_{column}": old})
+    return events
+
+
+def listed_event(listing_id, values, observed_at):
+    return {"listing_id": listing_id, "observed_at": observed_at, "event": LISTED,
+            "price_num": values.get("price_num"), "mileage_num": values.get("mileage_num")}
+
+
+def removed_event(listing_id, observed_at):
+    return {"listing_id": listing_id, "observed_at": observed_at, "event": REMOVED}
+
+
+def record_events(session, events):
+    """Append events in one executemany; the caller commits."""
+    if events:
+        # Same keys in every row, so it stays a single statement
+        session.execute(insert(ListingEvent), [dict.fromkeys(EVENT_FIELDS) | e for e in events])
+    return len(events)
+
+
+@dataclass
+class PriceDrop:
+    listing_id: int
+    listing: str
+    link: str
+    is_hybrid: bool
+    observed_at: datetime
+    prev_price: int
+    price: int
+
+    @property
+    def drop(self):
+        return self.prev_price - self.price
+
+
+def price_drops_query(days=7, min_drop=1, hybrids_only=False, now=None):
+    """
+    Price decreases of at least min_drop observed in the last `days` days,
+    biggest first. Reads the (event, observed_at) index range, then joins
+    the few matching rows to cars by primary key.
+    """
+    since = (now or datetime.now()) - timedelta(days=days)
+    e = ListingEvent
+    query = (
+        select(e.listing_id, CarListing.listing, CarListing.link, CarListing.is_hybrid,
+               e.observed_at, e.prev_price_num, e.price_num)
+        .join(CarListing, CarListing.id == e.listing_id)
+        .where(e.event == PRICE, e.observed_at >= since,
+               e.prev_price_num - e.price_num >= min_drop)
+        .order_by((e.prev_price_num - e.price_num).desc(), e.observed_at.desc())
+    )
+    if hybrids_only:
+        query = query.where(CarListing.is_hybrid.is_(True))
+    return query
+
+
+def price_drops(session, days=7, min_drop=1, hybrids_only=False, now=None):
+    """price_drops_query's rows as PriceDrops."""
+    return [PriceDrop(*row) for row in session.execute(price_drops_query(days, min_drop, hybrids_only, now))]
+
+
+@dataclass
+class Sale:
+    listing_id: int
+    listing: str
+    is_hybrid: bool
+    listed_at: date
+    removed_at: datetime
+
+    @property
+    def days(self):
+        return (self.removed_at.date() - self.listed_at).days
+
+
+def time_to_sale(session, days=30, now=None):
+    """
+    Listings found removed in the last `days` days and how long each had
+    been up: from its latest listed/relisted event before the removal
+    (date_found for listings older than the history), via the
+    (listing_id, observed_at) index.
+    """
+    since = (now or datetime.now()) - timedelta(days=days)
+    removed = ListingEvent.__table__.alias("removed")
+    up = ListingEvent.__table__.alias("up")
+    listed_at = (
+        select(func.max(up.c.observed_at))
+        .where(up.c.listing_id == removed.c.listing_id, up.c.event.in_((LISTED, RELISTED)),
+               up.c.observed_at <= removed.c.observed_at)
+        .scalar_subquery()
+    )
+    rows = session.execute(
+        select(removed.c.listing_id, CarListing.listing, CarListing.is_hybrid, CarListing.date_found,
+               listed_at, removed.c.observed_at)
+        .join(CarListing, CarListing.id == removed.c.listing_id)
+        .where(removed.c.event == REMOVED, removed.c.observed_at >= since)
+        .order_by(removed.c.observed_at))
+    sales = []
+    for listing_id, listing, is_hybrid, date_found, listed, removed_at in rows:
+        if isinstance(listed, str):
+            # max() over a subquery loses the column type on SQLite
+            listed = datetime.fromisoformat(listed)
+        start = listed.date() if listed else date_found
+        if start is not None:
+            sales.append(Sale(listing_id, listing, is_hybrid, start, removed_at))
+    return sales
+
+
+def seed_events(rows):
+    """
+    'listed' events for listings stored before the history existed, at their
+    date_found with their current price and mileage. rows are (id,
+    date_found, price_num, mileage_num); see migrate_db.py.
+    """
+    return [listed_event(car_id, {"price_num": price, "mileage_num": mileage},
+                         datetime.combine(found or date.today(), datetime.min.time()))
+            for car_id, found, price, mileage in rows]
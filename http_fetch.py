@@ -0,0 +1,95 @@
+"""
+Browser-free fetching of search result pages.
+
+Result pages are requested directly from Transportation.asp by query
+parameters over a pooled requests session, a few pages at a time, and the raw
+HTML is handed to the regular page parser.
+"""
+
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import METRICS
+from ratelimit import CLOCK, shared_limiter
+
+# Overridable so the scraper can be pointed at a local stand-in of the site
+BASE_URL = os.environ.get("CLASIFICADOS_BASE_URL", "https://www.clasificadosonline.com")
+SEARCH_URL = os.environ.get("SEARCH_URL", BASE_URL + "/Transportation.asp")
+# The search form posts the term as "Key". The offset parameter is a best guess that
+# hasn't been checked against the live site, which is why FETCH_MODE defaults to
+# selenium; fetch_result_pages stops if the site turns out to ignore it.
+PAGE_PARAM = os.environ.get("SEARCH_PAGE_PARAM", "offset")
+PAGE_SIZE = int(os.environ.get("SEARCH_PAGE_SIZE", "30"))
+FETCH_CONCURRENCY = int(os.environ.get("FETCH_CONCURRENCY", "3"))
+MAX_PAGES = 50
+REQUEST_TIMEOUT = 20
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# Every result row title carries this class; a page without it has no results
+RESULTS_MARKER = "Tahoma15blacknound"
+_DETAIL_LINK = re.compile(r"""href=["'](/UDTransDetail[^"']*)""")
+
+
+def make_session(pool_size: int = FETCH_CONCURRENCY) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+def search_params(term: str, page: int, extra: dict | None = None) -> dict:
+    params = {"Key": term, "Submit2": "Buscar"}
+    if page > 1:
+        params[PAGE_PARAM] = (page - 1) * PAGE_SIZE
+    params.update(extra or {})
+    return params
+
+
+def fetch_result_page(session, term, page, limiter=None, extra=None, url=SEARCH_URL) -> str:
+    if limiter:
+        limiter.wait(url)
+    with CLOCK.timing("network"), METRICS.timer("page_load_seconds", via="http"):
+        resp = session.get(url, params=search_params(term, page, extra), timeout=REQUEST_TIMEOUT)
+    resp.raise_for_status()
+    return resp.text
+
+
+def fetch_result_pages(term, session=None, concurrency=FETCH_CONCURRENCY, max_pages=MAX_PAGES,
+                       limiter=None, extra=None, url=SEARCH_URL, stats=None, start_page=1):
+    """
+    Yield (page_number, html) in page order, from start_page until a page
+    comes back without results, or with the same listings as the page
+    before it (the site ignoring PAGE_PARAM would otherwise serve page 1
+    max_pages times). Up to `concurrency` pages are in flight at once; if `stats` is
+    given, stats["requests"] counts every page requested, including any
+    prefetched past the point where the caller stopped.
+    """
+    session = session or make_session(concurrency)
+    limiter = limiter or shared_limiter()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        page = start_page
+        previous = None
+        while page <= max_pages:
+            wave = range(page, min(page + concurrency, max_pages + 1))
+            futures = [pool.submit(fetch_result_page, session, term, p, limiter, extra, url) for p in wave]
+            if stats is not None:
+                stats["requests"] = stats.get("requests", 0) + len(futures)
+            for p, future in zip(wave, futures):
+                html = future.result()
+                if RESULTS_MARKER not in html:
+                    return
+                links = _DETAIL_LINK.findall(html)
+                if links and links == previous:
+                    print(f"⚠️ [{term}] Page {p} repeats page {p - 1}; is {PAGE_PARAM!r} the right page parameter?")
+                    METRICS.inc("repeated_pages")
+                    return
+                previous = links
+                yield p, html
+            page = wave[-1] + 1
@@ -0,0 +1,132 @@
+"""
+Incremental scraping.
+
+Results are listed newest first, so once a few pages in a row hold nothing
+but links already in the cars table, the rest of the pages are old news. An
+incremental run stops paginating there; every FULL_SWEEP_DAYS a search gets
+a full sweep instead, which walks every page and records how many there were
+(so incremental runs can report what they skipped).
+"""
+
+import hashlib
+import math
+import os
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from sqlalchemy import select, func
+
+from models import CarListing, SearchState
+
+INCREMENTAL_STOP_PAGES = int(os.environ.get("INCREMENTAL_STOP_PAGES", "2"))
+FULL_SWEEP_DAYS = int(os.environ.get("FULL_SWEEP_DAYS", "7"))
+# Above this many stored links, keep a Bloom filter instead of the set of strings
+BLOOM_THRESHOLD = int(os.environ.get("BLOOM_THRESHOLD", "200000"))
+BLOOM_FP_RATE = 0.001
+
+
+class BloomFilter:
+    """
+    Fixed-size set membership with no false negatives.
+
+    A false positive only ever makes a new listing look known, which at worst
+    helps end an incremental run a page early; the listing itself is still
+    parsed and saved.
+    """
+
+    def __init__(self, capacity, fp_rate=BLOOM_FP_RATE):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def __len__(self):
+        return self.count
+
+
+def load_known_links(session, bloom_threshold=BLOOM_THRESHOLD):
+    """Every stored link, as a set or (for big tables) a BloomFilter."""
+    total = session.scalar(select(func.count()).select_from(CarListing)) or 0
+    links = session.execute(select(CarListing.link).execution_options(yield_per=10_000)).scalars()
+    if total <= bloom_threshold:
+        return set(links)
+    known = BloomFilter(total)
+    for link in links:
+        known.add(link)
+    return known
+
+
+@dataclass
+class SweepPlan:
+    full: bool
+    last_full_pages: int | None = None
+
+
+def plan_sweeps(session, keys, mode="auto", today=None, full_sweep_days=FULL_SWEEP_DAYS):
+    """
+    Decide per search key whether this run walks every page.
+
+    "auto" does a full sweep for searches never swept, or last swept
+    full_sweep_days or more ago; "incremental" and "full" force one or the other.
+    """
+    today = today or date.today()
+    states = {s.search_key: s for s in session.scalars(
+        select(SearchState).where(SearchState.search_key.in_(list(keys))))}
+    plans = {}
+    for key in keys:
+        state = states.get(key)
+        last_pages = state.last_full_pages if state else None
+        if mode == "auto":
+            due = (state is None or state.last_full_sweep is None
+                   or state.last_full_sweep <= today - timedelta(days=full_sweep_days))
+            plans[key] = SweepPlan(full=due, last_full_pages=last_pages)
+        else:
+            plans[key] = SweepPlan(full=mode == "full", last_full_pages=last_pages)
+    return plans
+
+
+def record_full_sweeps(session, results, today=None):
+    """Store the page count of every full sweep that finished cleanly."""
+    today = today or date.today()
+    for r in results:
+        if r.incremental or r.error or not r.pages:
+            continue
+        state = session.get(SearchState, r.spec.key) or SearchState(search_key=r.spec.key)
+        state.last_full_sweep = today
+        state.last_full_pages = r.pages
+        session.add(state)
+    session.commit()
+
+
+class PageCutoff:
+    """Counts consecutive result pages whose listings are all already known."""
+
+    def __init__(self, known, stop_after=INCREMENTAL_STOP_PAGES):
+        self.known = known
+        self.stop_after = stop_after
+        self.streak = 0
+
+    def should_stop(self, cars):
+        # A page with no matching rows says nothing either way
+        if not cars:
+            return False
+        if all(car["link"] in self.known for car in cars):
+            self.streak += 1
+        else:
+            self.streak = 0
+        return self.streak >= self.stop_after
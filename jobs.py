@@ -0,0 +1,196 @@
+"""
+Run several searches in one go.
+
+Each SearchSpec becomes a job. Jobs run in parallel and share one pooled HTTP
+session, the process-wide per-host rate limiter and a small DriverPool for the searches
+that have to go through Chrome. Each page is either streamed straight into
+the DB (pipeline.PageWriter, which writes each link once per run however
+many searches return it) or kept in the job's result. Jobs given a set of known links
+and an incremental SweepPlan stop paginating early (see incremental.py).
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from urllib.parse import urlencode
+
+import requests
+
+from http_fetch import BASE_URL, fetch_result_pages, make_session
+from incremental import PageCutoff
+from metrics import METRICS
+from ratelimit import CLOCK, shared_limiter
+from matcher import ListingMatcher
+from parsing import parse_cars
+
+JOB_CONCURRENCY = int(os.environ.get("JOB_CONCURRENCY", "2"))
+# JSON list of {"term", "category", "filters", "models"} objects
+SEARCH_SPECS_PATH = os.environ.get("SEARCH_SPECS")
+
+
+@dataclass
+class SearchSpec:
+    term: str
+    category: str = "Transportation"
+    filters: dict = field(default_factory=dict)
+    models: list | None = None  # titles to keep; defaults to the search term
+
+    @property
+    def url(self):
+        return f"{BASE_URL}/{self.category}.asp"
+
+    @property
+    def key(self):
+        """Identifies the search in the search_state table."""
+        key = f"{self.category}/{self.term}"
+        return f"{key}?{urlencode(sorted(self.filters.items()))}" if self.filters else key
+
+
+@dataclass
+class JobResult:
+    spec: SearchSpec
+    cars: list = field(default_factory=list)
+    pages: int = 0
+    mode: str = ""
+    seconds: float = 0.0
+    error: str | None = None
+    requests: int = 0  # result pages requested, including prefetched ones never parsed
+    incremental: bool = False
+    stopped_early: bool = False
+    expected_pages: int | None = None  # page count from the last full sweep
+    rows: int = 0
+    resumed_from: int | None = None
+
+
+def load_specs(path=SEARCH_SPECS_PATH, default_term="Maverick"):
+    if not path:
+        return [SearchSpec(default_term)]
+    with open(path, encoding="utf-8") as f:
+        return [SearchSpec(**spec) for spec in json.load(f)]
+
+
+def _scrape_pages(result, pages, matcher, parser_backend, cutoff, writer=None):
+    """
+    Parse each (page, html) and either hand it to the writer or keep it in
+    result.cars. True if the cutoff ended pagination.
+    """
+    for result.pages, html in pages:
+        print(f"📄 [{result.spec.term}] Scraping page {result.pages}...")
+        METRICS.inc("pages", mode=result.mode)
+        with CLOCK.timing("parse/save"):
+            cars = parse_cars(html, backend=parser_backend, matcher=matcher)
+            result.rows += len(cars)
+            if writer is not None:
+                writer.write_page(result.spec, result.pages, cars)
+            else:
+                result.cars.extend(cars)
+        if cutoff and cutoff.should_stop(cars):
+            print(f"⏹️ [{result.spec.term}] {cutoff.streak} pages in a row of known listings, stopping")
+            return True
+    return False
+
+
+def run_job(spec, fetch_mode="http", session=None, limiter=None, driver_pool=None, parser_backend=None,
+            known=None, plan=None, writer=None):
+    """
+    Scrape one search. With a writer (pipeline.PageWriter) each page is saved
+    as it's parsed and the search resumes after today's checkpoint; without
+    one the cars are collected in result.cars.
+    """
+    result = JobResult(spec)
+    matcher = ListingMatcher(models=spec.models or [spec.term])
+    result.incremental = known is not None and plan is not None and not plan.full
+    result.expected_pages = plan.last_full_pages if plan else None
+    start_page = writer.resume_page(spec) if writer is not None else 1
+    result.resumed_from = start_page if start_page > 1 else None
+    result.pages = start_page - 1
+    start = time.perf_counter()
+
+    fetched = False
+    if fetch_mode == "http":
+        result.mode = "http"
+        stats = {}
+        cutoff = PageCutoff(known) if result.incremental else None
+        http_failed = False
+        try:
+            pages = fetch_result_pages(spec.term, session=session, limiter=limiter, extra=spec.filters,
+                                       url=spec.url, stats=stats, start_page=start_page)
+            result.stopped_early = _scrape_pages(result, pages, matcher, parser_backend, cutoff, writer)
+        except requests.RequestException as e:
+            print(f"⚠️ [{spec.term}] HTTP fetch failed: {e}")
+            METRICS.error(e, "search")
+            http_failed = True
+            if result.pages >= start_page:
+                result.error = f"stopped at page {result.pages}: {e}"
+        result.requests = stats.get("requests", 0)
+        fetched = result.pages >= start_page
+        # A resumed search with nothing left to fetch is simply done
+        if not fetched and (start_page == 1 or http_failed):
+            print(f"↩️ [{spec.term}] Falling back to Selenium")
+            result.cars.clear()
+        else:
+            fetched = True
+
+    if not fetched and driver_pool is not None:
+        from browser import iter_selenium_pages
+
+        result.mode = "selenium"
+        cutoff = PageCutoff(known) if result.incremental else None
+        try:
+            with driver_pool.driver() as driver:
+                result.stopped_early = _scrape_pages(
+                    result, iter_selenium_pages(driver, spec.term, start_page=start_page, limiter=limiter,
+                                                url=spec.url, filters=spec.filters),
+                    matcher, parser_backend, cutoff, writer)
+        except Exception as e:
+            result.error = f"{e.__class__.__name__}: {e}"
+            print(f"❌ [{spec.term}] {result.error}")
+            METRICS.error(e, "search")
+        result.requests = result.pages
+
+    if writer is not None:
+        writer.finish(result)
+    result.seconds = time.perf_counter() - start
+    METRICS.event("search_job", term=spec.term, key=spec.key, mode=result.mode, pages=result.pages,
+                  requests=result.requests, rows=result.rows, incremental=result.incremental,
+                  stopped_early=result.stopped_early, seconds=round(result.seconds, 3), error=result.error)
+    return result
+
+
+def run_jobs(specs, fetch_mode="http", driver_pool=None, concurrency=JOB_CONCURRENCY, parser_backend=None,
+             known=None, plans=None, writer=None, limiter=None):
+    """
+    Run every spec; `known` links plus per-key `plans` (incremental.plan_sweeps)
+    enable early cutoff, and a `writer` streams pages into the DB.
+    """
+    session = make_session(max(concurrency, 1) * 3)
+    limiter = limiter or shared_limiter()
+    plans = plans or {}
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(run_job, spec, fetch_mode, session, limiter, driver_pool, parser_backend,
+                               known, plans.get(spec.key), writer)
+                   for spec in specs]
+        return [f.result() for f in futures]
+
+
+def print_job_report(results, unique_count=None):
+    print("📋 Search jobs:")
+    pages_skipped = requests_skipped = 0
+    for r in results:
+        status = r.error or ("stopped early" if r.stopped_early else "ok")
+        if r.resumed_from:
+            status += f", resumed at page {r.resumed_from}"
+        sweep = "incr" if r.incremental else "full"
+        print(f"  {r.spec.term:<20} {r.mode:<8} {sweep:<4} {r.pages:>3} pages  {r.requests:>3} requests  "
+              f"{r.rows:>5} rows  {r.seconds:7.1f}s  {status}")
+        if r.stopped_early and r.expected_pages:
+            pages_skipped += max(0, r.expected_pages - r.pages)
+            requests_skipped += max(0, r.expected_pages - r.requests)
+    total = sum(r.rows for r in results)
+    unique = f", {unique_count} unique listings" if unique_count is not None else ""
+    print(f"🧮 {total} rows from {len(results)} jobs{unique}")
+    if any(r.stopped_early for r in results):
+        print(f"⏭️ Incremental cutoff skipped ~{pages_skipped} pages / {requests_skipped} requests "
+              f"(vs. each search's last full sweep)")
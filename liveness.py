@@ -0,0 +1,125 @@
+"""
+Concurrent liveness checks for stored listings.
+
+Detail pages are fetched with a bounded pool of plain HTTP workers. Only the
+pages that can't be classified from the raw HTML (blocked requests, bot
+challenges, network errors) are handed to the Selenium driver. Pages of
+active listings can be passed on to an on_page(link, body) callback (see
+enrich.py), so nothing else has to download them again.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from http_fetch import make_session
+from metrics import METRICS
+from ratelimit import CLOCK, shared_limiter
+
+LIVENESS_WORKERS = int(os.environ.get("LIVENESS_WORKERS", "8"))
+LIVENESS_TIMEOUT = 15
+
+INACTIVE_MARKER = "Anuncio no disponible"
+# Signs that we got a challenge/interstitial instead of the listing itself
+BROWSER_MARKERS = ("cf-browser-verification", "challenge-platform", "captcha", "enable javascript")
+
+ACTIVE = "active"
+INACTIVE = "inactive"
+NEEDS_BROWSER = "needs_browser"
+
+
+def classify_page(status_code: int, text: str) -> str:
+    if INACTIVE_MARKER in text:
+        return INACTIVE
+    if status_code != 200:
+        return NEEDS_BROWSER
+    lowered = text.lower()
+    if any(marker in lowered for marker in BROWSER_MARKERS):
+        return NEEDS_BROWSER
+    return ACTIVE
+
+
+def check_links(links, workers=LIVENESS_WORKERS, limiter=None, session=None, timeout=LIVENESS_TIMEOUT,
+                on_page=None):
+    """
+    Return {link: ACTIVE | INACTIVE | NEEDS_BROWSER} using plain HTTP requests.
+    on_page(link, body) is called from the worker threads for every active page.
+    """
+    limiter = limiter or shared_limiter()
+    session = session or make_session(workers)
+
+    def check(link):
+        limiter.wait(link)
+        try:
+            with CLOCK.timing("network"), METRICS.timer("page_load_seconds", via="liveness"):
+                resp = session.get(link, timeout=timeout)
+        except requests.RequestException as e:
+            print(f"HTTP error {e.__class__.__name__} for {link}")
+            METRICS.error(e, "liveness", event=False)
+            status = NEEDS_BROWSER
+        else:
+            status = classify_page(resp.status_code, resp.text)
+            if status == ACTIVE and on_page is not None:
+                on_page(link, resp.content)
+        METRICS.inc("liveness_checks", via="http", status=status)
+        return link, status
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(pool.map(check, links))
+
+
+def check_with_browser(driver, link, timeout=LIVENESS_TIMEOUT, on_page=None):
+    """Load a single link in Selenium. Returns None if the browser errored out."""
+    from selenium.common import WebDriverException
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    try:
+        driver.get(link)
+        try:
+            with CLOCK.timing("page load"):
+                WebDriverWait(driver, timeout).until(lambda d: d.execute_script(
+                    "return document.readyState") == "complete")
+        except TimeoutException:
+            pass
+        html = driver.page_source
+        if INACTIVE_MARKER in html:
+            return INACTIVE
+        if on_page is not None:
+            on_page(link, html)
+        return ACTIVE
+    except (TimeoutException, WebDriverException) as e:
+        print(f"WebDriver error {e.__class__.__name__} for {link}: {e}")
+        return None
+
+
+def resolve_liveness(links, driver_pool=None, workers=LIVENESS_WORKERS, limiter=None, session=None,
+                     on_page=None):
+    """
+    Check every link over HTTP, then retry the unresolved ones with a driver
+    borrowed from the pool. Links that still can't be resolved are left out
+    of the result.
+    """
+    limiter = limiter or shared_limiter()
+    statuses = check_links(links, workers=workers, limiter=limiter, session=session, on_page=on_page)
+
+    fallback = [link for link, status in statuses.items() if status == NEEDS_BROWSER]
+    if not fallback:
+        return statuses
+
+    print(f"🌐 {len(fallback)} listings need a real browser")
+    if driver_pool is not None:
+        try:
+            with driver_pool.driver() as driver:
+                for link in fallback:
+                    limiter.wait(link)
+                    status = check_with_browser(driver, link, on_page=on_page)
+                    METRICS.inc("liveness_checks", via="browser", status=status or "error")
+                    if status is not None:
+                        statuses[link] = status
+        except RuntimeError as e:
+            print(f"⚠️ Skipping browser checks: {e}")
+            METRICS.error(e, "liveness")
+
+    return {link: status for link, status in statuses.items() if status != NEEDS_BROWSER}
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+On-disk spool for the report emails, and the sender that drains it.
+
+The scrape only writes its rendered report to MAIL_SPOOL_DIR and closes the
+browser; sending happens afterwards, and whatever doesn't go out then is
+retried by the next run or by cron:
+
+    python mail_spool.py            # send the messages that are due
+    python mail_spool.py --watch    # keep retrying until the spool is empty
+    python mail_spool.py --status
+
+Each pending message is one JSON file (subject, HTML and plain-text parts,
+report date, attempts, next attempt) named after its kind and report date.
+Spooling the same report again replaces the pending copy, and once a report
+date has been sent a marker in sent/ keeps it from going out twice. send_pending() sends every due
+message over one SMTP connection; a failed one waits MAIL_RETRY_SECONDS,
+doubling per attempt, and after MAIL_MAX_ATTEMPTS moves to failed/.
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import smtplib
+import ssl
+import time
+from datetime import date, datetime, timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formatdate, make_msgid
+
+from dotenv import load_dotenv
+
+from metrics import METRICS
+
+load_dotenv()
+
+MAIL_SPOOL_DIR = os.environ.get("MAIL_SPOOL_DIR", "spool/mail")
+SMTP_HOST = os.environ.get("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", "465"))
+# "ssl" (Gmail's port 465), "starttls", or "none" for a local relay
+SMTP_SECURITY = os.environ.get("SMTP_SECURITY", "ssl")
+SMTP_TIMEOUT = float(os.environ.get("SMTP_TIMEOUT", "30"))
+GMAIL_APP_PASSWORD = os.environ.get("GMAIL_APP_PASSWORD")
+MY_EMAIL = os.environ.get("MY_EMAIL")
+MAIL_MAX_ATTEMPTS = int(os.environ.get("MAIL_MAX_ATTEMPTS", "8"))
+MAIL_RETRY_SECONDS = int(os.environ.get("MAIL_RETRY_SECONDS", "60"))
+MAIL_RETRY_MAX = timedelta(hours=6)
+SENT_KEEP_DAYS = 30
+
+# The server refused this one message; anything else means the connection is gone
+_MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+def _dir(spool_dir, name):
+    path = os.path.join(spool_dir, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _write_json(path, data):
+    # Write-then-rename so the sender never reads a half-written message
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _read_json(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def spool_report(subject, html, report_date=None, kind="daily", text=None, resend=False,
+                 spool_dir=MAIL_SPOOL_DIR):
+    """
+    Queue a report (its HTML and optionally a plain-text part) for sending.
+    Returns its file, or None when this kind of report was already sent for
+    report_date (resend=True sends it anyway).
+    """
+    report_date = report_date or date.today()
+    key = f"{kind}-{report_date.isoformat()}"
+    if not resend and os.path.exists(os.path.join(_dir(spool_dir, "sent"), f"{key}.json")):
+        print(f"📭 The {kind} report for {report_date} was already sent; not spooling it again")
+        return None
+    now = datetime.now()
+    path = os.path.join(_dir(spool_dir, "pending"), f"{key}.json")
+    _write_json(path, {"key": key, "kind": kind, "report_date": report_date.isoformat(), "subject": subject,
+                       "html": html, "text": text, "spooled_at": now.isoformat(), "attempts": 0,
+                       "next_attempt_at": now.isoformat(), "last_error": None})
+    return path
+
+
+def pending_messages(spool_dir=MAIL_SPOOL_DIR):
+    """(path, message) for every spooled message, oldest report date first."""
+    pending = _dir(spool_dir, "pending")
+    messages = [(entry.path, _read_json(entry.path)) for entry in os.scandir(pending)
+                if entry.name.endswith(".json")]
+    return sorted(messages, key=lambda item: (item[1]["report_date"], item[1]["key"]))
+
+
+def build_message(message, sender=MY_EMAIL, recipient=MY_EMAIL):
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = message["subject"]
+    msg["From"] = sender
+    msg["To"] = recipient
+    msg["Date"] = formatdate(localtime=True)
+    msg["Message-ID"] = make_msgid(message["key"])
+    # Clients show the last alternative they can, so plain text goes first
+    if message.get("text"):
+        msg.attach(MIMEText(message["text"], "plain"))
+    msg.attach(MIMEText(message["html"], "html"))
+    return msg
+
+
+def connect(host=SMTP_HOST, port=SMTP_PORT, security=SMTP_SECURITY, user=MY_EMAIL, password=GMAIL_APP_PASSWORD,
+            timeout=SMTP_TIMEOUT):
+    """An SMTP connection, logged in when there's a password."""
+    if security == "ssl":
+        server = smtplib.SMTP_SSL(host, port, timeout=timeout, context=ssl.create_default_context())
+    else:
+        server = smtplib.SMTP(host, port, timeout=timeout)
+        if security == "starttls":
+            server.starttls(context=ssl.create_default_context())
+    try:
+        if password:
+            server.login(user, password)
+    except BaseException:
+        server.close()
+        raise
+    return server
+
+
+def retry_delay(attempts):
+    return min(timedelta(seconds=MAIL_RETRY_SECONDS * 2 ** (attempts - 1)), MAIL_RETRY_MAX)
+
+
+def _same_spooling(path, message):
+    """False if the message was spooled again while it was being sent."""
+    try:
+        return _read_json(path)["spooled_at"] == message["spooled_at"]
+    except FileNotFoundError:
+        return False
+
+
+def _mark_sent(spool_dir, path, message, now):
+    record = {name: message[name] for name in ("key", "kind", "report_date", "subject", "spooled_at")}
+    _write_json(os.path.join(_dir(spool_dir, "sent"), f"{message['key']}.json"),
+                dict(record, attempts=message["attempts"] + 1, sent_at=now.isoformat()))
+    if _same_spooling(path, message):
+        os.remove(path)
+
+
+def _defer(spool_dir, path, message, error, now):
+    """Count a failed attempt; reschedule with backoff, or give up into failed/. Returns True if it gave up."""
+    if not _same_spooling(path, message):
+        return False  # the newer copy keeps its own schedule
+    message = dict(message, attempts=message["attempts"] + 1, last_error=f"{type(error).__name__}: {error}")
+    if message["attempts"] >= MAIL_MAX_ATTEMPTS:
+        _write_json(os.path.join(_dir(spool_dir, "failed"), f"{message['key']}.json"), message)
+        os.remove(path)
+        print(f"❌ Gave up on '{message['subject']}' after {message['attempts']} attempts: {message['last_error']}")
+        return True
+    message["next_attempt_at"] = (now + retry_delay(message["attempts"])).isoformat()
+    _write_json(path, message)
+    print(f"⏳ '{message['subject']}' not sent ({message['last_error']}); retrying at {message['next_attempt_at']}")
+    return False
+
+
+def prune_sent(spool_dir=MAIL_SPOOL_DIR, keep_days=SENT_KEEP_DAYS):
+    cutoff = (date.today() - timedelta(days=keep_days)).isoformat()
+    for path, record in [(entry.path, _read_json(entry.path)) for entry in os.scandir(_dir(spool_dir, "sent"))
+                         if entry.name.endswith(".json")]:
+        if record["report_date"] < cutoff:
+            os.remove(path)
+
+
+def send_pending(spool_dir=MAIL_SPOOL_DIR, connect=connect, now=None):
+    """
+    Send every message that's due over one connection. Returns (sent,
+    deferred); both are 0 if another sender holds the spool.
+    """
+    os.makedirs(spool_dir, exist_ok=True)
+    lock = open(os.path.join(spool_dir, ".lock"), "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        print("📬 Another sender is draining the mail spool")
+        return 0, 0
+
+    with lock:
+        now = now or datetime.now()
+        due = [(path, message) for path, message in pending_messages(spool_dir)
+               if message["next_attempt_at"] <= now.isoformat()]
+        sent = deferred = 0
+        server = None
+        try:
+            for i, (path, message) in enumerate(due):
+                try:
+                    if server is None:
+                        server = connect()
+                    server.send_message(build_message(message))
+                except (smtplib.SMTPException, OSError) as e:
+                    if not isinstance(e, _MESSAGE_ERRORS):
+                        # No connection: the rest wait for the next attempt too
+                        for rest_path, rest in due[i:]:
+                            failed = _defer(spool_dir, rest_path, rest, e, now)
+                            METRICS.inc("emails", result="failed" if failed else "deferred")
+                        deferred += len(due) - i
+                        break
+                    failed = _defer(spool_dir, path, message, e, now)
+                    METRICS.inc("emails", result="failed" if failed else "deferred")
+                    deferred += 1
+                else:
+                    _mark_sent(spool_dir, path, message, now)
+                    METRICS.inc("emails", result="sent")
+                    sent += 1
+                    print(f"📧 Sent '{message['subject']}'")
+        finally:
+            if server is not None:
+                try:
+                    server.quit()
+                except (smtplib.SMTPException, OSError):
+                    server.close()
+        prune_sent(spool_dir)
+    return sent, deferred
+
+
+def next_attempt(spool_dir=MAIL_SPOOL_DIR):
+    """When the earliest pending message is due, or None with an empty spool."""
+    times = [message["next_attempt_at"] for _, message in pending_messages(spool_dir)]
+    return datetime.fromisoformat(min(times)) if times else None
+
+
+def watch(spool_dir=MAIL_SPOOL_DIR, connect=connect):
+    """Keep sending, sleeping until the next retry, until nothing is pending."""
+    while True:
+        send_pending(spool_dir, connect)
+        due = next_attempt(spool_dir)
+        if due is None:
+            return
+        time.sleep(max((due - datetime.now()).total_seconds(), 1))
+
+
+def print_status(spool_dir=MAIL_SPOOL_DIR):
+    pending = pending_messages(spool_dir)
+    for _, message in pending:
+        error = f"  last error: {message['last_error']}" if message["last_error"] else ""
+        print(f"⏳ {message['key']:<20} {message['attempts']} attempts, next {message['next_attempt_at'][:16]}{error}")
+    failed = [entry.name for entry in os.scandir(_dir(spool_dir, "failed")) if entry.name.endswith(".json")]
+    for name in sorted(failed):
+        print(f"❌ {name.removesuffix('.json')} gave up")
+    print(f"📬 {len(pending)} pending, {len(failed)} failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--spool-dir", default=MAIL_SPOOL_DIR)
+    parser.add_argument("--watch", action="store_true", help="keep retrying until nothing is pending")
+    parser.add_argument("--status", action="store_true", help="list pending and failed messages")
+    args = parser.parse_args()
+
+    if args.status:
+        print_status(args.spool_dir)
+    elif args.watch:
+        watch(args.spool_dir)
+    else:
+        sent, deferred = send_pending(args.spool_dir)
+        print(f"📬 {sent} sent, {deferred} deferred")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,311 +1,303 @@
-import os, time, random
-import undetected_chromedriver as uc
+"""
+Scraper entry point.
+
+    python main.py scrape          # search, save, check liveness, email the report
+    python main.py check-active    # only re-check which stored listings are still up
+    python main.py report [--weekly] [--print]
+
+Running without a subcommand does a `scrape`. Its report goes through the
+mail spool (mail_spool.py) and is sent once the browser is closed; with
+QUERY_SERVICE_URL set, a running query_service.py is then told to refresh.
+`report` renders today's report from the snapshot the scrape saved.
+
+Importing this module has no side effects; the heavy dependencies
+(selenium, undetected_chromedriver, pandas, the fuzzy matchers) are only
+imported by the subcommands that use them.
+"""
+
+import time
+
+_START = time.perf_counter()
+
+import argparse
+import os
+import sys
 from datetime import date
-from selenium.common import ElementNotInteractableException, WebDriverException
-from selenium.common.exceptions import TimeoutException
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as ec
-from bs4 import BeautifulSoup
-from fuzzywuzzy import fuzz
-from webdriver_manager.chrome import ChromeDriverManager
-from sqlalchemy import create_engine, select
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.exc import IntegrityError
-from models import CarListing, Base
-from email_report import summarize_today, send_email_report
-
-SEARCH_TERM = "Maverick"
-FUZZ_CUTOFF = 70
-HEADLESS = True
+from sqlalchemy import select
+from db import get_session
+from models import CarListing
+
+SEARCH_TERM = "Maverick"  # used when no SEARCH_SPECS file is configured
 DB_URL = os.environ.get("DB_URL", "sqlite:///mavericks.db")
+# "selenium" drives the search form in Chrome; "http" fetches result pages directly, but
+# its page parameter (http_fetch.PAGE_PARAM) hasn't been verified against the live site yet
+FETCH_MODE = os.environ.get("FETCH_MODE", "selenium")
+PARSER_BACKEND = os.environ.get("PARSER_BACKEND")  # "lxml" or "bs4"; defaults to lxml when installed
+BROWSER_POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", "1"))
+# "auto" scrapes incrementally and does a full sweep every FULL_SWEEP_DAYS
+SCRAPE_SWEEP = os.environ.get("SCRAPE_SWEEP", "auto")
+# Parse trim/VIN/seller from the detail pages the liveness check downloads anyway
+ENRICH_DETAILS = os.environ.get("ENRICH_DETAILS", "1") != "0"
+# Send the spooled report once the browser is closed; "0" leaves it to cron's `python mail_spool.py`
+MAIL_AFTER_RUN = os.environ.get("MAIL_AFTER_RUN", "1") != "0"
+# A running query_service.py to tell about the new data, e.g. http://127.0.0.1:8766
+QUERY_SERVICE_URL = os.environ.get("QUERY_SERVICE_URL")
 
-def get_cars_from_page(browser, scraped_cars):
-    soup = BeautifulSoup(browser.page_source, "html.parser")
-    car_rows = soup.find_all("tr", align="center", valign="middle")
-    for row in car_rows:
-        try:
-            listing_tag = row.select_one("span.Tahoma15blacknound")
-            listing = listing_tag.get_text(strip=True).replace("\xa0", " ") if listing_tag else ""
-            listing_lower = listing.lower()
-            if fuzz.partial_ratio(listing_lower, "maverick") < FUZZ_CUTOFF:
-                continue
-            is_hybrid = (fuzz.partial_ratio(listing_lower, "hybrid") >= FUZZ_CUTOFF or
-                         fuzz.partial_ratio(listing_lower, "híbrido") >= FUZZ_CUTOFF)
-            link_tag = row.select_one("a[href^='/UDTransDetail']")
-            link = "https://www.clasificadosonline.com" + link_tag["href"] if link_tag else ""
-            mileage_tag = row.select_one("span.Tahoma14DbluenoUnd")
-            mileage = mileage_tag.get_text(strip=True).replace("Millas", "").strip() if mileage_tag else ""
-            price_tag = row.select_one("span.Tahoma14BrownNound")
-            price = price_tag.get_text(strip=True) if price_tag else ""
-            
-            # Extract year from listing text (look for 4-digit years from 2019-2025)
-            import re
-            year_match = re.search(r'\b(201[9]|202[0-5])\b', listing)
-            year = year_match.group(1) if year_match else "Unknown"
-            
-            scraped_cars.append({
-                "listing": listing, "link": link, "mileage": mileage,
-                "price": price, "is_hybrid": is_hybrid, "year": year
-            })
-        except Exception as e:
-            print(f"Error parsing row: {e}")
+
+def get_cars_from_page(source, scraped_cars):
+    """Parse result rows from a live browser or from raw page HTML."""
+    from parsing import parse_cars
+
+    html = source if isinstance(source, (str, bytes)) else source.page_source
+    scraped_cars.extend(parse_cars(html, backend=PARSER_BACKEND))
     return scraped_cars
 
 
 def save_to_db(scraped_cars, db_url=DB_URL):
-    engine = create_engine(db_url)
-    Base.metadata.create_all(engine)
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    saved_count = skipped_count = 0
-    
-    for car in scraped_cars:
-        # Check if listing already exists
-        existing = session.query(CarListing).filter_by(link=car["link"]).first()
-        
-        if existing:
-            # Update existing record, but preserve manual price if no new price found
-            existing.listing = car["listing"]
-            existing.mileage = car["mileage"]
-            existing.is_hybrid = car["is_hybrid"]
-            existing.year = car["year"]
-            existing.still_available = True  # Mark as active since we found it
-            
-            # Only update price if we found a new one AND it's not manually set
-            if car["price"] and car["price"].strip():
-                if not existing.manual_price:  # Only update if not manually set
-                    existing.price = car["price"]
-                    print(f"🔄 Updated price for existing listing: {car['price']}")
-                else:
-                    print(f"� Skipped price update (manual entry): {existing.listing[:50]}...")
-            else:
-                print(f"💰 Preserved price for: {existing.listing[:50]}...")
-            
-            try:
-                session.commit()
-                skipped_count += 1  # Count as "skipped" since not new
-            except Exception as e:
-                session.rollback()
-                print(f"❌ Error updating {car['link']}: {e}")
-        else:
-            # Create new listing
-            listing = CarListing(
-                listing=car["listing"],
-                link=car["link"],
-                mileage=car["mileage"],
-                price=car["price"],
-                is_hybrid=car["is_hybrid"],
-                year=car["year"],
-                date_found=date.today()
-            )
-            try:
-                session.add(listing)
-                session.commit()
-                saved_count += 1
-            except IntegrityError:
-                session.rollback()
-                skipped_count += 1
-            except Exception as e:
-                session.rollback()
-                print(f"❌ Error saving {car['link']}: {e}")
-    
-    session.close()
+    from upsert import bulk_upsert_cars
+
+    with get_session(db_url) as session:
+        saved_count, skipped_count = bulk_upsert_cars(session, scraped_cars)
+
     print(f"✅ Saved {saved_count} new listings.")
     print(f"↪️ Updated {skipped_count} existing listings.")
     return saved_count, skipped_count
 
 
-def check_listing_is_active(db_url, driver):
-    engine = create_engine(db_url)
-    Session = sessionmaker(bind=engine)
+def check_listing_is_active(db_url, driver_pool, enrich=ENRICH_DETAILS, budget=None, check_all=False,
+                            detail_cache=None):
+    """
+    Re-check the listings due per recheck.py (all available ones with check_all) and flip removed ones.
+    detail_cache defaults to the DB's own enrich.detail_cache_dir().
+    """
+    from liveness import resolve_liveness, INACTIVE
+    from recheck import LIVENESS_BUDGET, bucket_intervals, print_intervals, schedule_checked, select_due
 
+    print("⏰ Checking and removing inactive listings...")
 
-    inactive_listings_removed = 0
+    with get_session(db_url) as session:
+        intervals = bucket_intervals(session)
+        print_intervals(intervals)
+        due = select_due(session, intervals, budget=LIVENESS_BUDGET if budget is None else budget,
+                         check_all=check_all)
 
-    print("⏰ Checking and removing inactive listings...")
+        enricher = None
+        if enrich:
+            from enrich import DetailCache, DetailEnricher, detail_cache_dir, load_detail_hashes
+            if detail_cache is None:
+                detail_cache = DetailCache(detail_cache_dir(db_url))
+            # Enrichment parses the same responses, so it costs no extra requests
+            enricher = DetailEnricher(detail_cache, load_detail_hashes(session))
 
-    with Session() as session:
-        cars = session.scalars(
-            select(CarListing).order_by(CarListing.id)).all()
-        for c in cars:
-            if not getattr(c, "still_available", False):
-                continue
-            try:
-                driver.get(c.link)
-                try:
-                    WebDriverWait(driver, 15).until(lambda d: d.execute_script(
-                        "return document.readyState") == "complete")
-                except TimeoutException:
-                    pass
-
-                page_source = driver.page_source
-                if "Anuncio no disponible" in page_source:
-                    c.still_available = False
-                    print(f"Removed {c.id} from the active listings.")
-                    inactive_listings_removed += 1
-                else:
-                    c.still_available = True
-
-            except (TimeoutException, WebDriverException) as e:
-                print(f"[{c.id}] WebDriver error {e.__class__.__name__}: {e}")
-
-            time.sleep(0.4)
+        statuses = resolve_liveness([listing.link for listing in due], driver_pool=driver_pool,
+                                    on_page=enricher)
 
+        removed_ids = [listing.id for listing in due if statuses.get(listing.link) == INACTIVE]
+        for car_id in removed_ids:
+            print(f"Removed {car_id} from the active listings.")
+
+        # One transaction for the flips and the new check times
+        scheduled = schedule_checked(session, due, statuses, intervals)
+        if enricher is not None:
+            enriched = enricher.write(session)
         session.commit()
 
-    print(f"✅ Removed {inactive_listings_removed} listings.")
+        if enricher is not None:
+            print(f"🔎 Enriched {enriched} listings from {enricher.seen} detail pages.")
+            # Only the page each listing was last parsed from is worth keeping; the cache root is this DB's own
+            keep = set(session.scalars(select(CarListing.detail_hash).where(CarListing.detail_hash.is_not(None))))
+            enricher.cache.prune(keep)
 
-    try:
-        driver.quit()
-    except Exception:
-        pass
+    inactive_listings_removed = len(removed_ids)
+    print(f"✅ Removed {inactive_listings_removed} listings ({len(scheduled)} of {len(due)} due listings resolved).")
 
     return inactive_listings_removed
 
 
-# ---- Enhanced Selenium setup for headless stealth ----
-def create_chrome_options():
-    """Create fresh Chrome options for each initialization attempt"""
-    chrome_opts = uc.ChromeOptions()
-    
-    # Basic headless configuration
-    if HEADLESS:
-        chrome_opts.add_argument("--headless=new")
-    
-    # Essential anti-detection options
-    chrome_opts.add_argument("--no-sandbox")
-    chrome_opts.add_argument("--disable-dev-shm-usage")
-    chrome_opts.add_argument("--disable-blink-features=AutomationControlled")
-    chrome_opts.add_argument("--window-size=1920,1080")
-    
-    # User agent
-    chrome_opts.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
-    
-    return chrome_opts
-
-# Initialize Chrome driver with automatic version management
-driver = None
-max_retries = 3
-
-for attempt in range(max_retries):
+def report_startup(command):
+    print(f"⏱️ Cold start for '{command}': {time.perf_counter() - _START:.2f}s")
+
+
+def send_spooled_mail():
+    """Drain the mail spool; a failure only leaves the reports spooled for the next try."""
+    from mail_spool import send_pending
+    from metrics import METRICS
+
+    try:
+        with METRICS.span("email"):
+            send_pending()
+    except Exception as e:
+        print(f"❌ Sending the spooled mail failed: {e}")
+        METRICS.error(e, "email")
+
+
+def refresh_query_service(url=QUERY_SERVICE_URL):
+    """Have the query service pick up this run's changes now rather than on its next poll."""
+    import json
+    from urllib.request import Request, urlopen
+
+    try:
+        with urlopen(Request(f"{url.rstrip('/')}/refresh", method="POST"), timeout=30) as response:
+            result = json.load(response)
+        print(f"🔎 Query service refreshed: {result['changed']} listings changed")
+    except OSError as e:
+        print(f"⚠️ Couldn't refresh the query service at {url}: {e}")
+
+
+def run_scrape(args):
+    from browser import DriverPool
+    from jobs import load_specs, run_jobs, print_job_report
+    from pipeline import PageWriter
+    from incremental import load_known_links, plan_sweeps, record_full_sweeps
+    from dedup import assign_vehicle_ids
+    from email_report import summarize_today
+    from mail_spool import spool_report
+    from metrics import METRICS
+    from ratelimit import CLOCK
+
+    report_startup("scrape")
+    if args.startup_only:
+        return
+
+    run_start = time.perf_counter()
+    driver_pool = DriverPool(size=BROWSER_POOL_SIZE)
     try:
-        print(f"🔧 Attempt {attempt + 1}: Initializing Chrome driver...")
-        
-        # Get the latest Chrome driver path
-        chrome_driver_path = ChromeDriverManager().install()
-        print(f"📍 Using ChromeDriver: {chrome_driver_path}")
-        
-        # Create fresh options for this attempt
-        chrome_opts = create_chrome_options()
-        
-        # Initialize with webdriver-manager path
-        driver = uc.Chrome(options=chrome_opts, driver_executable_path=chrome_driver_path)
-        print("✅ Chrome driver initialized successfully with webdriver-manager")
-        break
-        
+        specs = load_specs(default_term=SEARCH_TERM)
+        with get_session(args.db_url) as session:
+            plans = plan_sweeps(session, [spec.key for spec in specs], mode=args.sweep)
+            known = None
+            if not all(plan.full for plan in plans.values()):
+                known = load_known_links(session)
+                print(f"🗂️ {len(known)} known links loaded for the incremental cutoff")
+        # Pages are saved as they're parsed, so a crash keeps what was already scraped
+        writer = PageWriter(args.db_url)
+        with METRICS.span("search", jobs=len(specs)):
+            results = run_jobs(specs, fetch_mode=args.fetch_mode, driver_pool=driver_pool,
+                               parser_backend=PARSER_BACKEND, known=known, plans=plans, writer=writer)
+        print_job_report(results, unique_count=len(writer.seen))
+
+        print(f"🎯 Found {writer.stats.rows} total listings")
+        saved, skipped = writer.saved, writer.updated
+        print(f"✅ Saved {saved} new listings.")
+        print(f"↪️ Updated {skipped} existing listings.")
+        with get_session(args.db_url) as session:
+            record_full_sweeps(session, results)
+
+        with METRICS.span("liveness"):
+            inactive_listings = check_listing_is_active(args.db_url, driver_pool, budget=args.budget)
+
+        # After liveness, so today's listings already have their VINs
+        with METRICS.span("dedup"), get_session(args.db_url) as session:
+            assigned, reposts = assign_vehicle_ids(session)
+        print(f"🔁 {reposts} of {assigned} new listings are reposts of a known vehicle")
+
+        # Generate the report; it's sent from the spool once the browser is closed
+        with METRICS.span("report"):
+            html, text = summarize_today(writer.stats, inactive_listings, saved, skipped, args.db_url)
+        if spool_report(f"Maverick Daily Report – {date.today()}", html, text=text):
+            print("📥 Email report spooled")
+
     except Exception as e:
-        print(f"❌ Attempt {attempt + 1} failed: {e}")
-        if attempt < max_retries - 1:
-            print("🔄 Retrying with fresh options...")
-            time.sleep(2)
-        else:
-            print("💥 All attempts failed, exiting...")
-            exit(1)
-
-# Additional stealth measures after driver creation
-try:
-    driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-    driver.execute_cdp_cmd('Network.setUserAgentOverride', {
-        "userAgent": 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-    })
-    print("✅ Additional stealth measures applied")
-except Exception as e:
-    print(f"Warning: Could not set additional stealth measures: {e}")
-
-driver.set_page_load_timeout(45)
-wait = WebDriverWait(driver, 20)
-
-try:
-    # Add random delay before starting
-    time.sleep(random.uniform(2, 5))
-    
-    print("🌐 Navigating to Clasificados Online...")
-    driver.get("https://www.clasificadosonline.com/Transportation.asp")
-    
-    # Random delay to mimic human behavior
-    time.sleep(random.uniform(3, 6))
-    
-    search_field = wait.until(ec.element_to_be_clickable((By.XPATH, '//*[@id="Key"]')))
-    
-    # Type slowly like a human
-    print(f"🔍 Searching for '{SEARCH_TERM}'...")
-    for char in SEARCH_TERM:
-        search_field.send_keys(char)
-        time.sleep(random.uniform(0.1, 0.3))
-    
-    time.sleep(random.uniform(1, 2))
-    search_button = wait.until(ec.element_to_be_clickable((By.NAME, 'Submit2')))
-    search_button.click()
-    
-    # Wait for results with random delay
-    time.sleep(random.uniform(3, 5))
-    wait.until(ec.presence_of_element_located((By.CLASS_NAME, "Tahoma15blacknound")))
-
-    car_list = []
-    page_count = 1
-    print(f"📄 Scraping page {page_count}...")
-    get_cars_from_page(driver, car_list)
-    
-    while ec.presence_of_element_located((By.XPATH, '/html/body/table/tbody/tr/td/table[3]/tbody/tr[1]/td[2]/form[2]/div/table[1]/tbody/tr/td[3]/a')):
-        try:
-            # Random delay between pages
-            time.sleep(random.uniform(2, 4))
-            
-            next_button = wait.until(ec.element_to_be_clickable((By.XPATH, '/html/body/table/tbody/tr/td/table[3]/tbody/tr[1]/td[2]/form[2]/div/table[1]/tbody/tr/td[3]/a')))
-            
-            # Scroll to button to mimic human behavior
-            driver.execute_script("arguments[0].scrollIntoView(true);", next_button)
-            time.sleep(random.uniform(0.5, 1.5))
-            
-            next_button.click()
-            page_count += 1
-            print(f"📄 Scraping page {page_count}...")
-            
-            # Wait for new page to load
-            time.sleep(random.uniform(3, 5))
-            get_cars_from_page(driver, car_list)
-            
-        except ElementNotInteractableException:
-            print("📄 Reached last page")
-            get_cars_from_page(driver, car_list)
-            break
-        except TimeoutException:
-            print("⏰ Timeout waiting for next page button")
-            break
-
-    print(f"🎯 Found {len(car_list)} total listings")
-    saved, skipped = save_to_db(car_list, DB_URL)
-
-    inactive_listings = check_listing_is_active(DB_URL, driver)
-    print(f"Inactive listings type: {type(inactive_listings)}")
-    
-    # Generate and send report
-    html = summarize_today(car_list, inactive_listings, saved, skipped, DB_URL)
-    send_email_report(f"Maverick Daily Report – {date.today()}", html)
-    print("📧 Email report sent successfully")
-
-except TimeoutException as e:
-    print(f"⏰ Page timed out: {e}")
-except Exception as e:
-    print(f"❌ An error occurred: {e}")
-    import traceback
-    traceback.print_exc()
-
-finally:
+        print(f"❌ An error occurred: {e}")
+        METRICS.error(e, "run")
+        import traceback
+        traceback.print_exc()
+
+    finally:
+        driver_pool.close()
+        CLOCK.report(time.perf_counter() - run_start)
+        if MAIL_AFTER_RUN:
+            # Also retries reports earlier runs couldn't send
+            send_spooled_mail()
+        if QUERY_SERVICE_URL:
+            refresh_query_service()
+        METRICS.finish("scrape")
+
+
+def run_check_active(args):
+    from browser import DriverPool
+    from metrics import METRICS
+    from ratelimit import CLOCK
+
+    report_startup("check-active")
+    if args.startup_only:
+        return
+
+    run_start = time.perf_counter()
+    driver_pool = DriverPool(size=1)
     try:
-        if 'driver' in locals():
-            driver.quit()
-            print("🔚 Browser closed")
-    except Exception:
-        pass
+        with METRICS.span("liveness"):
+            check_listing_is_active(args.db_url, driver_pool, budget=args.budget, check_all=args.all)
+    finally:
+        driver_pool.close()
+        CLOCK.report(time.perf_counter() - run_start)
+        METRICS.finish("check-active")
+
+
+def run_report(args):
+    from email_report import render_snapshot, summarize_today, send_email_report, weekly_digest
+    from report_render import ReportWriter
+
+    report_startup("report")
+    if args.startup_only:
+        return
+
+    if args.weekly:
+        # Printing streams the digest straight to stdout
+        out = ReportWriter(html_out=sys.stdout) if args.print else ReportWriter()
+        weekly_digest(out, args.db_url, days=args.days)
+        if not args.print:
+            html, text = out.getvalue()
+            send_email_report(f"Maverick Weekly Digest – {date.today()}", html, text, kind="weekly")
+        return
+
+    report = render_snapshot(args.db_url)
+    if report is None:
+        print("📸 No report snapshot for today yet (the scrape writes one); reading the counts from cars")
+        report = summarize_today([], 0, 0, 0, args.db_url, write_snapshot=False)
+    html, text = report
+    if args.print:
+        print(html)
+    else:
+        send_email_report(f"Maverick Report – {date.today()}", html, text)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Clasificados Online scraper")
+    parser.add_argument("--db-url", default=DB_URL)
+    parser.add_argument("--startup-only", action="store_true",
+                        help="load the subcommand's dependencies, report the cold start and exit")
+    sub = parser.add_subparsers(dest="command")
+
+    scrape = sub.add_parser("scrape", help="search, save, check liveness and email the report")
+    scrape.add_argument("--fetch-mode", choices=("http", "selenium"), default=FETCH_MODE)
+    scrape.add_argument("--sweep", choices=("auto", "incremental", "full"), default=SCRAPE_SWEEP,
+                        help="incremental stops once result pages are all known listings; "
+                             "auto forces a full sweep every FULL_SWEEP_DAYS")
+    scrape.add_argument("--budget", type=int, help="max listings to re-check (default LIVENESS_BUDGET, 0 = all due)")
+    scrape.set_defaults(func=run_scrape)
+
+    check = sub.add_parser("check-active", help="re-check which stored listings are still up")
+    check.add_argument("--budget", type=int, help="max listings to re-check (default LIVENESS_BUDGET, 0 = all due)")
+    check.add_argument("--all", action="store_true", help="ignore the schedule and check every available listing")
+    check.set_defaults(func=run_check_active)
+
+    report = sub.add_parser("report", help="build the report from the DB and email it")
+    report.add_argument("--print", action="store_true", help="print the HTML instead of emailing it")
+    report.add_argument("--weekly", action="store_true", help="every listing found and price drop of the last days")
+    report.add_argument("--days", type=int, default=7, help="days the weekly digest covers")
+    report.set_defaults(func=run_report)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        # Plain `python main.py` (the cron job) keeps doing a full scrape
+        args = parser.parse_args([*(argv if argv is not None else sys.argv[1:]), "scrape"])
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Batched listing title classifier.
+
+A ListingMatcher is built once from a vocabulary of model names and attribute
+keywords, then tags a whole page of titles per call:
+
+- exact substring hits are found for every keyword with one compiled regex
+  pass per title
+- only titles without an exact hit are scored, with rapidfuzz's cdist over
+  the whole batch at once
+- trims and drivetrains are short codes ("xl", "awd") that fuzzy scoring
+  can't tell apart, so they only match as whole words
+
+With legacy_compat (the default), fuzzy-only hits are confirmed with
+fuzzywuzzy's partial_ratio so keep/is_hybrid decisions match the original
+per-row checks. Run `python matcher.py --verify` to compare against the
+is_hybrid values already stored in the database.
+"""
+
+import os
+import re
+
+from rapidfuzz import fuzz, process
+
+FUZZ_CUTOFF = 70
+DEFAULT_MODELS = ("maverick",)
+HYBRID_TERMS = ("hybrid", "híbrido")
+TRIMS = ("xl", "xlt", "lariat", "tremor", "first edition")
+DRIVETRAINS = ("awd", "fwd", "4x4", "4wd")
+
+
+def _alternation(terms, word_bounded=False):
+    # Longest first so "xlt" wins over "xl"
+    body = "|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True))
+    return re.compile(rf"\b(?:{body})\b" if word_bounded else f"(?:{body})")
+
+
+class ListingMatcher:
+    def __init__(self, models=DEFAULT_MODELS, hybrid_terms=HYBRID_TERMS, trims=TRIMS,
+                 drivetrains=DRIVETRAINS, cutoff=FUZZ_CUTOFF, legacy_compat=True):
+        self.models = [m.lower() for m in models]
+        self.hybrid_terms = [h.lower() for h in hybrid_terms]
+        self.cutoff = cutoff
+        self.legacy_compat = legacy_compat
+        self._model_re = _alternation(self.models)
+        self._hybrid_re = _alternation(self.hybrid_terms)
+        self._trim_re = _alternation([t.lower() for t in trims], word_bounded=True)
+        self._drive_re = _alternation([d.lower() for d in drivetrains], word_bounded=True)
+
+    def _fuzzy_hits(self, titles, idxs, choices):
+        """Map title index -> best matching choice for titles scoring >= cutoff once rounded."""
+        if not idxs:
+            return {}
+        # fuzzywuzzy rounds to an int before comparing, so 69.5 already counts as 70
+        floor = self.cutoff - 0.5
+        scores = process.cdist([titles[i] for i in idxs], choices,
+                               scorer=fuzz.partial_ratio, score_cutoff=floor)
+        hits = {}
+        for row, i in zip(scores, idxs):
+            best = int(row.argmax())
+            if row[best] >= floor and self._confirm(titles[i], choices, row, floor):
+                hits[i] = choices[best]
+        return hits
+
+    def _confirm(self, title, choices, row, floor):
+        if not self.legacy_compat:
+            return True
+        # rapidfuzz never scores below fuzzywuzzy, so only its hits need a second look
+        from fuzzywuzzy import fuzz as legacy_fuzz
+        return any(legacy_fuzz.partial_ratio(title, choice) >= self.cutoff
+                   for choice, score in zip(choices, row) if score >= floor)
+
+    def classify(self, titles):
+        """
+        Tag a batch of titles. Returns one entry per title: None when no model
+        matched, otherwise {"model", "is_hybrid", "trim", "drivetrain"}.
+        """
+        lowered = [t.lower() for t in titles]
+
+        models = {}
+        for i, title in enumerate(lowered):
+            m = self._model_re.search(title)
+            if m:
+                models[i] = m.group(0)
+        models.update(self._fuzzy_hits(
+            lowered, [i for i in range(len(lowered)) if i not in models], self.models))
+
+        hybrid = {i for i in models if self._hybrid_re.search(lowered[i])}
+        hybrid.update(self._fuzzy_hits(
+            lowered, [i for i in models if i not in hybrid], self.hybrid_terms))
+
+        tags = [None] * len(titles)
+        for i, model in models.items():
+            trim = self._trim_re.search(lowered[i])
+            drive = self._drive_re.search(lowered[i])
+            tags[i] = {
+                "model": model,
+                "is_hybrid": i in hybrid,
+                "trim": trim.group(0) if trim else None,
+                "drivetrain": drive.group(0) if drive else None,
+            }
+        return tags
+
+
+def verify_against_db(db_url, matcher=None):
+    """Reclassify stored listings and report rows whose is_hybrid would change."""
+    from sqlalchemy import select
+    from db import get_session
+    from models import CarListing
+
+    matcher = matcher or ListingMatcher()
+    with get_session(db_url) as session:
+        rows = session.execute(select(CarListing.id, CarListing.listing, CarListing.is_hybrid)).all()
+
+    tags = matcher.classify([listing or "" for _, listing, _ in rows])
+    mismatches = [(car_id, listing) for (car_id, listing, is_hybrid), tag in zip(rows, tags)
+                  if tag is None or tag["is_hybrid"] != bool(is_hybrid)]
+    print(f"🔎 Checked {len(rows)} listings, {len(mismatches)} mismatches")
+    for car_id, listing in mismatches[:20]:
+        print(f"  {car_id}: {listing}")
+    return mismatches
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--verify" in sys.argv:
+        verify_against_db(os.environ.get("DB_URL", "sqlite:///mavericks.db"))
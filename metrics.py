@@ -0,0 +1,202 @@
+"""
+Run metrics: timing spans, counters and latency histograms.
+
+    from metrics import METRICS
+
+    with METRICS.span("liveness"):
+        ...
+    METRICS.inc("pages", mode="http")
+    with METRICS.timer("db_commit_seconds"):
+        session.commit()
+
+Spans and errors are appended as JSON lines to METRICS_EVENTS as they
+happen; at the end of a run finish() writes every counter and histogram to
+METRICS_TEXTFILE in Prometheus textfile format (for node_exporter's textfile
+collector). Updates are a dict lookup under a lock, so it stays on in
+production. Set either path to an empty string to turn that output off.
+"""
+
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+METRICS_EVENTS = os.environ.get("METRICS_EVENTS", "logs/metrics.jsonl")
+METRICS_TEXTFILE = os.environ.get("METRICS_TEXTFILE", "logs/scraper.prom")
+PREFIX = "scraper"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+EVENT_BUFFER = 100  # events held in memory before they're appended to the file
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.counts):
+            self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for le, n in zip(self.buckets, self.counts):
+            total += n
+            yield le, total
+
+
+class Metrics:
+    def __init__(self, events_path=METRICS_EVENTS):
+        self.events_path = events_path
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started = time.time()
+        self.counters = {}
+        self.histograms = {}
+        self._events = []
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram()
+            hist.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the block's duration in histogram `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def error(self, exc, stage, event=True):
+        """Count exc by class; event=False skips the JSON line for errors that happen per item."""
+        # Count an exception once, at the innermost stage that saw it
+        if getattr(exc, "_metrics_counted", False):
+            return
+        try:
+            exc._metrics_counted = True
+        except AttributeError:
+            pass
+        self.inc("errors", stage=stage, type=exc.__class__.__name__)
+        if event:
+            self.event("error", stage=stage, type=exc.__class__.__name__, message=str(exc)[:300])
+
+    @contextmanager
+    def span(self, stage, **fields):
+        """
+        Time a stage: a stage_seconds observation plus a JSON-lines event.
+        `fields` only go into the event, so they can be as specific as needed.
+        """
+        start = time.perf_counter()
+        ok = True
+        try:
+            yield
+        except Exception as e:
+            ok = False
+            self.error(e, stage)
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe("stage_seconds", seconds, stage=stage)
+            self.event("span", stage=stage, seconds=round(seconds, 4), ok=ok, **fields)
+
+    def event(self, kind, **fields):
+        if not self.events_path:
+            return
+        record = {"ts": datetime.now().isoformat(timespec="milliseconds"), "run": self.run_id,
+                  "event": kind, **fields}
+        with self._lock:
+            self._events.append(json.dumps(record, default=str, ensure_ascii=False))
+            full = len(self._events) >= EVENT_BUFFER
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            lines, self._events = self._events, []
+        if not lines or not self.events_path:
+            return
+        os.makedirs(os.path.dirname(self.events_path) or ".", exist_ok=True)
+        with open(self.events_path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def textfile(self):
+        """Every counter and histogram in Prometheus text exposition format."""
+        out = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items())
+
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f"{PREFIX}_{name}_total"
+            if metric not in typed:
+                typed.add(metric)
+                out.append(f"# TYPE {metric} counter")
+            out.append(f"{metric}{_label_text(labels)} {value}")
+
+        for (name, labels), hist in histograms:
+            metric = f"{PREFIX}_{name}"
+            if metric not in typed:
+                typed.add(metric)
+                out.append(f"# TYPE {metric} histogram")
+            for le, count in hist.cumulative():
+                out.append(f"{metric}_bucket{_label_text(labels + (('le', str(le)),))} {count}")
+            out.append(f"{metric}_bucket{_label_text(labels + (('le', '+Inf'),))} {hist.count}")
+            out.append(f"{metric}_sum{_label_text(labels)} {hist.sum:.6f}")
+            out.append(f"{metric}_count{_label_text(labels)} {hist.count}")
+
+        out.append(f"# TYPE {PREFIX}_run_duration_seconds gauge")
+        out.append(f"{PREFIX}_run_duration_seconds {time.time() - self.started:.3f}")
+        out.append(f"# TYPE {PREFIX}_last_run_timestamp_seconds gauge")
+        out.append(f"{PREFIX}_last_run_timestamp_seconds {time.time():.0f}")
+        return "\n".join(out) + "\n"
+
+    def finish(self, command, textfile_path=METRICS_TEXTFILE):
+        """End-of-run summary: a run event, the buffered events and the textfile."""
+        self.event("run", command=command, seconds=round(time.time() - self.started, 3),
+                   counters={f"{n}{_label_text(l)}": v for (n, l), v in sorted(self.counters.items())})
+        self.flush()
+        if textfile_path:
+            os.makedirs(os.path.dirname(textfile_path) or ".", exist_ok=True)
+            # Write-then-rename so the collector never reads a half-written file
+            tmp = f"{textfile_path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(self.textfile())
+            os.replace(tmp, textfile_path)
+
+
+METRICS = Metrics()
+atexit.register(METRICS.flush)
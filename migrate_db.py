@@ -1,76 +1,251 @@
 #!/usr/bin/env python3
 """
-Database migration script to add missing columns to existing database.
-Run this once to update your existing database schema.
+Versioned schema migrations for existing databases.
+
+MIGRATIONS is an ordered list of numbered steps and the schema_version table
+records which ones a database has had, so each run only applies new ones:
+
+    python migrate_db.py            # apply pending migrations
+    python migrate_db.py --status   # list migrations and which are applied
+    python migrate_db.py --refresh-numeric   # re-derive price_num etc. after hand edits
+
+Every step checks before it changes anything, since a database may predate
+this runner or have been made by get_engine's create_all. Backfills walk
+cars in id order, BACKFILL_CHUNK rows per transaction, so the cron scraper
+can keep writing while they run, and only write rows whose value changes.
+Each chunk saves its position together with its changes: an interrupted
+backfill resumes where it stopped. Values come from normalize.py, the same
+functions ingest uses.
+
+Migrations run once, so --refresh-numeric is the re-runnable way to pick up
+prices edited by hand in the database: it walks every row the same way, but
+records nothing in schema_version.
 """
 
+import argparse
 import os
-from sqlalchemy import create_engine, text
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable
+
 from dotenv import load_dotenv
+from sqlalchemy import func, insert, inspect, select, text, update
+
+from db import get_engine
+from history import record_events, seed_events
+from models import CarDeletion, CarListing, ListingEvent, ReportSnapshot, SchemaVersion, ScrapeCheckpoint, SearchState
+from normalize import UNKNOWN_YEAR, listing_year, numeric_columns
 
 load_dotenv()
 
 DB_URL = os.environ.get("DB_URL", "sqlite:///mavericks.db")
+BACKFILL_CHUNK = int(os.environ.get("BACKFILL_CHUNK", "2000"))
+PROGRESS_SECONDS = 5
+
+
+@dataclass
+class Migration:
+    version: int | None  # None: a re-runnable pass, not recorded in schema_version
+    name: str
+    apply: Callable | None = None  # apply(conn): schema changes
+    columns: tuple = ()  # cars columns a backfill reads, id first...
+    backfill: Callable | None = None  # ...backfill(conn, rows) per chunk of them
+    needed: Callable | None = None  # needed(conn) -> False to skip the backfill on this database
+
+
+def add_columns(table, *columns):
+    """apply step: ALTER TABLE ADD COLUMN for each (name, sql type) the table doesn't have yet."""
+    def apply(conn):
+        existing = {column["name"] for column in inspect(conn).get_columns(table)}
+        for name, sql_type in columns:
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {sql_type}"))
+                print(f"   added {table}.{name}")
+    return apply
+
+
+def create_tables(*models):
+    def apply(conn):
+        for model in models:
+            model.__table__.create(conn, checkfirst=True)
+    return apply
+
+
+def create_indexes(conn):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_cars_hybrid_available_price "
+                      "ON cars (is_hybrid, still_available, price_num)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_cars_hybrid_date_found_cover "
+                      "ON cars (is_hybrid, date_found, still_available, price_num)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_cars_available_next_check "
+                      "ON cars (still_available, next_check_at)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_cars_year_mileage ON cars (year_num, mileage_num)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_cars_vin ON cars (vin)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_cars_vehicle ON cars (vehicle_id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_cars_updated_at ON cars (updated_at)"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_cars_hybrid_date_found"))
+
+
+def backfill_year(conn, rows):
+    """cars.year from the listing title where it's missing, as parse_cars does at ingest."""
+    changed = [{"id": car_id, "year": listing_year(listing)} for car_id, listing, year in rows
+               if year in (None, UNKNOWN_YEAR) and listing_year(listing) != year]
+    if changed:
+        conn.execute(text("UPDATE cars SET year = :year WHERE id = :id"), changed)
+    return len(changed)
+
+
+def backfill_numeric(conn, rows):
+    """price_num/mileage_num/year_num from the scraped strings, as bulk_upsert_cars does at ingest."""
+    changed = []
+    for car_id, price, mileage, year, *stored in rows:
+        values = numeric_columns(price, mileage, year)
+        if list(values.values()) != stored:
+            changed.append(dict(values, id=car_id))
+    if changed:
+        conn.execute(text("UPDATE cars SET price_num = :price_num, mileage_num = :mileage_num, "
+                          "year_num = :year_num WHERE id = :id"), changed)
+    return len(changed)
+
+
+NUMERIC_COLUMNS = (CarListing.id, CarListing.price, CarListing.mileage, CarListing.year,
+                   CarListing.price_num, CarListing.mileage_num, CarListing.year_num)
+
+
+def backfill_listed_events(conn, rows):
+    return record_events(conn, seed_events(rows))
+
+
+def no_events_yet(conn):
+    # Once the scraper has written events itself, seeding would duplicate its 'listed' ones
+    return conn.scalar(select(ListingEvent.id).limit(1)) is None
 
-def migrate_database():
-    engine = create_engine(DB_URL)
-    
+
+MIGRATIONS = [
+    Migration(1, "cars table", apply=create_tables(CarListing)),
+    Migration(2, "still_available, manual_price and year columns", apply=add_columns(
+        "cars", ("still_available", "BOOLEAN DEFAULT 1"), ("manual_price", "BOOLEAN DEFAULT 0"),
+        ("year", f"TEXT DEFAULT '{UNKNOWN_YEAR}'"))),
+    Migration(3, "backfill year from listing titles",
+              columns=(CarListing.id, CarListing.listing, CarListing.year), backfill=backfill_year),
+    Migration(4, "integer price/mileage/year columns", apply=add_columns(
+        "cars", ("price_num", "INTEGER"), ("mileage_num", "INTEGER"), ("year_num", "INTEGER"))),
+    Migration(5, "backfill integer price/mileage/year", columns=NUMERIC_COLUMNS, backfill=backfill_numeric),
+    Migration(6, "detail page, re-check, vehicle and updated_at columns", apply=add_columns(
+        "cars", ("trim", "TEXT"), ("vin", "TEXT"), ("seller_type", "TEXT"), ("detail_year", "INTEGER"),
+        ("detail_hash", "TEXT"), ("last_checked_at", "DATETIME"), ("next_check_at", "DATETIME"),
+        ("vehicle_id", "INTEGER"), ("updated_at", "DATETIME"))),
+    Migration(7, "report and lookup indexes", apply=create_indexes),
+    Migration(8, "report_snapshot, search_state and scrape_checkpoint tables",
+              apply=create_tables(ReportSnapshot, SearchState, ScrapeCheckpoint)),
+    Migration(9, "listing_events table", apply=create_tables(ListingEvent)),
+    Migration(10, "seed listed events for existing listings",
+              columns=(CarListing.id, CarListing.date_found, CarListing.price_num, CarListing.mileage_num),
+              backfill=backfill_listed_events, needed=no_events_yet),
+    # Creating the table installs the updated_at and tombstone triggers (see models.CHANGE_TRIGGERS)
+    Migration(11, "cars_deleted table and change-tracking triggers", apply=create_tables(CarDeletion)),
+]
+
+
+def _set_progress(conn, version, **values):
+    conn.execute(update(SchemaVersion).where(SchemaVersion.version == version).values(**values))
+
+
+def run_backfill(conn, migration, last_id, chunk_size=BACKFILL_CHUNK):
+    """Run migration.backfill over cars rows after last_id, committing each chunk with its position."""
+    total = conn.scalar(select(func.count()).select_from(CarListing).where(CarListing.id > last_id))
+    done = changed = 0
+    reported = time.monotonic()
+    while True:
+        rows = conn.execute(select(*migration.columns).where(CarListing.id > last_id)
+                            .order_by(CarListing.id).limit(chunk_size)).all()
+        if not rows:
+            break
+        changed += migration.backfill(conn, rows)
+        last_id = rows[-1][0]
+        if migration.version is not None:
+            _set_progress(conn, migration.version, last_id=last_id)
+        conn.commit()
+        done += len(rows)
+        if time.monotonic() - reported >= PROGRESS_SECONDS:
+            print(f"   ...{done:,}/{total:,} rows")
+            reported = time.monotonic()
+    print(f"   {changed:,} of {done:,} rows changed")
+
+
+def run_migrations(engine, migrations=MIGRATIONS):
+    """Apply the migrations this database doesn't have yet, in order. Returns how many ran."""
+    SchemaVersion.__table__.create(engine, checkfirst=True)
+    ran = 0
     with engine.connect() as conn:
-        # Check if still_available column exists
-        try:
-            conn.execute(text("SELECT still_available FROM cars LIMIT 1"))
-            print("✅ 'still_available' column already exists")
-        except Exception:
-            print("Adding 'still_available' column...")
-            conn.execute(text("ALTER TABLE cars ADD COLUMN still_available BOOLEAN DEFAULT 1"))
-            conn.commit()
-            print("✅ Added 'still_available' column")
-            
-            # Set all existing records to available (True)
-            result = conn.execute(text("UPDATE cars SET still_available = 1 WHERE still_available IS NULL"))
+        state = {row.version: row for row in conn.execute(select(SchemaVersion.__table__))}
+        for migration in migrations:
+            row = state.get(migration.version)
+            if row is not None and row.applied_at is not None:
+                continue
+            if row is None:
+                print(f"🔄 {migration.version:>3}: {migration.name}")
+                conn.execute(insert(SchemaVersion).values(
+                    version=migration.version, name=migration.name, started_at=datetime.now(), last_id=0))
+            else:
+                print(f"🔄 {migration.version:>3}: {migration.name} (resuming)")
+            if migration.apply:
+                migration.apply(conn)
             conn.commit()
-            print(f"✅ Set {result.rowcount} existing records to still_available = True")
-        
-        # Check if manual_price column exists
-        try:
-            conn.execute(text("SELECT manual_price FROM cars LIMIT 1"))
-            print("✅ 'manual_price' column already exists")
-        except Exception:
-            print("Adding 'manual_price' column...")
-            conn.execute(text("ALTER TABLE cars ADD COLUMN manual_price BOOLEAN DEFAULT 0"))
+            if migration.backfill:
+                if row is None and migration.needed and not migration.needed(conn):
+                    print("   not needed here")
+                else:
+                    run_backfill(conn, migration, row.last_id if row is not None else 0)
+            _set_progress(conn, migration.version, applied_at=datetime.now())
             conn.commit()
-            print("✅ Added 'manual_price' column")
-        
-        # Check if year column exists
-        try:
-            conn.execute(text("SELECT year FROM cars LIMIT 1"))
-            print("✅ 'year' column already exists")
-        except Exception:
-            print("Adding 'year' column...")
-            conn.execute(text("ALTER TABLE cars ADD COLUMN year TEXT DEFAULT 'Unknown'"))
-            conn.commit()
-            print("✅ Added 'year' column")
-        
-        # Update existing records with extracted years if needed
-        print("Updating existing records with year information...")
-        result = conn.execute(text("""
-            UPDATE cars 
-            SET year = CASE 
-                WHEN listing LIKE '%2019%' THEN '2019'
-                WHEN listing LIKE '%2020%' THEN '2020'
-                WHEN listing LIKE '%2021%' THEN '2021'
-                WHEN listing LIKE '%2022%' THEN '2022'
-                WHEN listing LIKE '%2023%' THEN '2023'
-                WHEN listing LIKE '%2024%' THEN '2024'
-                WHEN listing LIKE '%2025%' THEN '2025'
-                ELSE 'Unknown'
-            END
-            WHERE year IS NULL OR year = 'Unknown'
-        """))
-        conn.commit()
-        print(f"✅ Updated {result.rowcount} records with year information")
+            ran += 1
+    return ran
 
-if __name__ == "__main__":
+
+def refresh_numeric(engine):
+    """Re-derive the *_num columns on every row, e.g. after prices were edited by hand; safe to re-run."""
+    with engine.connect() as conn:
+        run_backfill(conn, Migration(None, "refresh integer price/mileage/year", columns=NUMERIC_COLUMNS,
+                                     backfill=backfill_numeric), last_id=0)
+
+
+def print_status(engine, migrations=MIGRATIONS):
+    SchemaVersion.__table__.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        state = {row.version: row for row in conn.execute(select(SchemaVersion.__table__))}
+    for migration in migrations:
+        row = state.get(migration.version)
+        if row is None:
+            status = "pending"
+        elif row.applied_at is None:
+            status = f"interrupted after id {row.last_id}"
+        else:
+            status = f"applied {row.applied_at:%Y-%m-%d %H:%M}"
+        print(f"{migration.version:>3}  {migration.name:<58} {status}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db-url", default=DB_URL)
+    parser.add_argument("--status", action="store_true", help="list migrations instead of applying them")
+    parser.add_argument("--refresh-numeric", action="store_true",
+                        help="re-derive price_num/mileage_num/year_num from the text columns on every row")
+    args = parser.parse_args()
+
+    # This script manages the schema itself, so skip the registry's create_all
+    engine = get_engine(args.db_url, create_tables=False)
+    if args.status:
+        print_status(engine)
+        return
+    if args.refresh_numeric:
+        print("🔄 Refreshing integer price/mileage/year columns...")
+        refresh_numeric(engine)
+        return
     print("🔄 Starting database migration...")
-    migrate_database()
-    print("🎉 Database migration completed!")
+    ran = run_migrations(engine)
+    print(f"🎉 Database migration completed! ({ran} applied)" if ran else "✅ Database is up to date")
+
+
+if __name__ == "__main__":
+    main()
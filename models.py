@@ -1,6 +1,6 @@
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import Column, Integer, String, Boolean, Date
-from datetime import date
+from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, Index, DDL, event
+from datetime import date, datetime
 
 Base = declarative_base()
 
@@ -16,6 +16,35 @@ class CarListing(Base):
     still_available = Column(Boolean, default=True)
     year = Column(String)  # Add year field
     manual_price = Column(Boolean, default=False)  # Track manual price entries
+    # Integer versions of price/mileage/year, parsed at ingest (see normalize.py)
+    price_num = Column(Integer)
+    mileage_num = Column(Integer)
+    year_num = Column(Integer)
+    # From the listing's detail page (see enrich.py)
+    trim = Column(String)
+    vin = Column(String)
+    seller_type = Column(String)  # "dealer" or "private"
+    detail_year = Column(Integer)
+    detail_hash = Column(String)  # sha256 of the last detail page parsed
+    # Liveness re-check schedule (see recheck.py)
+    last_checked_at = Column(DateTime)
+    next_check_at = Column(DateTime)
+    # Lowest cars.id among reposts of the same truck (see dedup.py)
+    vehicle_id = Column(Integer)
+    # Set on every insert/update through SQLAlchemy; sync.py exports rows changed since its watermark
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    __table_args__ = (
+        Index("ix_cars_hybrid_available_price", "is_hybrid", "still_available", "price_num"),
+        # Trailing columns make it covering for the single-pass report counts
+        Index("ix_cars_hybrid_date_found_cover", "is_hybrid", "date_found", "still_available", "price_num"),
+        Index("ix_cars_available_next_check", "still_available", "next_check_at"),
+        # Repost detection blocks and lookups
+        Index("ix_cars_year_mileage", "year_num", "mileage_num"),
+        Index("ix_cars_vin", "vin"),
+        Index("ix_cars_vehicle", "vehicle_id"),
+        Index("ix_cars_updated_at", "updated_at"),
+    )
     
     @property
     def days_listed(self):
@@ -23,3 +52,110 @@ class CarListing(Base):
         if self.date_found:
             return (date.today() - self.date_found).days
         return 0
+
+
+class ReportSnapshot(Base):
+    """Report numbers for one day, written at the end of each run."""
+    __tablename__ = 'report_snapshot'
+    id = Column(Integer, primary_key=True)
+    report_date = Column(Date, unique=True, nullable=False)
+    total_listings = Column(Integer, default=0)
+    available_listings = Column(Integer, default=0)
+    hybrids_total = Column(Integer, default=0)
+    aged_hybrids = Column(Integer, default=0)
+    aged_under_cap = Column(Integer, default=0)
+    saved_today = Column(Integer, default=0)
+    updated_today = Column(Integer, default=0)
+    removed_today = Column(Integer, default=0)
+    hybrids_found_today = Column(Integer, default=0)
+    cheapest_hybrid_today = Column(Integer)  # price_num of today's cheapest hybrid
+    price_cap = Column(Integer)
+    aged_days = Column(Integer)
+    created_at = Column(DateTime, default=datetime.now)
+
+
+class ListingEvent(Base):
+    """
+    Append-only change log for cars rows (see history.py). A row is written
+    only when a listing appears, reappears, disappears or changes price or
+    mileage, with the new and previous values of whatever changed.
+    """
+    __tablename__ = 'listing_events'
+    id = Column(Integer, primary_key=True)
+    listing_id = Column(Integer, nullable=False)  # cars.id
+    observed_at = Column(DateTime, nullable=False)
+    event = Column(String, nullable=False)  # listed, price, mileage, removed, relisted
+    price_num = Column(Integer)
+    prev_price_num = Column(Integer)
+    mileage_num = Column(Integer)
+    prev_mileage_num = Column(Integer)
+
+    __table_args__ = (
+        Index("ix_listing_events_listing_observed", "listing_id", "observed_at"),
+        Index("ix_listing_events_event_observed", "event", "observed_at"),
+    )
+
+
+class SearchState(Base):
+    """Per-search bookkeeping for incremental scraping (see incremental.py)."""
+    __tablename__ = 'search_state'
+    search_key = Column(String, primary_key=True)
+    last_full_sweep = Column(Date)
+    last_full_pages = Column(Integer)  # result pages seen on that sweep
+
+
+class ScrapeCheckpoint(Base):
+    """Last page of a search saved today, so a crashed run can pick up after it."""
+    __tablename__ = 'scrape_checkpoint'
+    search_key = Column(String, primary_key=True)
+    term = Column(String)
+    page = Column(Integer, default=0)
+    last_link = Column(String)
+    run_date = Column(Date)
+    finished = Column(Boolean, default=False)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+class CarDeletion(Base):
+    """Tombstone for a deleted cars row, written by a trigger so sync.py can delete it on replicas too."""
+    __tablename__ = 'cars_deleted'
+    id = Column(Integer, primary_key=True)
+    car_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime)
+
+
+# SQLite's now, in the format SQLAlchemy stores DateTime in (%% is a literal %)
+_SQLITE_NOW = "strftime('%%Y-%%m-%%d %%H:%%M:%%f', 'now', 'localtime') || '000'"
+# updated_at is otherwise only set by SQLAlchemy, so hand edits and raw SQL
+# updates would never reach a replica; deletes leave a tombstone
+CHANGE_TRIGGERS = (
+    DDL(f"""CREATE TRIGGER IF NOT EXISTS cars_touch_updated_at AFTER UPDATE ON cars
+FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+BEGIN UPDATE cars SET updated_at = {_SQLITE_NOW} WHERE id = NEW.id; END"""),
+    DDL(f"""CREATE TRIGGER IF NOT EXISTS cars_record_delete AFTER DELETE ON cars
+FOR EACH ROW BEGIN INSERT INTO cars_deleted (car_id, deleted_at) VALUES (OLD.id, {_SQLITE_NOW}); END"""),
+)
+for _trigger in CHANGE_TRIGGERS:
+    event.listen(CarDeletion.__table__, "after_create", _trigger.execute_if(dialect="sqlite"))
+
+
+class SyncState(Base):
+    """On a replica made by sync.py: how far it's up to date with its source (one row)."""
+    __tablename__ = 'sync_state'
+    id = Column(Integer, primary_key=True)
+    cars_updated_at = Column(DateTime)  # latest cars.updated_at applied
+    cars_id = Column(Integer, default=0)  # highest cars.id applied
+    event_id = Column(Integer, default=0)  # highest listing_events.id applied
+    report_date = Column(Date)  # latest report_snapshot.report_date applied
+    deleted_id = Column(Integer, default=0)  # highest cars_deleted.id applied
+    synced_at = Column(DateTime)
+
+
+class SchemaVersion(Base):
+    """Migrations applied to this database (see migrate_db.py), with backfill progress."""
+    __tablename__ = 'schema_version'
+    version = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    started_at = Column(DateTime)
+    applied_at = Column(DateTime)  # None while the migration is still running or was interrupted
+    last_id = Column(Integer)  # last cars.id a backfill has done
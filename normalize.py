@@ -0,0 +1,60 @@
+"""
+Price/mileage/year parsing shared by ingest, migrations and the report.
+
+Every parse_* function takes the raw scraped string and returns an int, or
+None when there's nothing usable in it.
+"""
+
+import re
+from datetime import date
+
+_NON_DIGITS = re.compile(r"[^\d]")
+_YEAR = re.compile(r"\b(20\d\d)\b")
+FIRST_MODEL_YEAR = 2019  # anything older in a title is a price, a phone number or noise
+UNKNOWN_YEAR = "Unknown"
+# "A negociar", "call", "preguntar", "llamar" mean no asking price was posted
+_NO_PRICE_HINTS = ("negoci", "call", "preguntar", "llamar")
+
+
+def parse_price(p: str | None) -> int | None:
+    if not isinstance(p, str):
+        return None
+    s = p.lower()
+    if any(k in s for k in _NO_PRICE_HINTS):
+        return None
+    digits = _NON_DIGITS.sub("", s)
+    return int(digits) if digits else None
+
+
+def parse_mileage(m: str | None) -> int | None:
+    if not isinstance(m, str):
+        return None
+    digits = _NON_DIGITS.sub("", m)
+    return int(digits) if digits else None
+
+
+def parse_year(text: str | None) -> int | None:
+    """The first model year in text: FIRST_MODEL_YEAR up to next year's models."""
+    if not isinstance(text, str):
+        return None
+    last = date.today().year + 1
+    for m in _YEAR.finditer(text):
+        year = int(m.group(1))
+        if FIRST_MODEL_YEAR <= year <= last:
+            return year
+    return None
+
+
+def listing_year(listing: str | None) -> str:
+    """The cars.year string for a listing title: its model year, or "Unknown"."""
+    year = parse_year(listing)
+    return str(year) if year else UNKNOWN_YEAR
+
+
+def numeric_columns(price, mileage, year) -> dict:
+    """The *_num column values for a row's raw price/mileage/year strings."""
+    return {
+        "price_num": parse_price(price),
+        "mileage_num": parse_mileage(mileage),
+        "year_num": parse_year(year),
+    }
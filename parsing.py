@@ -0,0 +1,119 @@
+"""
+Search result page parsing, independent of the browser.
+
+Takes the raw HTML (str or bytes) of a result page and extracts the listing
+rows. Two backends produce identical output:
+
+- "lxml": XPath over only the result rows; fast, used by default when lxml
+  is installed
+- "bs4": the original BeautifulSoup/html.parser code path
+"""
+
+from matcher import ListingMatcher
+from metrics import METRICS
+from normalize import listing_year
+
+BASE_URL = "https://www.clasificadosonline.com"
+
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+try:
+    import lxml.etree
+    import lxml.html
+
+    _ROWS_XPATH = lxml.etree.XPath("//tr[@align='center'][@valign='middle']")
+    _LISTING_XPATH = lxml.etree.XPath(f".//span[{_has_class('Tahoma15blacknound')}]")
+    _LINK_XPATH = lxml.etree.XPath(".//a[starts-with(@href, '/UDTransDetail')]")
+    _MILEAGE_XPATH = lxml.etree.XPath(f".//span[{_has_class('Tahoma14DbluenoUnd')}]")
+    _PRICE_XPATH = lxml.etree.XPath(f".//span[{_has_class('Tahoma14BrownNound')}]")
+    DEFAULT_BACKEND = "lxml"
+except ImportError:
+    DEFAULT_BACKEND = "bs4"
+
+
+def _lxml_text(el):
+    # Same as BeautifulSoup's get_text(strip=True): strip each text node, join with ""
+    return "".join(t.strip() for t in el.itertext())
+
+
+def _first(row, xpath):
+    found = xpath(row)
+    return found[0] if found else None
+
+
+def _rows_lxml(html):
+    doc = lxml.html.document_fromstring(html)
+    # BeautifulSoup leaves script/style contents out of get_text()
+    lxml.etree.strip_elements(doc, "script", "style", "template", with_tail=False)
+    for row in _ROWS_XPATH(doc):
+        listing = _first(row, _LISTING_XPATH)
+        link = _first(row, _LINK_XPATH)
+        mileage = _first(row, _MILEAGE_XPATH)
+        price = _first(row, _PRICE_XPATH)
+        yield (
+            _lxml_text(listing) if listing is not None else None,
+            link.get("href") if link is not None else None,
+            _lxml_text(mileage) if mileage is not None else None,
+            _lxml_text(price) if price is not None else None,
+        )
+
+
+def _rows_bs4(html):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    for row in soup.find_all("tr", align="center", valign="middle"):
+        listing = row.select_one("span.Tahoma15blacknound")
+        link = row.select_one("a[href^='/UDTransDetail']")
+        mileage = row.select_one("span.Tahoma14DbluenoUnd")
+        price = row.select_one("span.Tahoma14BrownNound")
+        yield (
+            listing.get_text(strip=True) if listing else None,
+            link["href"] if link else None,
+            mileage.get_text(strip=True) if mileage else None,
+            price.get_text(strip=True) if price else None,
+        )
+
+
+BACKENDS = {"lxml": _rows_lxml, "bs4": _rows_bs4}
+_default_matcher = None
+
+
+def default_matcher():
+    global _default_matcher
+    if _default_matcher is None:
+        _default_matcher = ListingMatcher()
+    return _default_matcher
+
+
+def iter_rows(html, backend=None):
+    """Yield (listing, href, mileage, price) text per result row; missing tags are None."""
+    return BACKENDS[backend or DEFAULT_BACKEND](html)
+
+
+def parse_cars(html, backend=None, matcher=None):
+    """Return the listings on a result page that match a tracked model, as dicts ready for save_to_db."""
+    matcher = matcher or default_matcher()
+    rows = [(listing.replace("\xa0", " ") if listing is not None else "", href, mileage, price)
+            for listing, href, mileage, price in iter_rows(html, backend)]
+    tags = matcher.classify([listing for listing, _, _, _ in rows])
+    rejected = tags.count(None)
+    METRICS.inc("rows_parsed", len(rows))
+    METRICS.inc("rows_rejected", rejected)
+
+    cars = []
+    for (listing, href, mileage, price), tag in zip(rows, tags):
+        if tag is None:
+            continue
+        cars.append({
+            "listing": listing,
+            "link": BASE_URL + href if href is not None else "",
+            "mileage": mileage.replace("Millas", "").strip() if mileage is not None else "",
+            "price": price if price is not None else "",
+            "is_hybrid": tag["is_hybrid"],
+            "year": listing_year(listing),
+        })
+    return cars
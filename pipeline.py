@@ -0,0 +1,85 @@
+"""
+Streaming scrape pipeline: fetch -> parse -> match -> upsert, one page at a time.
+
+Search jobs hand every parsed page to a PageWriter, which upserts its cars
+and moves the search's checkpoint (page number and last link) forward in the
+same transaction. Nothing accumulates across pages, and a run that dies on
+page 9 keeps pages 1-8: the next run the same day resumes at page 9.
+
+A listing that more than one search returns is written and counted once per
+run: the writer remembers every link it has seen, across all jobs.
+"""
+
+import threading
+from datetime import date
+
+from db import get_session
+from email_report import TodayStats
+from metrics import METRICS
+from models import ScrapeCheckpoint
+from upsert import bulk_upsert_cars
+
+
+class PageWriter:
+    """Persists pages as they're parsed and tallies the run for the report."""
+
+    def __init__(self, db_url, today=None):
+        self.db_url = db_url
+        self.today = today or date.today()
+        self.saved = self.updated = self.pages = 0
+        self.stats = TodayStats()
+        self.seen = set()  # links already written this run, by any job
+        self._lock = threading.Lock()
+
+    def resume_page(self, spec):
+        """First page to fetch for spec: 1, or the page after today's unfinished checkpoint."""
+        with get_session(self.db_url) as session:
+            cp = session.get(ScrapeCheckpoint, spec.key)
+        if cp is None or cp.finished or cp.run_date != self.today or not cp.page:
+            return 1
+        print(f"⏯️ [{spec.term}] Resuming after page {cp.page} (last saved: {cp.last_link})")
+        return cp.page + 1
+
+    def _checkpoint(self, session, spec):
+        cp = session.get(ScrapeCheckpoint, spec.key)
+        if cp is None:
+            cp = ScrapeCheckpoint(search_key=spec.key, term=spec.term)
+            session.add(cp)
+        return cp
+
+    def write_page(self, spec, page, cars):
+        """Upsert one page's new-this-run cars and record the page as the search's checkpoint, in one commit."""
+        with self._lock:
+            fresh = []
+            for car in cars:
+                if car["link"] not in self.seen:
+                    self.seen.add(car["link"])
+                    fresh.append(car)
+        try:
+            with get_session(self.db_url) as session:
+                saved, updated = bulk_upsert_cars(session, fresh, today=self.today, commit=False)
+                cp = self._checkpoint(session, spec)
+                cp.page, cp.run_date, cp.finished = page, self.today, False
+                if cars:
+                    cp.last_link = cars[-1]["link"]
+                with METRICS.timer("db_commit_seconds"):
+                    session.commit()
+        except Exception:
+            # Let another search that returns these listings write them
+            with self._lock:
+                self.seen.difference_update(car["link"] for car in fresh)
+            raise
+        with self._lock:
+            self.saved += saved
+            self.updated += updated
+            self.pages += 1
+            self.stats.add(fresh)
+
+    def finish(self, result):
+        """Close the search's checkpoint unless the job failed part way."""
+        if result.error:
+            return
+        with get_session(self.db_url) as session:
+            cp = self._checkpoint(session, result.spec)
+            cp.run_date, cp.finished = self.today, True
+            session.commit()
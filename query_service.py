@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+Local read-only HTTP/JSON query service over the listings.
+
+Keeps the available listings in memory, indexed by hybrid flag and model
+year, each segment sorted by price and by date found (i.e. days listed),
+so the usual questions are a walk over a few sorted lists instead of a scan
+of cars:
+
+    GET /cheapest?hybrid=1&year=2024&max_price=30000&limit=12
+    GET /aged?cap=30000&days=14&hybrid=1       # oldest first, priced at most cap
+    GET /listings/<id>                         # one listing and its listing_events history
+    GET /stats                                 # available listings per year and type
+    POST /refresh                              # pick up what the last scrape changed
+
+hybrid takes 1/0 (default: both). The index follows the database
+incrementally: every QUERY_REFRESH_SECONDS, or on POST /refresh (main.py
+sends one after each scrape when QUERY_SERVICE_URL is set), it reads only
+the cars rows updated since its watermark and evicts the ids in the
+cars_deleted tombstones since its last one, as sync.py does. Responses are
+kept in an LRU cache keyed by the request and the index version, so a
+refresh that changes anything retires them all.
+
+    python query_service.py --port 8766
+"""
+
+import argparse
+import heapq
+import json
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict, namedtuple
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from dotenv import load_dotenv
+from sqlalchemy import func, select
+
+from db import get_session
+from models import CarDeletion, CarListing, ListingEvent
+
+load_dotenv()
+
+DB_URL = os.environ.get("DB_URL", "sqlite:///mavericks.db")
+QUERY_SERVICE_PORT = int(os.environ.get("QUERY_SERVICE_PORT", "8766"))
+QUERY_REFRESH_SECONDS = float(os.environ.get("QUERY_REFRESH_SECONDS", "60"))
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "2048"))
+# Rows whose transaction committed after a later one's still get picked up
+REFRESH_OVERLAP = timedelta(minutes=5)
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 500
+# Past this many changed rows a refresh re-sorts the segments instead of inserting one by one
+RESORT_FRACTION = 0.05
+_UNCACHED = {"/stats", "/health"}
+
+Listing = namedtuple("Listing", "id listing year is_hybrid price price_num mileage mileage_num date_found link")
+_COLUMNS = (CarListing.id, CarListing.listing, CarListing.year_num, CarListing.is_hybrid, CarListing.price,
+            CarListing.price_num, CarListing.mileage, CarListing.mileage_num, CarListing.date_found,
+            CarListing.link, CarListing.still_available, CarListing.updated_at)
+
+
+class BadRequest(ValueError):
+    pass
+
+
+class ListingIndex:
+    """
+    The available listings, in segments keyed (is_hybrid, year). Each
+    segment has a list of (price_num, id) and one of (date_found ordinal,
+    id), both sorted; listings without a price or date stay out of that list.
+    """
+
+    def __init__(self):
+        self.listings = {}
+        self.by_price = {}
+        self.by_date = {}
+        self.version = 0
+        self.max_id = 0
+        self.updated_at = None
+        self.deleted_id = 0  # last cars_deleted tombstone applied
+        self.refreshed_at = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.listings)
+
+    @staticmethod
+    def _entries(listing):
+        segment = (listing.is_hybrid, listing.year)
+        price = (listing.price_num, listing.id) if listing.price_num is not None else None
+        found = (listing.date_found.toordinal(), listing.id) if listing.date_found is not None else None
+        return segment, price, found
+
+    def _remove(self, listing):
+        segment, price, found = self._entries(listing)
+        for entry, lists in ((price, self.by_price), (found, self.by_date)):
+            if entry is not None:
+                entries = lists[segment]
+                del entries[bisect_left(entries, entry)]
+
+    def _insert(self, listing):
+        segment, price, found = self._entries(listing)
+        if price is not None:
+            insort(self.by_price.setdefault(segment, []), price)
+        if found is not None:
+            insort(self.by_date.setdefault(segment, []), found)
+
+    def _resort(self):
+        self.by_price, self.by_date = {}, {}
+        for listing in self.listings.values():
+            segment, price, found = self._entries(listing)
+            if price is not None:
+                self.by_price.setdefault(segment, []).append(price)
+            if found is not None:
+                self.by_date.setdefault(segment, []).append(found)
+        for entries in (*self.by_price.values(), *self.by_date.values()):
+            entries.sort()
+
+    def apply(self, rows):
+        """Add, replace or drop (no longer available) each cars row. Returns how many changed the index."""
+        changed = []
+        for row in rows:
+            self.max_id = max(self.max_id, row.id)
+            if row.updated_at is not None and (self.updated_at is None or row.updated_at > self.updated_at):
+                self.updated_at = row.updated_at
+            listing = Listing(row.id, row.listing, row.year_num, bool(row.is_hybrid), row.price, row.price_num,
+                              row.mileage, row.mileage_num, row.date_found, row.link) if row.still_available else None
+            if self.listings.get(row.id) != listing:
+                changed.append((row.id, listing))
+        if not changed:
+            return 0
+        with self._lock:
+            resort = len(changed) > RESORT_FRACTION * max(len(self.listings), 1)
+            for listing_id, listing in changed:
+                old = self.listings.pop(listing_id, None)
+                if old is not None and not resort:
+                    self._remove(old)
+                if listing is not None:
+                    self.listings[listing_id] = listing
+                    if not resort:
+                        self._insert(listing)
+            if resort:
+                self._resort()
+            self.version += 1
+        return len(changed)
+
+    def evict(self, ids):
+        """Drop the listings whose cars rows were deleted. Returns how many were in the index."""
+        with self._lock:
+            gone = [self.listings.pop(listing_id) for listing_id in ids if listing_id in self.listings]
+            for listing in gone:
+                self._remove(listing)
+            if gone:
+                self.version += 1
+        return len(gone)
+
+    def load(self, session):
+        """Replace the contents with every available listing. Returns how many there are."""
+        fresh = ListingIndex()
+        fresh.deleted_id = session.scalar(select(func.max(CarDeletion.id))) or 0
+        fresh.max_id = session.scalar(select(func.max(CarListing.id))) or 0
+        fresh.updated_at = session.scalar(select(func.max(CarListing.updated_at)))
+        fresh.apply(session.execute(select(*_COLUMNS).where(CarListing.still_available.is_(True))))
+        with self._lock:
+            self.listings, self.by_price, self.by_date = fresh.listings, fresh.by_price, fresh.by_date
+            self.max_id, self.updated_at = fresh.max_id, fresh.updated_at
+            self.deleted_id = fresh.deleted_id
+            self.version += 1
+        self.refreshed_at = datetime.now().isoformat(timespec="seconds")
+        return len(self.listings)
+
+    def refresh(self, session):
+        """
+        Evict the cars rows deleted and apply those added or updated since
+        the last load or refresh. Returns how many changed.
+        """
+        if self.updated_at is None:
+            return self.load(session)  # no watermark to go by (e.g. a table without updated_at values)
+        # Tombstones first, and before the upserts in case a deleted id was reused by a new row
+        tombstones = session.execute(select(CarDeletion.id, CarDeletion.car_id)
+                                     .where(CarDeletion.id > self.deleted_id).order_by(CarDeletion.id)).all()
+        changed = 0
+        if tombstones:
+            changed += self.evict(car_id for _, car_id in tombstones)
+            self.deleted_id = tombstones[-1].id
+        # Two range reads on indexed columns rather than one OR that scans
+        since, max_id = self.updated_at - REFRESH_OVERLAP, self.max_id
+        changed += self.apply(session.execute(select(*_COLUMNS).where(CarListing.updated_at >= since)))
+        changed += self.apply(session.execute(select(*_COLUMNS).where(CarListing.id > max_id)))
+        self.refreshed_at = datetime.now().isoformat(timespec="seconds")
+        return changed
+
+    def _segments(self, lists, hybrid, year):
+        return [entries for (is_hybrid, seg_year), entries in lists.items()
+                if (hybrid is None or is_hybrid == hybrid) and (year is None or seg_year == year)]
+
+    def cheapest(self, hybrid=None, year=None, max_price=None, min_days=None, limit=DEFAULT_LIMIT, today=None):
+        """Priced listings cheapest first, optionally only those listed at least min_days."""
+        cutoff = ((today or date.today()) - timedelta(days=min_days)).toordinal() if min_days is not None else None
+        with self._lock:
+            found = []
+            for price, listing_id in heapq.merge(*self._segments(self.by_price, hybrid, year)):
+                if max_price is not None and price > max_price or len(found) == limit:
+                    break
+                listing = self.listings[listing_id]
+                # An undated listing can't be shown to be min_days old
+                if cutoff is None or (listing.date_found is not None and listing.date_found.toordinal() <= cutoff):
+                    found.append(listing)
+            return found
+
+    def oldest(self, hybrid=None, year=None, max_price=None, min_days=0, limit=DEFAULT_LIMIT, today=None):
+        """Listings listed at least min_days, longest listed first, optionally priced at most max_price."""
+        cutoff = ((today or date.today()) - timedelta(days=min_days)).toordinal()
+        with self._lock:
+            found = []
+            for ordinal, listing_id in heapq.merge(*self._segments(self.by_date, hybrid, year)):
+                if ordinal > cutoff or len(found) == limit:
+                    break
+                listing = self.listings[listing_id]
+                if max_price is None or listing.price_num is not None and listing.price_num <= max_price:
+                    found.append(listing)
+            return found
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for (is_hybrid, year), entries in self.by_date.items():
+                counts.setdefault(str(year or "unknown"), {})["hybrid" if is_hybrid else "regular"] = len(entries)
+            return {"available": len(self.listings), "by_year": dict(sorted(counts.items())),
+                    "version": self.version, "refreshed_at": self.refreshed_at}
+
+
+def listing_json(listing, today):
+    return {"id": listing.id, "listing": listing.listing, "year": listing.year, "is_hybrid": listing.is_hybrid,
+            "price": listing.price, "price_num": listing.price_num, "mileage": listing.mileage,
+            "mileage_num": listing.mileage_num,
+            "date_found": listing.date_found.isoformat() if listing.date_found else None,
+            "days_listed": (today - listing.date_found).days if listing.date_found else None, "link": listing.link}
+
+
+def listing_history(session, listing_id):
+    car = session.get(CarListing, listing_id)
+    if car is None:
+        return None
+    events = session.execute(
+        select(ListingEvent.observed_at, ListingEvent.event, ListingEvent.price_num, ListingEvent.prev_price_num,
+               ListingEvent.mileage_num, ListingEvent.prev_mileage_num)
+        .where(ListingEvent.listing_id == listing_id).order_by(ListingEvent.observed_at, ListingEvent.id))
+    return {"id": car.id, "listing": car.listing, "link": car.link, "year": car.year_num,
+            "is_hybrid": car.is_hybrid, "still_available": car.still_available, "price": car.price,
+            "price_num": car.price_num, "mileage": car.mileage, "mileage_num": car.mileage_num,
+            "date_found": car.date_found.isoformat() if car.date_found else None, "vehicle_id": car.vehicle_id,
+            "events": [dict(row._mapping, observed_at=row.observed_at.isoformat(timespec="seconds"))
+                       for row in events]}
+
+
+class LRUCache:
+    """Encoded responses by key, least recently used evicted first."""
+
+    def __init__(self, size=QUERY_CACHE_SIZE):
+        self.size = size
+        self.hits = self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            if len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+
+def _int(params, name, default=None, low=0, high=None):
+    value = params.get(name)
+    if value in (None, ""):
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise BadRequest(f"{name} must be an integer") from None
+    if number < low or high is not None and number > high:
+        raise BadRequest(f"{name} must be between {low} and {high}" if high is not None else f"{name} must be >= {low}")
+    return number
+
+
+def _hybrid(params):
+    value = params.get("hybrid")
+    if value in (None, "", "any"):
+        return None
+    if value in ("1", "true", "0", "false"):
+        return value in ("1", "true")
+    raise BadRequest("hybrid must be 1 or 0")
+
+
+class QueryService:
+    """The index, the response cache and the request routing, without the HTTP server."""
+
+    def __init__(self, db_url=DB_URL, cache_size=QUERY_CACHE_SIZE):
+        self.db_url = db_url
+        self.cache = LRUCache(cache_size)
+        self._refresh_lock = threading.Lock()
+        self.index = ListingIndex()
+        with get_session(db_url) as session:
+            self.index.load(session)
+
+    def refresh(self):
+        """Pick up what changed in the database since the last refresh; returns (rows changed, seconds)."""
+        start = time.perf_counter()
+        with self._refresh_lock, get_session(self.db_url) as session:
+            changed = self.index.refresh(session)
+        return changed, time.perf_counter() - start
+
+    def query(self, path, params):
+        """(status, JSON bytes) for a GET."""
+        today = date.today()
+        cacheable = path not in _UNCACHED
+        # days_listed changes at midnight, so the date is part of the key too
+        key = (path, tuple(sorted(params.items())), self.index.version, today)
+        if cacheable:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return 200, cached
+        try:
+            status, body = self._answer(path, params, today)
+        except BadRequest as e:
+            return 400, json.dumps({"error": str(e)}).encode()
+        except Exception as e:
+            # Answer in JSON rather than dropping the client's connection
+            print(f"❌ {path} failed: {type(e).__name__}: {e}")
+            return 500, json.dumps({"error": "internal error"}).encode()
+        body = json.dumps(body, ensure_ascii=False).encode()
+        if status == 200 and cacheable:
+            self.cache.put(key, body)
+        return status, body
+
+    def _answer(self, path, params, today):
+        limit = _int(params, "limit", DEFAULT_LIMIT, low=1, high=MAX_LIMIT)
+        if path == "/cheapest":
+            found = self.index.cheapest(_hybrid(params), _int(params, "year"), _int(params, "max_price"),
+                                        _int(params, "min_days"), limit, today)
+        elif path == "/aged":
+            found = self.index.oldest(_hybrid(params), _int(params, "year"), _int(params, "cap"),
+                                      _int(params, "days", 14), limit, today)
+        elif path.startswith("/listings/"):
+            try:
+                listing_id = int(path.removeprefix("/listings/"))
+            except ValueError:
+                return 404, {"error": "not found"}
+            with get_session(self.db_url) as session:
+                history = listing_history(session, listing_id)
+            return (200, history) if history is not None else (404, {"error": f"no listing {listing_id}"})
+        elif path == "/stats":
+            return 200, dict(self.index.stats(), cache={"hits": self.cache.hits, "misses": self.cache.misses})
+        elif path == "/health":
+            return 200, {"ok": True, "available": len(self.index)}
+        else:
+            return 404, {"error": "not found"}
+        return 200, {"count": len(found), "listings": [listing_json(listing, today) for listing in found]}
+
+    def handler(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def send(self, status, body):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                self.send(*service.query(parts.path.rstrip("/") or "/", dict(parse_qsl(parts.query))))
+
+            def do_POST(self):
+                if urlsplit(self.path).path != "/refresh":
+                    self.send(404, b'{"error": "not found"}')
+                    return
+                changed, seconds = service.refresh()
+                self.send(200, json.dumps({"changed": changed, "seconds": round(seconds, 3),
+                                           "available": len(service.index)}).encode())
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def keep_fresh(self, seconds=QUERY_REFRESH_SECONDS):
+        """Refresh every `seconds` from a daemon thread."""
+        def loop():
+            while True:
+                time.sleep(seconds)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"❌ Refresh failed: {e}")
+
+        threading.Thread(target=loop, daemon=True).start()
+
+    def serve(self, host="127.0.0.1", port=QUERY_SERVICE_PORT):
+        return ThreadingHTTPServer((host, port), self.handler())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db-url", default=DB_URL)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=QUERY_SERVICE_PORT)
+    parser.add_argument("--refresh-seconds", type=float, default=QUERY_REFRESH_SECONDS,
+                        help="how often to pick up database changes (0 = only on POST /refresh)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    service = QueryService(args.db_url)
+    print(f"🗂️ Indexed {len(service.index):,} available listings in {time.perf_counter() - start:.1f}s")
+    if args.refresh_seconds:
+        service.keep_fresh(args.refresh_seconds)
+    server = service.serve(args.host, args.port)
+    print(f"🔎 Serving queries on http://{args.host}:{server.server_port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Per-host request budget shared by every phase of a run, and a tally of where
+the run's time went.
+
+Search pages, pagination clicks, liveness checks and browser fallbacks all
+draw from the same token bucket per host, so the site sees at most HOST_RPS
+requests a second from us no matter how many workers are running. The
+RunClock adds up the seconds threads spend throttled or waiting on page loads
+versus doing requests and parsing, and prints the split at the end of a run.
+"""
+
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+HOST_RPS = float(os.environ.get("HOST_RPS", "4"))
+# Requests that may go out back-to-back after an idle spell
+HOST_BURST = float(os.environ.get("HOST_BURST", "1"))
+
+WAITING = ("throttle", "page load")
+WORKING = ("network", "parse/save")
+
+
+class RunClock:
+    """Seconds spent per activity, summed over all threads."""
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def add(self, kind, seconds):
+        with self._lock:
+            self.seconds[kind] += seconds
+
+    @contextmanager
+    def timing(self, kind):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(kind, time.perf_counter() - start)
+
+    def reset(self):
+        with self._lock:
+            self.seconds.clear()
+
+    def report(self, wall_seconds):
+        waiting = sum(self.seconds[k] for k in WAITING)
+        working = sum(self.seconds[k] for k in WORKING)
+        detail = ", ".join(f"{k} {self.seconds[k]:.1f}s" for k in (*WAITING, *WORKING))
+        print(f"⏱️ Run took {wall_seconds:.1f}s: waiting {waiting:.1f}s vs working {working:.1f}s "
+              f"summed over threads ({detail})")
+
+
+CLOCK = RunClock()
+
+
+class HostRateLimiter:
+    """
+    Token bucket per host: `rps` tokens a second, holding at most `burst`.
+
+    Callers that find the bucket empty reserve the next token and sleep until
+    it's due, so concurrent callers queue up instead of all waking at once.
+    """
+
+    def __init__(self, rps: float = HOST_RPS, burst: float = HOST_BURST, clock: RunClock = CLOCK):
+        self.rps = rps
+        self.burst = max(burst, 1.0)
+        self.clock = clock
+        self._buckets = {}  # host -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def wait(self, url: str) -> float:
+        """Block until a request to url's host is allowed; returns the seconds waited."""
+        if self.rps <= 0:
+            return 0.0
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated_at = self._buckets.get(host, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rps) - 1
+            self._buckets[host] = (tokens, now)
+        delay = -tokens / self.rps if tokens < 0 else 0.0
+        if delay:
+            time.sleep(delay)
+            self.clock.add("throttle", delay)
+        return delay
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_limiter() -> HostRateLimiter:
+    """The process-wide limiter every phase falls back to when not handed one."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = HostRateLimiter()
+        return _shared
@@ -0,0 +1,196 @@
+"""
+Liveness re-check scheduling.
+
+Instead of re-checking every available listing on every run, each listing
+gets a next_check_at. The interval depends on its age bucket, following the
+notebook's split: quick movers (≤7 days listed) sell fast and are checked
+daily, stale inventory (≥30 days) rarely disappears overnight. Once enough
+removals have been observed, a bucket's interval comes from its measured
+daily removal rate instead: the longest wait that keeps the chance of a
+listing having gone unnoticed under STALE_RISK.
+
+    intervals = bucket_intervals(session)
+    due = select_due(session, intervals, budget=LIVENESS_BUDGET)
+    statuses = resolve_liveness([row.link for row in due])
+    schedule_checked(session, due, statuses, intervals)
+"""
+
+import math
+import os
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import case, func, or_, select, update
+
+from history import record_events, removed_event
+from liveness import ACTIVE, INACTIVE
+from models import CarListing
+
+# (name, max days listed, default interval in days); None = everything older
+AGE_BUCKETS = (
+    ("quick", 7, 1),
+    ("middle", 29, 2),
+    ("stale", None, 5),
+)
+MAX_INTERVAL_DAYS = int(os.environ.get("RECHECK_MAX_DAYS", "14"))
+STALE_RISK = float(os.environ.get("RECHECK_STALE_RISK", "0.1"))
+RATE_WINDOW_DAYS = 30
+MIN_REMOVALS = 20  # per bucket before its measured rate replaces the default
+# 0 = check every due listing
+LIVENESS_BUDGET = int(os.environ.get("LIVENESS_BUDGET", "0"))
+# Daily runs don't start at the same minute; don't let a few minutes push a check a whole day
+SCHEDULE_SLACK = timedelta(hours=2)
+UPDATE_CHUNK = 500
+
+
+@dataclass
+class BucketInterval:
+    days: int
+    removal_rate: float | None  # per day, None while there's too little history
+
+
+@dataclass
+class DueListing:
+    id: int
+    link: str
+    date_found: date | None
+    last_checked_at: datetime | None
+    priority: float = 0.0
+
+
+def age_bucket(days_listed):
+    for name, max_days, _ in AGE_BUCKETS:
+        if max_days is None or days_listed <= max_days:
+            return name
+
+
+def interval_for(rate):
+    """Longest whole-day wait with P(removed meanwhile) <= STALE_RISK, given a daily removal rate."""
+    if rate <= 0:
+        return MAX_INTERVAL_DAYS
+    days = math.log(1 - STALE_RISK) / math.log(1 - min(rate, 0.999))
+    return max(1, min(MAX_INTERVAL_DAYS, int(days)))
+
+
+def bucket_intervals(session, today=None):
+    """
+    {bucket: BucketInterval}. Removal rates come from listings flipped to
+    unavailable in the last RATE_WINDOW_DAYS, bucketed by their age when the
+    check caught them, over the listings currently in that bucket.
+    """
+    today = today or date.today()
+    since = datetime.combine(today - timedelta(days=RATE_WINDOW_DAYS), datetime.min.time())
+    removed = dict.fromkeys((name for name, _, _ in AGE_BUCKETS), 0)
+    rows = session.execute(
+        select(CarListing.date_found, CarListing.last_checked_at)
+        .where(CarListing.still_available.is_(False), CarListing.last_checked_at >= since,
+               CarListing.date_found.is_not(None)))
+    for found, checked in rows:
+        removed[age_bucket((checked.date() - found).days)] += 1
+
+    available = dict.fromkeys(removed, 0)
+    rows = session.execute(
+        select(CarListing.date_found, func.count())
+        .where(CarListing.still_available.is_(True))
+        .group_by(CarListing.date_found))
+    for found, n in rows:
+        available[age_bucket((today - found).days if found else 0)] += n
+
+    intervals = {}
+    for name, _, default_days in AGE_BUCKETS:
+        if removed[name] < MIN_REMOVALS:
+            intervals[name] = BucketInterval(default_days, None)
+            continue
+        rate = removed[name] / RATE_WINDOW_DAYS / (available[name] + removed[name])
+        intervals[name] = BucketInterval(interval_for(rate), rate)
+    return intervals
+
+
+def print_intervals(intervals):
+    parts = []
+    for name, interval in intervals.items():
+        source = f"{interval.removal_rate:.1%}/day removed" if interval.removal_rate is not None else "default"
+        parts.append(f"{name} every {interval.days}d ({source})")
+    print(f"🗓️ Re-check schedule: {', '.join(parts)}")
+
+
+def select_due(session, intervals, budget=LIVENESS_BUDGET, now=None, check_all=False):
+    """
+    Available listings whose next_check_at has passed (or was never set),
+    most likely to have been removed first, cut to `budget` when it's > 0.
+    Listings never checked go first.
+    """
+    now = now or datetime.now()
+    query = (select(CarListing.id, CarListing.link, CarListing.date_found, CarListing.last_checked_at)
+             .where(CarListing.still_available.is_(True)))
+    if not check_all:
+        query = query.where(or_(CarListing.next_check_at.is_(None), CarListing.next_check_at <= now))
+
+    due = []
+    for row in session.execute(query):
+        listing = DueListing(*row)
+        days_listed = (now.date() - listing.date_found).days if listing.date_found else 0
+        if listing.last_checked_at is None:
+            listing.priority = math.inf
+        else:
+            rate = intervals[age_bucket(days_listed)].removal_rate
+            if rate is None:
+                # No measured rate yet: fall back to how overdue it is, in intervals
+                rate = 1 / intervals[age_bucket(days_listed)].days
+            waited = (now - listing.last_checked_at).total_seconds() / 86400
+            listing.priority = 1 - (1 - min(rate, 0.999)) ** waited
+        due.append(listing)
+
+    due.sort(key=lambda listing: listing.priority, reverse=True)
+    if budget and len(due) > budget:
+        print(f"💰 Liveness budget: checking {budget} of {len(due)} due listings")
+        due = due[:budget]
+    return due
+
+
+def schedule_checked(session, due, statuses, intervals, now=None):
+    """
+    Stamp last_checked_at on every listing the check resolved, flip removed
+    ones to unavailable (with a 'removed' history event) and push active
+    ones' next_check_at out by their bucket's interval. Unresolved listings
+    stay due. Caller commits.
+    """
+    now = now or datetime.now()
+    rows, events = [], []
+    for listing in due:
+        status = statuses.get(listing.link)
+        if status == INACTIVE:
+            rows.append({"id": listing.id, "still_available": False, "last_checked_at": now,
+                         "next_check_at": None})
+            events.append(removed_event(listing.id, now))
+        elif status == ACTIVE:
+            days_listed = (now.date() - listing.date_found).days if listing.date_found else 0
+            days = intervals[age_bucket(days_listed)].days
+            rows.append({"id": listing.id, "last_checked_at": now,
+                         "next_check_at": now + timedelta(days=days) - SCHEDULE_SLACK})
+    for i in range(0, len(rows), UPDATE_CHUNK):
+        session.execute(update(CarListing), rows[i:i + UPDATE_CHUNK])
+    record_events(session, events)
+    return rows
+
+
+def availability_staleness(session, now=None):
+    """How fresh still_available is across the listings currently marked available."""
+    now = now or datetime.now()
+    checked = CarListing.last_checked_at
+    row = session.execute(
+        select(
+            func.count(),
+            func.sum(case((checked >= now - timedelta(days=1), 1), else_=0)),
+            func.sum(case((checked >= now - timedelta(days=7), 1), else_=0)),
+            func.sum(case((checked.is_(None), 1), else_=0)),
+            func.min(checked),
+        ).where(CarListing.still_available.is_(True))).one()
+    total, day, week, never, oldest = row
+    return {
+        "available": total or 0,
+        "checked_1d": day or 0,
+        "checked_7d": week or 0,
+        "never_checked": never or 0,
+        "oldest_check_days": (now - oldest).days if oldest else None,
+    }
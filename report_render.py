@@ -0,0 +1,152 @@
+"""
+Report rendering: precompiled templates that stream rows into HTML and plain text.
+
+A Template pairs an HTML and a plain-text str.format-style string over the
+same fields and compiles each, once, into a function of one row, so a table
+body costs one call per row straight off the DB cursor. Every field is
+escaped for its part: html.escape in HTML, {link!u} for hrefs (anything but
+an http(s) URL becomes "#"), and {block!r} for markup that's already been
+rendered. In plain text, whitespace runs in values collapse to one space so
+a title can't break a table row.
+
+ReportWriter writes both parts to file-like sinks as rows arrive, so a
+digest of thousands of listings never holds its rows in memory, and only
+holds its output when the sinks are StringIOs.
+
+    ROW = Template("<tr><td>{listing}</td><td>{price}</td></tr>", "{listing:<40.40} {price:>9}\\n",
+                   columns=("listing", "price"))
+    out = ReportWriter()
+    out.rows(ROW, stream(session, stmt))
+    html, text = out.getvalue()
+"""
+
+import io
+import re
+from html import escape
+from itertools import islice
+from string import Formatter
+
+STREAM_ROWS = 500  # rows fetched from the cursor and written to the sinks at a time
+_WIDTH = re.compile(r"((?:.?[<>=^])?)[-+ ]?z?#?0?(\d*)")
+
+
+def _html(value):
+    if value.__class__ is str:
+        # Most values have nothing to escape, and looking is far cheaper than escape()
+        if "&" in value or "<" in value or ">" in value or '"' in value or "'" in value:
+            return escape(value)
+        return value
+    return "" if value is None else escape(str(value))
+
+
+def _url(value):
+    if value is None:
+        return ""
+    url = str(value).strip()
+    return _html(url) if url[:8].lower().startswith(("http://", "https://")) else "#"
+
+
+def _raw(value):
+    return "" if value is None else str(value)
+
+
+def _text(value):
+    return "" if value is None else " ".join(str(value).split())
+
+
+def _format(value, spec, blank):
+    return blank if value is None else format(value, spec)
+
+
+def _cell(value, spec, blank):
+    # _text before the padding, which it would otherwise collapse
+    if value is None:
+        return blank
+    return format(" ".join(value.split()) if isinstance(value, str) else value, spec)
+
+
+def _blank(spec):
+    """What a None field renders as: empty, but padded to the spec's width."""
+    match = _WIDTH.match(spec)
+    return format("", (match.group(1) or "") + (match.group(2) or ""))
+
+
+_HTML = {None: _html, "u": _url, "r": _raw}
+_TEXT = {None: _text, "u": _text, "r": _raw}
+
+
+def _converter(conversions, conversion, spec):
+    """value -> str for one field: formatted by spec if there is one, then escaped for the part."""
+    if not spec:
+        return conversions[conversion]
+    blank = _blank(spec)
+    if conversions is _TEXT and conversion is None:
+        return lambda value: _cell(value, spec, blank)
+    convert = conversions[conversion]
+    return lambda value: convert(_format(value, spec, blank))
+
+
+def _compile(source, conversions, columns):
+    """
+    source as a function of one row: a tuple in `columns` order, or a
+    mapping of field names when columns is None. The template is parsed
+    once into (literal, key, converter) pieces that each call joins.
+    """
+    pieces, tail = [], ""
+    for literal, field, spec, conversion in Formatter().parse(source):
+        if field is None:
+            tail = literal
+            continue
+        if conversion not in conversions or "{" in spec:
+            raise ValueError(f"unsupported field {{{field}!{conversion}:{spec}}} in template")
+        key = columns.index(field) if columns is not None else field
+        pieces.append((literal, key, _converter(conversions, conversion, spec)))
+    if not pieces:
+        return lambda row=None: tail
+
+    def render(row=None):
+        return "".join([literal + convert(row[key]) for literal, key, convert in pieces]) + tail
+    return render
+
+
+class Template:
+    """An HTML and a plain-text template over the same fields, compiled once."""
+
+    def __init__(self, html, text="", columns=None):
+        self.columns = tuple(columns) if columns is not None else None
+        self.html = _compile(html, _HTML, self.columns)
+        self.text = _compile(text, _TEXT, self.columns)
+
+
+def stream(session, stmt, rows=STREAM_ROWS):
+    """Execute stmt and yield its rows, fetching `rows` at a time."""
+    return session.execute(stmt.execution_options(yield_per=rows))
+
+
+class ReportWriter:
+    """Writes a report's HTML and plain-text parts side by side."""
+
+    def __init__(self, html_out=None, text_out=None):
+        self.html_out = io.StringIO() if html_out is None else html_out
+        self.text_out = io.StringIO() if text_out is None else text_out
+
+    def write(self, template, values=None):
+        self.html_out.write(template.html(values))
+        self.text_out.write(template.text(values))
+
+    def rows(self, template, rows, empty=None):
+        """Write each row through template, STREAM_ROWS at a time; `empty` instead if there were none."""
+        html, text = template.html, template.text
+        rows = iter(rows)
+        count = 0
+        while batch := list(islice(rows, STREAM_ROWS)):
+            self.html_out.write("".join(map(html, batch)))
+            self.text_out.write("".join(map(text, batch)))
+            count += len(batch)
+        if not count and empty is not None:
+            self.write(empty)
+        return count
+
+    def getvalue(self):
+        """(html, text), when writing to the default StringIOs."""
+        return self.html_out.getvalue(), self.text_out.getvalue()
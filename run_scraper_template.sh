@@ -6,7 +6,9 @@
 # 4. Make executable: chmod +x run_scraper.sh
 # 5. Test: ./run_scraper.sh
 # 6. Add to crontab: 0 14 * * * /full/path/to/run_scraper.sh
+# 7. Optional: retry reports the run couldn't email (they wait in spool/mail):
+#    */30 * * * * cd /full/path/to/your_repo && venv/bin/python mail_spool.py >> logs/mail.log 2>&1
 
 cd /home/ubuntu/path_to/your_repo
 source venv/bin/activate  # or .venv/bin/activate
-python main.py >> logs/scraper.log 2>&1
\ No newline at end of file
+python main.py scrape >> logs/scraper.log 2>&1
\ No newline at end of file
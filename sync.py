@@ -0,0 +1,378 @@
+"""
+Keep a local replica of the production database up to date with changesets.
+
+explorer.ipynb used to scp the whole SQLite file every time, although only a
+few rows change a day. Instead the replica is copied once with SQLite's
+online backup API and then fed changesets: gzipped JSON with the rows that
+changed since the replica's watermark (its sync_state row):
+
+- cars rows whose updated_at is at or after the watermark's, or whose id is
+  above its highest
+- listing_events above its highest id (the table is append-only)
+- report_snapshot rows from its latest report_date on (they're refreshed
+  during the day)
+- the ids of cars rows deleted since, from the cars_deleted tombstones
+
+cars.updated_at is bumped by a trigger when an UPDATE doesn't set it (hand
+edits, raw SQL), and deletes leave a tombstone (see models.CHANGE_TRIGGERS;
+migrate_db.py installs both). Deletes from before the triggers existed only
+reach a replica by cloning it again. Replicas drop the triggers, so they
+keep the source's updated_at.
+
+Applying deletes the tombstoned rows, upserts every row by primary key and
+only moves the watermark forward, so applying a changeset twice, or one
+that overlaps the last, is harmless. Exports reach back SYNC_OVERLAP before the watermark's updated_at
+to catch rows whose transaction committed after a later one's.
+
+    python sync.py clone sqlite:///mavericks.db sqlite:///replica.db
+    python sync.py watermark sqlite:///replica.db > watermark.json
+    python sync.py export sqlite:///mavericks.db changes.json.gz --since watermark.json   # on the server
+    python sync.py apply sqlite:///replica.db changes.json.gz
+    python sync.py pull sqlite:///mavericks.db sqlite:///replica.db   # clone, or export + apply, locally
+
+Over SSH, with '-' for stdin/stdout:
+
+    python sync.py watermark sqlite:///replica.db \
+      | ssh "$SSH_HOST" python sync.py export sqlite:///mavericks.db - --since - \
+      | python sync.py apply sqlite:///replica.db -
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Date, DateTime, create_engine, delete, func, inspect, make_url, or_, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import CarDeletion, CarListing, ListingEvent, ReportSnapshot, SyncState
+
+CHANGESET_VERSION = 2
+SYNC_OVERLAP = timedelta(minutes=int(os.environ.get("SYNC_OVERLAP_MINUTES", "15")))
+BACKUP_PAGES = 4096  # pages copied per backup step; the source stays writable in between
+BACKUP_SLEEP = 0.01
+READ_CHUNK = 5000
+APPLY_CHUNK = 500
+
+_CARS = CarListing.__table__
+_EVENTS = ListingEvent.__table__
+_SNAPSHOTS = ReportSnapshot.__table__
+_DELETED = CarDeletion.__table__
+_TRIGGERS = ("cars_touch_updated_at", "cars_record_delete")
+_TABLES = {table.name: table for table in (_CARS, _EVENTS, _SNAPSHOTS)}
+
+
+def _sqlite_path(db_url):
+    url = make_url(db_url)
+    if not url.drivername.startswith("sqlite") or not url.database:
+        raise ValueError(f"clone needs SQLite database files, got {db_url}")
+    return url.database
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def _parse_value(column, value):
+    if value is None:
+        return None
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(column.type, Date):
+        return date.fromisoformat(value)
+    return value
+
+
+def empty_watermark():
+    return {"cars_updated_at": None, "cars_id": 0, "event_id": 0, "report_date": None, "deleted_id": 0}
+
+
+def _drop_triggers(conn):
+    """A replica takes updated_at from its source and has nothing to tombstone."""
+    for name in _TRIGGERS:
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+
+
+def replica_watermark(conn):
+    """The replica's sync_state as a watermark dict (empty if it was never synced)."""
+    SyncState.__table__.create(conn, checkfirst=True)
+    if "deleted_id" not in {c["name"] for c in inspect(conn).get_columns("sync_state")}:
+        conn.execute(text("ALTER TABLE sync_state ADD COLUMN deleted_id INTEGER DEFAULT 0"))
+    state = conn.execute(select(SyncState.__table__)).mappings().first()
+    if state is None:
+        return empty_watermark()
+    return {key: _json_value(state[key]) for key in empty_watermark()}
+
+
+def _save_watermark(conn, watermark):
+    table = SyncState.__table__
+    values = {key: _parse_value(table.c[key], value) for key, value in watermark.items()}
+    values["synced_at"] = datetime.now()
+    conn.execute(sqlite_insert(table).values(id=1, **values)
+                 .on_conflict_do_update(index_elements=[table.c.id], set_=values))
+
+
+def _later(a, b):
+    """The later of two ISO dates/datetimes, either of which may be None."""
+    return max(filter(None, (a, b)), default=None)
+
+
+def _read_rows(conn, table, where):
+    """Rows of table matching where, as lists in column order, read in id order."""
+    rows, last_id = [], 0
+    while True:
+        chunk = conn.execute(select(table).where(where, table.c.id > last_id)
+                             .order_by(table.c.id).limit(READ_CHUNK)).all()
+        rows.extend([_json_value(value) for value in row] for row in chunk)
+        if len(chunk) < READ_CHUNK:
+            return rows
+        last_id = chunk[-1].id
+
+
+def export_changes(source_url, since):
+    """Changeset dict with everything in the source changed since the watermark `since`."""
+    engine = create_engine(source_url)
+    try:
+        with engine.connect() as conn:
+            # Tombstones first: a row deleted after this read is still in the
+            # cars read below, and its tombstone comes with the next export
+            deleted = []
+            if inspect(conn).has_table("cars_deleted"):
+                deleted = conn.execute(select(_DELETED.c.id, _DELETED.c.car_id)
+                                       .where(_DELETED.c.id > since.get("deleted_id", 0))
+                                       .order_by(_DELETED.c.id)).all()
+            cars_changed = _CARS.c.id > since["cars_id"]
+            if since["cars_updated_at"]:
+                cutoff = datetime.fromisoformat(since["cars_updated_at"]) - SYNC_OVERLAP
+                cars_changed = or_(cars_changed, _CARS.c.updated_at >= cutoff)
+            snapshots = _SNAPSHOTS.c.id > 0
+            if since["report_date"]:
+                snapshots = _SNAPSHOTS.c.report_date >= date.fromisoformat(since["report_date"])
+            tables = {
+                "cars": _read_rows(conn, _CARS, cars_changed),
+                "listing_events": _read_rows(conn, _EVENTS, _EVENTS.c.id > since["event_id"]),
+                "report_snapshot": _read_rows(conn, _SNAPSHOTS, snapshots),
+            }
+    finally:
+        engine.dispose()
+
+    # The new watermark comes from the rows themselves, so nothing committed
+    # while this ran can fall between two exports
+    columns = {name: [c.name for c in _TABLES[name].columns] for name in tables}
+    watermark = dict(empty_watermark(), **since)
+    if deleted:
+        watermark["deleted_id"] = deleted[-1].id
+    cars = tables["cars"]
+    if cars:
+        at, key = columns["cars"].index("updated_at"), columns["cars"].index("id")
+        latest = max(filter(None, (row[at] for row in cars)), default=None)
+        watermark["cars_updated_at"] = _later(since["cars_updated_at"], latest)
+        watermark["cars_id"] = max(since["cars_id"], max(row[key] for row in cars))
+    if tables["listing_events"]:
+        watermark["event_id"] = tables["listing_events"][-1][columns["listing_events"].index("id")]
+    if tables["report_snapshot"]:
+        at = columns["report_snapshot"].index("report_date")
+        watermark["report_date"] = _later(since["report_date"], max(r[at] for r in tables["report_snapshot"]))
+    return {
+        "version": CHANGESET_VERSION,
+        "exported_at": datetime.now().isoformat(),
+        "since": since,
+        "watermark": watermark,
+        "tables": {name: {"columns": columns[name], "rows": rows} for name, rows in tables.items()},
+        "deleted": {"cars": [row.car_id for row in deleted]},
+    }
+
+
+def write_changeset(changeset, path):
+    """gzip the changeset to path ('-' for stdout)."""
+    data = gzip.compress(json.dumps(changeset, separators=(",", ":")).encode())
+    if path == "-":
+        sys.stdout.buffer.write(data)
+    else:
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    return len(data)
+
+
+def read_changeset(path):
+    with (sys.stdin.buffer if path == "-" else open(path, "rb")) as f:
+        changeset = json.loads(gzip.decompress(f.read()))
+    if changeset.get("version") != CHANGESET_VERSION:
+        raise ValueError(f"{path}: changeset version {changeset.get('version')}, expected {CHANGESET_VERSION}")
+    return changeset
+
+
+def apply_changes(replica_url, changeset):
+    """
+    Delete the changeset's tombstoned cars rows and upsert its rows into the
+    replica, in one transaction. Returns {table: rows applied}.
+    """
+    engine = create_engine(replica_url)
+    counts = {}
+    try:
+        with engine.begin() as conn:
+            _drop_triggers(conn)
+            # Before the upserts, in case a deleted id was reused by a new row
+            gone = changeset["deleted"]["cars"]
+            for i in range(0, len(gone), APPLY_CHUNK):
+                conn.execute(delete(_CARS).where(_CARS.c.id.in_(gone[i:i + APPLY_CHUNK])))
+            counts["deleted cars"] = len(gone)
+            for name, data in changeset["tables"].items():
+                table = _TABLES[name]
+                replica_columns = {c["name"] for c in inspect(conn).get_columns(name)}
+                missing = set(data["columns"]) - (replica_columns & set(table.c.keys()))
+                if missing:
+                    raise ValueError(f"{name} in the replica has no {', '.join(sorted(missing))} column; "
+                                     "run migrate_db.py against it or clone it again")
+                columns = [table.c[column] for column in data["columns"]]
+                rows = [{c.name: _parse_value(c, value) for c, value in zip(columns, row)} for row in data["rows"]]
+                stmt = sqlite_insert(table)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[table.c.id],
+                    set_={c.name: stmt.excluded[c.name] for c in columns if not c.primary_key})
+                for i in range(0, len(rows), APPLY_CHUNK):
+                    conn.execute(stmt, rows[i:i + APPLY_CHUNK])
+                counts[name] = len(rows)
+
+            current = replica_watermark(conn)
+            new = changeset["watermark"]
+            _save_watermark(conn, {
+                "cars_updated_at": _later(current["cars_updated_at"], new["cars_updated_at"]),
+                "cars_id": max(current["cars_id"], new["cars_id"]),
+                "event_id": max(current["event_id"], new["event_id"]),
+                "report_date": _later(current["report_date"], new["report_date"]),
+                "deleted_id": max(current["deleted_id"] or 0, new["deleted_id"]),
+            })
+    finally:
+        engine.dispose()
+    return counts
+
+
+def clone(source_url, replica_url, pages=BACKUP_PAGES):
+    """
+    Copy the source database to the replica with SQLite's online backup API,
+    pages at a time so the scraper can keep writing, then record the
+    replica's watermark. Replaces the replica file. Returns pages copied.
+    """
+    source_path, replica_path = _sqlite_path(source_url), _sqlite_path(replica_url)
+    tmp = replica_path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    # Anything changed after the backup starts may be missing from the copy
+    started = datetime.now()
+    copied = 0
+
+    def progress(_status, remaining, total):
+        nonlocal copied
+        copied = total - remaining
+
+    source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+    target = sqlite3.connect(tmp)
+    try:
+        source.backup(target, pages=pages, progress=progress, sleep=BACKUP_SLEEP)
+        target.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        target.close()
+        source.close()
+
+    engine = create_engine(f"sqlite:///{tmp}")
+    try:
+        with engine.begin() as conn:
+            _drop_triggers(conn)
+            deleted_id = 0
+            if inspect(conn).has_table("cars_deleted"):
+                deleted_id = conn.scalar(select(func.max(_DELETED.c.id))) or 0
+            # The watermark's columns are checked (and added if missing) first
+            replica_watermark(conn)
+            _save_watermark(conn, {
+                "cars_updated_at": started.isoformat(),
+                "cars_id": conn.scalar(select(func.max(_CARS.c.id))) or 0,
+                "event_id": conn.scalar(select(func.max(_EVENTS.c.id))) or 0,
+                "report_date": _json_value(conn.scalar(select(func.max(_SNAPSHOTS.c.report_date)))),
+                "deleted_id": deleted_id,
+            })
+    finally:
+        engine.dispose()
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(replica_path + suffix):
+            os.remove(replica_path + suffix)
+    os.replace(tmp, replica_path)
+    return copied
+
+
+def read_watermark(replica_url):
+    engine = create_engine(replica_url)
+    try:
+        with engine.begin() as conn:
+            return replica_watermark(conn)
+    finally:
+        engine.dispose()
+
+
+def pull(source_url, replica_url):
+    """Bring a local replica up to date: clone it if it doesn't exist yet, else export and apply."""
+    if not os.path.exists(_sqlite_path(replica_url)):
+        start = time.perf_counter()
+        pages = clone(source_url, replica_url)
+        print(f"📥 Cloned {pages:,} pages in {time.perf_counter() - start:.1f}s")
+        return
+    start = time.perf_counter()
+    changeset = export_changes(source_url, read_watermark(replica_url))
+    counts = apply_changes(replica_url, changeset)
+    print(f"🔄 Applied {_summary(counts)} in {time.perf_counter() - start:.1f}s")
+
+
+def _summary(counts):
+    return ", ".join(f"{n:,} {name}" for name, n in counts.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+    p = commands.add_parser("clone", help="copy the source database to the replica (online backup)")
+    p.add_argument("source")
+    p.add_argument("replica")
+    p = commands.add_parser("watermark", help="print the replica's watermark as JSON")
+    p.add_argument("replica")
+    p = commands.add_parser("export", help="write a changeset of everything changed since a watermark")
+    p.add_argument("source")
+    p.add_argument("changeset", help="output file, '-' for stdout")
+    p.add_argument("--since", help="watermark JSON file ('-' for stdin); default: everything")
+    p = commands.add_parser("apply", help="apply a changeset to the replica")
+    p.add_argument("replica")
+    p.add_argument("changeset", help="changeset file, '-' for stdin")
+    p = commands.add_parser("pull", help="clone or export + apply between two local databases")
+    p.add_argument("source")
+    p.add_argument("replica")
+    args = parser.parse_args()
+
+    if args.command == "clone":
+        start = time.perf_counter()
+        pages = clone(args.source, args.replica)
+        print(f"📥 Cloned {pages:,} pages in {time.perf_counter() - start:.1f}s")
+    elif args.command == "watermark":
+        print(json.dumps(read_watermark(args.replica)))
+    elif args.command == "export":
+        since = empty_watermark()
+        if args.since:
+            with (sys.stdin if args.since == "-" else open(args.since)) as f:
+                since = json.load(f)
+        changeset = export_changes(args.source, since)
+        size = write_changeset(changeset, args.changeset)
+        counts = {name: len(data["rows"]) for name, data in changeset["tables"].items()}
+        print(f"📦 Exported {_summary(counts)} ({size:,} bytes)", file=sys.stderr)
+    elif args.command == "apply":
+        counts = apply_changes(args.replica, read_changeset(args.changeset))
+        print(f"🔄 Applied {_summary(counts)}")
+    else:
+        pull(args.source, args.replica)
+
+
+if __name__ == "__main__":
+    main()
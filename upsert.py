@@ -0,0 +1,116 @@
+"""
+Batched upsert of scraped listings into the cars table.
+
+Existing rows for the batch are looked up with a handful of IN queries, then
+all inserts and updates are flushed as executemany statements and committed
+in a single transaction, together with the history events for whatever
+actually changed (see history.py).
+"""
+
+from datetime import date, datetime
+
+from sqlalchemy import select, insert, update
+from history import change_events, listed_event, record_events
+from models import CarListing
+from metrics import METRICS
+from normalize import numeric_columns, parse_price
+
+# Keep IN (...) lists well under SQLite's bound-parameter limit
+LOOKUP_CHUNK = 500
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def load_existing(session, links):
+    """Map link -> row (id, manual_price, price, price_num, mileage_num, still_available) for the links already stored."""
+    existing = {}
+    links = list(links)
+    for chunk in _chunks(links, LOOKUP_CHUNK):
+        rows = session.execute(
+            select(CarListing.link, CarListing.id, CarListing.manual_price, CarListing.price, CarListing.price_num,
+                   CarListing.mileage_num, CarListing.still_available)
+            .where(CarListing.link.in_(chunk)))
+        for row in rows:
+            existing[row.link] = row
+    return existing
+
+
+def bulk_upsert_cars(session, scraped_cars, today=None, commit=True):
+    """
+    Insert new listings and refresh existing ones in one transaction.
+
+    Same rules as the old per-row loop: existing rows are marked
+    still_available, and their price only changes when a new price was
+    scraped and the row wasn't priced manually. A manually priced row gets
+    price_num re-parsed from its stored price instead, so the report sorts
+    by the hand-entered price. Returns (saved, updated).
+    With commit=False the caller commits, e.g. together with a checkpoint.
+    """
+    today = today or date.today()
+    existing = load_existing(session, {car["link"] for car in scraped_cars})
+
+    inserts, updates = {}, {}
+    saved_count = updated_count = preserved_manual = 0
+
+    for car in scraped_cars:
+        link = car["link"]
+        has_price = bool(car["price"] and car["price"].strip())
+        nums = numeric_columns(car["price"], car["mileage"], car["year"])
+        fields = {
+            "listing": car["listing"],
+            "mileage": car["mileage"],
+            "mileage_num": nums["mileage_num"],
+            "is_hybrid": car["is_hybrid"],
+            "year": car["year"],
+            "year_num": nums["year_num"],
+        }
+        price_fields = {"price": car["price"], "price_num": nums["price_num"]}
+
+        if link in existing:
+            row = existing[link]
+            values = updates.setdefault(link, {"id": row.id})
+            values.update(fields, still_available=True)
+            if row.manual_price:
+                values["price_num"] = parse_price(row.price)
+                preserved_manual += has_price
+            elif has_price:
+                values.update(price_fields)
+            updated_count += 1
+        elif link in inserts:
+            # Same link seen twice in one batch: later rows refresh the first
+            inserts[link].update(fields)
+            if has_price:
+                inserts[link].update(price_fields)
+            updated_count += 1
+        else:
+            inserts[link] = dict(fields, **price_fields, link=link, date_found=today)
+            saved_count += 1
+
+    observed_at = datetime.now()
+    events = []
+    for link, values in updates.items():
+        events.extend(change_events(values["id"], existing[link]._asdict(), values, observed_at))
+
+    try:
+        if inserts:
+            new_ids = session.execute(
+                insert(CarListing).returning(CarListing.id, CarListing.link), list(inserts.values()))
+            events.extend(listed_event(car_id, inserts[link], observed_at) for car_id, link in new_ids)
+        if updates:
+            session.execute(update(CarListing), list(updates.values()))
+        record_events(session, events)
+        if commit:
+            with METRICS.timer("db_commit_seconds"):
+                session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    METRICS.inc("upserts", len(inserts), op="insert")
+    METRICS.inc("upserts", len(updates), op="update")
+    if preserved_manual:
+        print(f"💰 Kept manual price on {preserved_manual} listings.")
+    return saved_count, updated_count